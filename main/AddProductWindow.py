@@ -7,23 +7,30 @@ from PyQt5.QtWidgets import (
     QLabel, QLineEdit, QDialog
 )
 from PyQt5 import QtCore
+from PyQt5.QtCore import QRegExp
+from PyQt5.QtGui import QRegExpValidator
 from psycopg2 import OperationalError, sql
 from Database import Database
+from Operations import Orders
+from Allocator import parse_coordinates
+from ReferenceCache import get_reference_cache
+from Search import product_match, product_rank
 from BaseProductWindow import BaseProductWindow
 from EditDialog import EditDialog
 
 
 class AddProductWindow(BaseProductWindow):
+    search_columns = (0, 4)  # Название и артикул (артикул в таблице не показывается)
+
     def __init__(self, order_id, user, password, parent=None):
         self.user = user
         self.password = password
         self.order_id = order_id
         self.session_changes = {}  # Для отслеживания изменений в текущей сессии
         query = {
-            'select': """SELECT products.name, products.id, amount, products.price FROM ProductInWarehouse
-            JOIN Products ON Products.id = ProductInWarehouse.product_id
-            WHERE warehouse_id = %s""",
-            'insert': """INSERT INTO Order_items (order_id, product_id, amount, price, warehouse_id) VALUES (%s, %s, %s, %s, %s)"""
+            'select': """SELECT products.name, products.id, amount, products.price, products.article FROM StockBalances
+            JOIN Products ON Products.id = StockBalances.product_id
+            WHERE warehouse_id = %s"""
         }
         headers = ['Товар', 'ID Товара', 'Количество', 'Цена', 'Количество в заказ']
         super().__init__('Добавить товары в заказ', (600, 200, 1000, 600), headers, query, self.user, self.password, parent)
@@ -36,6 +43,18 @@ class AddProductWindow(BaseProductWindow):
         layout = self.centralWidget().layout()
         layout.addWidget(self.add_button)
 
+        # Подбор складов: корзина раскладывается по ближайшим к точке доставки складам, где есть товар
+        allocate_layout = QHBoxLayout()
+        allocate_layout.addWidget(QLabel('Доставка (широта, долгота):'))
+        self.origin_box = QLineEdit()
+        self.origin_box.setPlaceholderText('По умолчанию - координаты выбранного склада')
+        self.origin_box.setValidator(QRegExpValidator(QRegExp(r'^-?\d{1,3}\.\d{1,6},\s*-?\d{1,3}\.\d{1,6}$')))
+        allocate_layout.addWidget(self.origin_box)
+        self.allocate_button = QPushButton('Подобрать склады')
+        self.allocate_button.clicked.connect(self.allocate_products)
+        allocate_layout.addWidget(self.allocate_button)
+        layout.addLayout(allocate_layout)
+
         # Делая ячейки таблицы доступными только для чтения
         self.make_table_read_only()
 
@@ -53,48 +72,109 @@ class AddProductWindow(BaseProductWindow):
 
     def add_products_to_order(self):
         self.warehouse_id = self.combo_box.currentData()
-        if self.warehouse_id:
-            try:
-                with Database(self.user, self.password) as db:
-                    for i in range(self.warehouse_table.rowCount()):
-                        product_id = self.warehouse_table.item(i, 1).text()
-                        quantity = int(self.order_table.item(i, 0).text())
-                        price = float(self.warehouse_table.item(i, 3).text())
-                        amount = int(self.warehouse_table.item(i, 2).text())
-                        if quantity > 0:
-                            if amount >= quantity:
-                                # Обновляем количество в текущей сессии
-                                if product_id in self.session_changes:
-                                    self.session_changes[product_id] += quantity
-                                else:
-                                    self.session_changes[product_id] = quantity
-
-                                db.cursor.execute(
-                                    'UPDATE ProductInWarehouse SET amount = amount - %s WHERE product_id = %s AND warehouse_id = %s',
-                                    (quantity, product_id, self.warehouse_id))
-                                db.cursor.execute("""SELECT * FROM Order_Items 
-                                                  WHERE product_id = %s AND order_id = %s AND warehouse_id = %s""",
-                                                  (product_id, self.order_id, self.warehouse_id))
-                                result = db.cursor.fetchall()
-                                if result:
-                                    db.cursor.execute("""UPDATE Order_Items SET amount = amount + %s 
-                                                                        WHERE product_id = %s AND order_id = %s AND warehouse_id = %s""",
-                                                      (quantity, product_id, self.order_id, self.warehouse_id))
-                                else:
-                                    db.cursor.execute(self.query['insert'],
-                                                      (self.order_id, product_id, quantity, price, self.warehouse_id))
-                            else:
-                                QMessageBox.warning(self, 'Ошибка', 'На складе недостаточно товара')
-
-                    db.conn.commit()
-                QMessageBox.information(self, 'Успех', 'Товары добавлены в заказ.')
-            except Exception as e:
-                if db.conn:
-                    db.conn.rollback()
-                print(f"Error adding products to order: {e}")
-                QMessageBox.critical(self, 'Ошибка', f'Ошибка добавления товаров в заказ: {e}')
-        else:
+        if not self.warehouse_id:
             QMessageBox.warning(self, 'Ошибка', 'Пожалуйста, выберите склад.')
+            return
+        lines = self.order_lines()
+        if not lines:
+            return
+        # Остаток в таблице мог устареть - хватает ли товара, решает база при резервировании
+        self.add_button.setEnabled(False)
+        self.executor.submit(None, self.reserve_products, self.warehouse_id, lines,
+                             on_result=self.on_products_reserved, on_error=self.on_reserve_error)
+
+    def order_lines(self):
+        # (id товара, количество, цена) по строкам с ненулевым количеством в заказ
+        lines = []
+        for i in range(self.warehouse_table.rowCount()):
+            quantity = int(self.order_table.item(i, 0).text())
+            if quantity > 0:
+                lines.append((int(self.warehouse_table.item(i, 1).text()), quantity,
+                              float(self.warehouse_table.item(i, 3).text())))
+        return lines
+
+    def allocate_products(self):
+        lines = self.order_lines()
+        if not lines:
+            return
+        if self.origin_box.text().strip():
+            origin = parse_coordinates(self.origin_box.text())
+        else:
+            warehouse = get_reference_cache().get_by_id('warehouses', self.combo_box.currentData()) \
+                if self.combo_box.currentData() else None
+            origin = parse_coordinates(warehouse[2]) if warehouse else None
+        if origin is None:
+            QMessageBox.warning(self, 'Ошибка', 'Укажите координаты доставки или выберите склад с координатами.')
+            return
+        self.allocate_button.setEnabled(False)
+        self.allocation_prices = {product_id: price for product_id, quantity, price in lines}
+        self.executor.submit('allocate', self.propose_allocation, origin,
+                             [(product_id, quantity) for product_id, quantity, price in lines],
+                             on_result=self.on_allocation_proposed, on_error=self.on_reserve_error)
+
+    def propose_allocation(self, origin, lines):
+        # Выполняется в фоновом потоке: только предложение, остатки не меняются
+        return Orders(Database(self.user, self.password)).allocate(origin, lines)
+
+    def on_allocation_proposed(self, proposal):
+        self.allocate_button.setEnabled(True)
+        shipments, missing = proposal
+        names = {int(self.warehouse_table.item(i, 1).text()): self.warehouse_table.item(i, 0).text()
+                 for i in range(self.warehouse_table.rowCount())}
+        cache = get_reference_cache()
+        text = []
+        for warehouse_id, km, taken in shipments:
+            warehouse = cache.get_by_id('warehouses', warehouse_id)
+            text.append(f"{warehouse[1] if warehouse else warehouse_id} ({km:.1f} км): "
+                        + ', '.join(f"{names.get(product_id, product_id)} - {quantity}" for product_id, quantity in taken))
+        if missing:
+            message = '\n'.join(f"{names.get(product_id, product_id)}: не хватает {quantity}"
+                                 for product_id, quantity in missing.items())
+            QMessageBox.warning(self, 'Ошибка', f'На складах с координатами недостаточно товара:\n{message}')
+            return
+        reply = QMessageBox.question(self, 'Подбор складов',
+                                     f'Отгрузок: {len(shipments)}\n' + '\n'.join(text) + '\n\nЗарезервировать?',
+                                     QMessageBox.Yes | QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return
+        self.allocate_button.setEnabled(False)
+        self.executor.submit(None, self.reserve_allocation, shipments, self.allocation_prices,
+                             on_result=self.on_allocation_reserved, on_error=self.on_reserve_error)
+
+    def reserve_allocation(self, shipments, prices):
+        # Выполняется в фоновом потоке: весь план одной транзакцией
+        return Orders(Database(self.user, self.password)).add_allocation(self.order_id, shipments, prices)
+
+    def on_allocation_reserved(self, results):
+        self.allocate_button.setEnabled(True)
+        self.on_products_reserved([result for warehouse_id, reserved in results for result in reserved])
+
+    def reserve_products(self, warehouse_id, lines):
+        # Выполняется в фоновом потоке: вся корзина резервируется одним запросом
+        return Orders(Database(self.user, self.password)).add_items(self.order_id, warehouse_id, lines)
+
+    def on_products_reserved(self, results):
+        self.add_button.setEnabled(True)
+        failed = [result for result in results if not result[4]]
+        if failed:
+            names = {self.warehouse_table.item(i, 1).text(): self.warehouse_table.item(i, 0).text()
+                     for i in range(self.warehouse_table.rowCount())}
+            message = '\n'.join(f"{names.get(str(product_id), product_id)}: запрошено {quantity}, доступно {available or 0}"
+                                 for line, product_id, quantity, available, ok in failed)
+            QMessageBox.warning(self, 'Ошибка', f'Товары не добавлены, на складе недостаточно товара:\n{message}')
+        else:
+            for line, product_id, quantity, available, ok in results:
+                # Обновляем количество в текущей сессии
+                key = str(product_id)
+                self.session_changes[key] = self.session_changes.get(key, 0) + quantity
+            QMessageBox.information(self, 'Успех', 'Товары добавлены в заказ.')
+        self.update_warehouse_table()  # Показываем актуальные остатки
+
+    def on_reserve_error(self, error):
+        self.add_button.setEnabled(True)
+        self.allocate_button.setEnabled(True)
+        print(f"Error adding products to order: {error}")
+        QMessageBox.critical(self, 'Ошибка', f'Ошибка добавления товаров в заказ: {error}')
 
     def edit_item(self, row, column):
         logging.debug(f"Opening EditDialog for row {row}, column {column}")
@@ -109,48 +189,31 @@ class AddProductWindow(BaseProductWindow):
 
     def delete_item(self):
         try:
-            with Database(self.user, self.password) as db:
-                selected_row = self.table_widget.currentRow()
-                if selected_row == -1:
-                    QMessageBox.warning(self, 'Ошибка', 'Пожалуйста, выберите элемент для удаления.')
-                    return
-
-                id_item = self.table_widget.item(selected_row, 0).text()
-                order_id = self.orders_combo.currentData()
-                warehouse_id = self.table_widget.item(selected_row, 4).text()
-                amount = int(self.table_widget.item(selected_row, 3).text())
-
+            selected_row = self.table_widget.currentRow()
+            if selected_row == -1:
+                QMessageBox.warning(self, 'Ошибка', 'Пожалуйста, выберите элемент для удаления.')
+                return
+
+            id_item = self.table_widget.item(selected_row, 0).text()
+            order_id = self.orders_combo.currentData()
+            warehouse_id = self.table_widget.item(selected_row, 4).text()
+
+            # Товар из удалённой строки заказа возвращается на склад
+            removed = Orders(Database(self.user, self.password)).remove_items([(order_id, id_item, warehouse_id)])
+            if removed:
                 # Обновляем количество в текущей сессии
-                if id_item in self.session_changes:
-                    self.session_changes[id_item] -= amount
-                else:
-                    self.session_changes[id_item] = -amount
-
-                # Execute the delete command
-                db.cursor.execute(
-                    'DELETE FROM Order_Items WHERE product_id = %s AND order_id = %s AND warehouse_id = %s',
-                    (id_item, order_id, warehouse_id))
-                db.cursor.execute('SELECT * FROM ProductInWarehouse WHERE product_id = %s and warehouse_id = %s', (id_item, warehouse_id))
-                result = db.cursor.fetchall()
-                if result:
-                    db.cursor.execute('UPDATE ProductInWarehouse SET amount = amount + %s WHERE product_id = %s and warehouse_id = %s',
-                                      (amount, id_item, warehouse_id))
-                else:
-                    db.cursor.execute('INSERT INTO ProductInWarehouse (warehouse_id, product_id, amount) VALUES (%s, %s, %s)', (warehouse_id, id_item, amount))
-                # Check if the delete operation was successful
-                if db.cursor.rowcount > 0:
-                    self.table_widget.removeRow(selected_row)
-                    db.conn.commit()
-                    QMessageBox.information(self, 'Успех', 'Элемент успешно удалён!')
-                else:
-                    QMessageBox.warning(self, 'Ошибка', 'Не удалось удалить элемент. Возможно, он не существует.')
+                amount = sum(line[3] for line in removed)
+                self.session_changes[id_item] = self.session_changes.get(id_item, 0) - amount
+                self.table_widget.removeRow(selected_row)
+                QMessageBox.information(self, 'Успех', 'Элемент успешно удалён!')
+            else:
+                QMessageBox.warning(self, 'Ошибка', 'Не удалось удалить элемент. Возможно, он не существует.')
 
         except Exception as e:
-            # Roll back in case of error
-            db.conn.rollback()
             QMessageBox.critical(self, 'Ошибка', f'Произошла ошибка: {e}')
 
     def get_search_query(self):
-        return """SELECT products.name, products.id, amount, products.price FROM ProductInWarehouse
-            JOIN Products ON Products.id = ProductInWarehouse.product_id
-            WHERE LOWER(products.name) LIKE %s AND warehouse_id = %s"""
\ No newline at end of file
+        return f"""SELECT products.name, products.id, amount, products.price, products.article FROM StockBalances
+            JOIN Products ON Products.id = StockBalances.product_id
+            WHERE {product_match('products')} AND warehouse_id = %(warehouse_id)s
+            ORDER BY {product_rank('products')}"""
\ No newline at end of file
@@ -0,0 +1,202 @@
+import math
+import time
+import heapq
+import logging
+import itertools
+import threading
+
+# Подбор складов для заказа. Склады с координатами (Warehouses.geo_coordinates, "широта, долгота") лежат
+# в k-d дереве по точкам на единичной сфере: длина хорды растёт вместе с расстоянием по поверхности,
+# поэтому дерево выдаёт склады от ближайшего к точке доставки без перебора всех складов.
+# План строится по остаткам StockBalances только тех товаров, что есть в заказе:
+#   - лучший вариант одной отгрузкой - ближайший склад, где есть всё;
+#   - жадный план: на каждом шаге берётся склад с наибольшей долей закрываемых строк на километр
+#     (каждая отгрузка стоит SHIPMENT_KM пути), из CANDIDATES ближайших складов, где ещё есть нужный товар.
+# Выбирается более дешёвый из двух. Это приближение, а не точный оптимум: задача покрытия NP-трудная,
+# а предложение нужно за миллисекунды. Склады без координат в подбор не попадают
+
+EARTH_RADIUS_KM = 6371.0
+SHIPMENT_KM = 50.0  # Лишняя отгрузка стоит столько же, сколько 50 км пути
+CANDIDATES = 32  # Сколько ближайших складов с нужным товаром сравнивается на каждом шаге жадного плана
+
+
+def parse_coordinates(text):
+    # '55.751244, 37.618423' -> (широта, долгота); пустые или неверные координаты - None
+    try:
+        latitude, longitude = (float(part) for part in str(text).split(','))
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return latitude, longitude
+
+
+def to_point(latitude, longitude):
+    latitude, longitude = math.radians(latitude), math.radians(longitude)
+    return (math.cos(latitude) * math.cos(longitude), math.cos(latitude) * math.sin(longitude), math.sin(latitude))
+
+
+def chord_to_km(squared_chord):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(squared_chord) / 2))
+
+
+class WarehouseIndex():
+    # k-d дерево: узел - (точка, id склада, ось, левое поддерево, правое поддерево)
+    def __init__(self, warehouses):
+        # warehouses: [(id склада, широта, долгота)]
+        self.size = len(warehouses)
+        self.root = self.build([(to_point(latitude, longitude), warehouse_id)
+                                for warehouse_id, latitude, longitude in warehouses], 0)
+
+    def build(self, items, depth):
+        if not items:
+            return None
+        axis = depth % 3
+        items.sort(key=lambda item: item[0][axis])
+        middle = len(items) // 2
+        point, warehouse_id = items[middle]
+        return (point, warehouse_id, axis, self.build(items[:middle], depth + 1), self.build(items[middle + 1:], depth + 1))
+
+    def nearest(self, latitude, longitude):
+        # Склады по возрастанию расстояния: (км, id склада). Генератор - поддеревья раскрываются,
+        # только когда вызывающему нужен следующий склад
+        target = to_point(latitude, longitude)
+        counter = itertools.count()  # Равные расстояния не сравнивают узлы между собой
+        heap = [(0.0, next(counter), self.root, None)] if self.root else []
+        while heap:
+            bound, _, node, warehouse_id = heapq.heappop(heap)
+            if node is None:
+                yield chord_to_km(bound), warehouse_id
+                continue
+            point, node_id, axis, left, right = node
+            heapq.heappush(heap, (sum((a - b) ** 2 for a, b in zip(point, target)), next(counter), None, node_id))
+            difference = target[axis] - point[axis]
+            near, far = (left, right) if difference < 0 else (right, left)
+            if near:
+                heapq.heappush(heap, (bound, next(counter), near, None))
+            if far:
+                heapq.heappush(heap, (max(bound, difference * difference), next(counter), far, None))
+
+
+class Allocator():
+    def __init__(self, warehouses):
+        # warehouses: строки справочника складов (id, название, координаты)
+        self.names = {}
+        located = []
+        for warehouse_id, name, coordinates in warehouses:
+            self.names[warehouse_id] = name
+            point = parse_coordinates(coordinates)
+            if point is not None:
+                located.append((warehouse_id, *point))
+        self.index = WarehouseIndex(located)
+
+    def allocate(self, origin, lines, stock):
+        # origin - (широта, долгота) доставки, lines - {товар: количество}, stock - {склад: {товар: остаток}}.
+        # Возвращает (отгрузки [(склад, км, [(товар, количество)])], не хватает {товар: количество})
+        lines = {product_id: quantity for product_id, quantity in lines.items() if quantity > 0}
+        nearest = self.index.nearest(*origin)
+        visited = []  # (км, склад) со складами, где есть хоть один товар заказа, в порядке расстояния
+
+        def holders():
+            for candidate in visited:
+                yield candidate
+            for km, warehouse_id in nearest:
+                if any(stock.get(warehouse_id, {}).get(product_id, 0) > 0 for product_id in lines):
+                    visited.append((km, warehouse_id))
+                    yield km, warehouse_id
+
+        single = None
+        for km, warehouse_id in holders():
+            available = stock[warehouse_id]
+            if all(available.get(product_id, 0) >= quantity for product_id, quantity in lines.items()):
+                single = [(warehouse_id, km, sorted(lines.items()))]
+                break
+
+        greedy, missing = self.greedy(lines, stock, holders)
+        if single is not None and self.cost(single) <= self.cost(greedy):
+            return single, {}
+        return greedy, missing
+
+    def greedy(self, lines, stock, holders):
+        remaining = dict(lines)
+        shipments = []
+        used = set()
+        while remaining:
+            pool = []
+            for km, warehouse_id in holders():
+                if warehouse_id in used:
+                    continue
+                available = stock[warehouse_id]
+                covered = sum(min(available.get(product_id, 0), quantity) / lines[product_id]
+                              for product_id, quantity in remaining.items())
+                if covered > 0:
+                    pool.append((covered / (SHIPMENT_KM + km), -km, warehouse_id))  # При равной доле - ближний
+                    if len(pool) >= CANDIDATES:
+                        break
+            if not pool:
+                break  # Оставшегося товара нет ни на одном складе с координатами
+            score, nearer, warehouse_id = max(pool)
+            used.add(warehouse_id)
+            available = stock[warehouse_id]
+            taken = []
+            for product_id, quantity in sorted(remaining.items()):
+                amount = min(available.get(product_id, 0), quantity)
+                if amount > 0:
+                    taken.append((product_id, amount))
+                    if amount == quantity:
+                        del remaining[product_id]
+                    else:
+                        remaining[product_id] = quantity - amount
+            shipments.append((warehouse_id, -nearer, taken))
+        return shipments, remaining
+
+    def cost(self, shipments):
+        return sum(SHIPMENT_KM + km for warehouse_id, km, taken in shipments)
+
+
+def load_stock(cursor, product_ids):
+    # Остатки товаров заказа на всех складах: {склад: {товар: остаток}}; по индексу ProductInWarehouse (product_id)
+    cursor.execute("SELECT warehouse_id, product_id, amount FROM StockBalances WHERE product_id = ANY(%s) AND amount > 0",
+                   (list({int(product_id) for product_id in product_ids}),))
+    stock = {}
+    for warehouse_id, product_id, amount in cursor.fetchall():
+        stock.setdefault(warehouse_id, {})[product_id] = amount
+    return stock
+
+
+_allocator = None  # (версия справочника складов, Allocator)
+_lock = threading.Lock()
+
+
+def get_allocator(cursor):
+    # Дерево складов строится один раз и перестраивается, когда ReferenceCache сообщит об изменении складов.
+    # Без слушателя справочников (например, в OperationsCli) склады читаются при каждом подборе
+    from ReferenceCache import get_reference_cache
+    global _allocator
+    reference_cache = get_reference_cache()
+    version = reference_cache.version('warehouses') if reference_cache is not None and reference_cache.listening else None
+    with _lock:
+        if _allocator is not None and version is not None and _allocator[0] == version:
+            return _allocator[1]
+    if reference_cache is not None:
+        warehouses = reference_cache.get('warehouses')
+    else:
+        cursor.execute("SELECT id, name, geo_coordinates FROM Warehouses ORDER BY id")
+        warehouses = cursor.fetchall()
+    allocator = Allocator(warehouses)
+    with _lock:
+        _allocator = (version, allocator)
+    return allocator
+
+
+def propose_allocation(cursor, origin, lines):
+    # lines: [(товар, количество)], повторы товара складываются. Возвращает то же, что Allocator.allocate
+    start = time.perf_counter()
+    quantities = {}
+    for product_id, quantity in lines:
+        quantities[int(product_id)] = quantities.get(int(product_id), 0) + int(quantity)
+    allocator = get_allocator(cursor)
+    shipments, missing = allocator.allocate(origin, quantities, load_stock(cursor, quantities))
+    logging.debug(f"Allocation of {len(quantities)} products over {allocator.index.size} warehouses: "
+                  f"{len(shipments)} shipments in {(time.perf_counter() - start) * 1000:.1f} ms")
+    return shipments, missing
@@ -9,8 +9,16 @@ from PyQt5.QtWidgets import (
 from PyQt5 import QtCore
 from psycopg2 import OperationalError, sql
 from Database import Database
+from ReferenceCache import get_reference_cache
+from Search import search_params
+from QueryExecutor import QueryExecutor
+from TableModel import RowFilter, LiveSearch
+from Exporter import run_export
+from PreparedStatements import register_statement
 
 class BaseProductWindow(QMainWindow):
+    search_columns = None  # Столбцы строки склада для поиска по мере ввода; None - все
+
     def __init__(self, title, geometry, headers, query, user=None, password=None, parent=None):
         self.user = user
         self.password = password
@@ -19,7 +27,10 @@ class BaseProductWindow(QMainWindow):
         self.setGeometry(*geometry)
 
         self.query = query
+        # Остатки склада перечитываются при каждой смене склада - запрос готовится на сервере один раз
+        register_statement(f"{type(self).__name__.lower()}_select", query['select'])
         self.headers = headers
+        self.executor = QueryExecutor(self)
 
         layout = QVBoxLayout()
 
@@ -36,8 +47,10 @@ class BaseProductWindow(QMainWindow):
         self.search_box = QLineEdit()
         search_layout.addWidget(self.search_box)
         self.search_button = QPushButton('Поиск')
-        self.search_button.clicked.connect(self.search_products)
         search_layout.addWidget(self.search_button)
+        self.export_button = QPushButton('Экспорт')
+        self.export_button.clicked.connect(self.export_table)
+        search_layout.addWidget(self.export_button)
 
         layout.addLayout(search_layout)  # Добавление layout поиска в основной layout
 
@@ -58,6 +71,13 @@ class BaseProductWindow(QMainWindow):
 
         layout.addLayout(tables_layout)
 
+        # Поиск по мере ввода скрывает строки в обеих таблицах; склад загружается целиком,
+        # поэтому запрос к базе уходит только по кнопке "Поиск"
+        self.row_filter = RowFilter(self.search_columns, self)
+        self.row_filter.changed.connect(self.apply_row_filter)
+        self.live_search = LiveSearch(self.search_box, self.row_filter, lambda: True, self.search_products, parent=self)
+        self.search_button.clicked.connect(self.live_search.run_server_search)
+
         container = QWidget()
         container.setLayout(layout)
         self.setCentralWidget(container)
@@ -66,10 +86,8 @@ class BaseProductWindow(QMainWindow):
 
     def load_warehouses(self):
         try:
-            with Database(self.user, self.password) as db:
-                warehouses = db.get_warehouses()
-                for warehouse in warehouses:
-                    self.combo_box.addItem(warehouse[1], warehouse[0])
+            for warehouse in get_reference_cache().get('warehouses'):
+                self.combo_box.addItem(warehouse[1], warehouse[0])
         except Exception as e:
             print(f"Error loading warehouses: {e}")
             QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки складов: {e}")
@@ -77,43 +95,62 @@ class BaseProductWindow(QMainWindow):
     def update_warehouse_table(self):
         warehouse_id = self.combo_box.currentData()
         if warehouse_id is not None:
-            try:
-                with Database(self.user, self.password) as db:
-                    db.cursor.execute(self.query['select'], (warehouse_id,))
-                    products = db.cursor.fetchall()
-
-                self.warehouse_table.setRowCount(len(products))
-                self.order_table.setRowCount(len(products))
-
-                for i, product in enumerate(products):
-                    for j, value in enumerate(product):
-                        self.warehouse_table.setItem(i, j, QTableWidgetItem(str(value)))
-                    self.order_table.setItem(i, 0, QTableWidgetItem('0'))
-                self.make_table_read_only()
-            except Exception as e:
-                print(f"Error updating warehouse table: {e}")
-                QMessageBox.critical(self, "Ошибка", f"Ошибка обновления таблицы склада: {e}")
+            # Запрос идёт в фоне; если склад сменят раньше, чем он закончится, старый запрос отменяется
+            self.executor.submit_query('warehouse', self.user, self.password,
+                                       self.query['select'], (warehouse_id,),
+                                       on_result=self.fill_warehouse_table,
+                                       on_error=self.on_warehouse_error)
+
+    def fill_warehouse_table(self, products):
+        self.warehouse_table.setRowCount(len(products))
+        self.order_table.setRowCount(len(products))
+
+        for i, product in enumerate(products):
+            for j, value in enumerate(product[:self.warehouse_table.columnCount()]):
+                self.warehouse_table.setItem(i, j, QTableWidgetItem(str(value)))
+            self.order_table.setItem(i, 0, QTableWidgetItem('0'))
+        self.make_table_read_only()
+        self.row_filter.set_rows(products)
+        self.apply_row_filter()
+
+    def apply_row_filter(self):
+        for row in range(self.warehouse_table.rowCount()):
+            hidden = not self.row_filter.accepts(row)
+            self.warehouse_table.setRowHidden(row, hidden)
+            self.order_table.setRowHidden(row, hidden)
+
+    def on_warehouse_error(self, error):
+        print(f"Error updating warehouse table: {error}")
+        QMessageBox.critical(self, "Ошибка", f"Ошибка обновления таблицы склада: {error}")
 
     def search_products(self):
         search_text = self.search_box.text().lower()  # Получаем текст из поля поиска
         warehouse_id = self.combo_box.currentData()
         if warehouse_id:
-            try:
-                with Database(self.user, self.password) as db:
-                    db.cursor.execute(self.get_search_query(), (f'%{search_text}%', warehouse_id))
-                    products = db.cursor.fetchall()
-
-                self.warehouse_table.setRowCount(len(products))
-                self.order_table.setRowCount(len(products))
-
-                for i, product in enumerate(products):
-                    for j, value in enumerate(product):
-                        self.warehouse_table.setItem(i, j, QTableWidgetItem(str(value)))
-                    self.order_table.setItem(i, 0, QTableWidgetItem('0'))
-                self.make_table_read_only()
-            except Exception as e:
-                print(f"Error searching products: {e}")
-                QMessageBox.critical(self, "Ошибка", f"Ошибка поиска продуктов: {e}")
+            # Тот же ключ, что и у загрузки склада: показываем только последний запрошенный результат
+            self.executor.submit_query('warehouse', self.user, self.password,
+                                       self.get_search_query(), search_params(search_text, warehouse_id=warehouse_id),
+                                       on_result=self.fill_warehouse_table,
+                                       on_error=self.on_search_error)
+
+    def on_search_error(self, error):
+        print(f"Error searching products: {error}")
+        QMessageBox.critical(self, "Ошибка", f"Ошибка поиска продуктов: {error}")
+
+    def export_table(self):
+        warehouse_id = self.combo_box.currentData()
+        if warehouse_id is None:
+            return
+        search_text = self.search_box.text()
+        if search_text.strip():
+            query, params = self.get_search_query(), search_params(search_text, warehouse_id=warehouse_id)
+        else:
+            query, params = self.query['select'], (warehouse_id,)
+        run_export(self, query, params, f'warehouse_{warehouse_id}')
+
+    def closeEvent(self, event):
+        self.executor.cancel_all()
+        super().closeEvent(event)
 
     def make_table_read_only(self):
         for row in range(self.warehouse_table.rowCount()):
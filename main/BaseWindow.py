@@ -9,12 +9,20 @@ from PyQt5.QtWidgets import (
 from PyQt5 import QtCore, QtGui, QtWidgets
 from psycopg2 import OperationalError, sql
 from Database import Database
+from Search import search_params
 from EditDialog import EditDialog  # Импортируем EditDialog
+from TableModel import DataTableView, RowFilter, LiveSearch
+from QueryExecutor import QueryExecutor
+from ChangeSetWriter import ChangeSetWriter
+from Exporter import run_export
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
 
 class BaseWindow(QMainWindow):
+    search_fields = ()  # Столбцы, по которым ищет поиск по мере ввода; пусто - все столбцы
+    edit_columns = ()  # Редактируемые столбцы таблицы (всё, кроме id) для пакетного сохранения
+
     def __init__(self, title, table_headers, user, password, table_name):
         super().__init__()
         self.table_name = table_name
@@ -22,12 +30,15 @@ class BaseWindow(QMainWindow):
         self.password = password
         self.setWindowTitle(title)
         self.setGeometry(600, 200, 800, 600)
+        self.executor = QueryExecutor(self)
 
         layout = QVBoxLayout()
 
-        self.table_widget = QTableWidget()
+        self.table_widget = DataTableView()
         layout.addWidget(self.table_widget)
         self.table_widget.cellDoubleClicked.connect(self.edit_item)  # Добавляем обработчик двойного клика
+        self.row_filter = RowFilter(self.search_columns(table_headers), self)
+        self.table_widget.set_row_filter(self.row_filter)
 
         button_layout = QHBoxLayout()
 
@@ -47,14 +58,20 @@ class BaseWindow(QMainWindow):
         self.save_button.clicked.connect(self.save_changes)
         button_layout.addWidget(self.save_button)
 
+        self.export_button = QPushButton('Экспорт')
+        self.export_button.clicked.connect(self.export_table)
+        button_layout.addWidget(self.export_button)
+
         # Создание элементов поиска
         search_layout = QHBoxLayout()
         self.search_label = QLabel('Поиск:')
         search_layout.addWidget(self.search_label)
         self.search_box = QLineEdit()
         search_layout.addWidget(self.search_box)
+        self.live_search = LiveSearch(self.search_box, self.row_filter, self.table_widget.is_complete,
+                                      self.search_items, parent=self)
         self.search_button = QPushButton('Поиск')
-        self.search_button.clicked.connect(self.search_items)
+        self.search_button.clicked.connect(self.live_search.run_server_search)
         search_layout.addWidget(self.search_button)
 
         layout.addLayout(button_layout)
@@ -67,6 +84,7 @@ class BaseWindow(QMainWindow):
         self.table_headers = table_headers
         self.update_table()
         self.changes = []  # Для отслеживания изменений
+        self.last_pending_id = 0
 
         self.dialog_open = False  # Флаг для отслеживания открытого диалогового окна
 
@@ -74,61 +92,48 @@ class BaseWindow(QMainWindow):
         if not self.dialog_open:  # Проверяем, открыто ли уже диалоговое окно
             self.dialog_open = True  # Устанавливаем флаг в True
             logging.debug(f"Opening EditDialog for row {row}, column {column}")
-            dialog = EditDialog(self.table_widget, row)
+            dialog = EditDialog(self.table_widget, row, table=self.table_name)
             if dialog.exec_() == QDialog.Accepted:
                 data = dialog.get_data()
                 logging.debug(f"Collected data: {data}")
-                for col, value in enumerate(data):
-                    self.table_widget.setItem(row, col + 1, QTableWidgetItem(value))  # Обновляем данные в таблице
-                self.changes.append(('update', row, data))
+                self.table_widget.set_values(row, data, 1)  # Обновляем данные в таблице
+                self.changes.append(('update', self.table_widget.item(row, 0).text(), data))
                 QMessageBox.information(self, 'Успех', 'Данные успешно обновлены!')
             self.dialog_open = False  # Сбрасываем флаг после закрытия диалогового окна
 
     def update_table(self):
         try:
             with Database(self.user, self.password) as db:
-                db.update_id(self.table_name)
                 db.cursor.execute(self.get_select_query())
-                items = db.cursor.fetchall()
-                self.table_widget.setRowCount(len(items))
-                self.table_widget.setColumnCount(len(self.table_headers))
-                self.table_widget.setHorizontalHeaderLabels(self.table_headers)
-                for i, item in enumerate(items):
-                    for j, value in enumerate(item):
-                        self.table_widget.setItem(i, j, QTableWidgetItem(str(value)))
-                self.make_table_read_only()
+                self.table_widget.set_rows(db.cursor.fetchall(), self.table_headers)
         except Exception as e:
             logging.error(f"Error loading data: {e}")
             QMessageBox.critical(self, 'Ошибка', f'Ошибка при загрузке данных: {e}')
 
+    def search_columns(self, table_headers):
+        columns = [table_headers.index(field) for field in self.search_fields if field in (table_headers or [])]
+        return columns or None
+
     def search_items(self):
         search_text = self.search_box.text().lower()  # Получаем текст из поля поиска
-        try:
-            with Database(self.user, self.password) as db:
-                db.update_id(self.table_name)
-                query = self.get_search_query()
-                db.cursor.execute(query, (f'%{search_text}%',))
-                items = db.cursor.fetchall()
-                self.table_widget.setRowCount(len(items))
-                self.table_widget.setColumnCount(len(self.table_headers))
-                self.table_widget.setHorizontalHeaderLabels(self.table_headers)
-                for i, item in enumerate(items):
-                    for j, value in enumerate(item):
-                        self.table_widget.setItem(i, j, QTableWidgetItem(str(value)))
-                self.make_table_read_only()
-        except Exception as e:
-            logging.error(f"Error searching items: {e}")
-            QMessageBox.critical(self, 'Ошибка', f'Ошибка поиска: {e}')
+        # Запрос в фоне; следующий поиск отменяет ещё не завершённый
+        self.executor.submit_query('search', self.user, self.password,
+                                   self.get_search_query(), search_params(search_text),
+                                   on_result=lambda rows: self.table_widget.set_rows(rows, self.table_headers),
+                                   on_error=self.on_search_error)
+
+    def on_search_error(self, error):
+        logging.error(f"Error searching items: {error}")
+        QMessageBox.critical(self, 'Ошибка', f'Ошибка поиска: {error}')
 
     def add_item(self):
-        dialog = EditDialog(self.table_widget)
+        dialog = EditDialog(self.table_widget, table=self.table_name)
         if dialog.exec_() == QDialog.Accepted:
             data = dialog.get_data()
             try:
                 with Database(self.user, self.password) as db:
-                    new_id = db.get_next_id(self.table_name)
-                    logging.debug(f"Inserting new row with ID {new_id} and data: {data}")
-                    db.cursor.execute(self.get_insert_query(), (new_id, *data))
+                    logging.debug(f"Inserting new row with data: {data}")
+                    db.cursor.execute(self.get_insert_query(), data)  # id выдаёт последовательность
                     db.conn.commit()
                     self.update_table()
                     QMessageBox.information(self, 'Успех', 'Элемент успешно добавлен!')
@@ -140,44 +145,66 @@ class BaseWindow(QMainWindow):
         selected_row = self.table_widget.currentRow()
         if selected_row >= 0:
             id_item = self.table_widget.item(selected_row, 0)
-            if id_item:
-                self.changes.append(('delete', id_item.text(), None))
+            if id_item and id_item.text():
+                self.record_delete(id_item.text())
             self.table_widget.removeRow(selected_row)
             QMessageBox.information(self, 'Успех', 'Элемент успешно удалён!')
 
+    def pending_id(self):
+        # Временный id строки, добавленной в окне: отрицательный, с id из базы не совпадёт.
+        # По нему правки и удаление находят ещё не сохранённую вставку
+        self.last_pending_id -= 1
+        return self.last_pending_id
+
+    def record_delete(self, row_id):
+        if int(row_id) < 0:
+            # Строки в базе ещё нет - забываем её вставку и правки, удалять нечего
+            self.changes = [change for change in self.changes if str(change[1]) != str(row_id)]
+        else:
+            self.changes.append(('delete', row_id, None))
+
     def cancel_changes(self):
         self.update_table()
         self.changes.clear()
         QMessageBox.information(self, 'Успех', 'Изменения успешно откатаны')
 
     def save_changes(self):
-        try:
-            with Database(self.user, self.password) as db:
-                for change in self.changes:
-                    change_type, row_id, row_data = change
-                    if change_type == 'insert':
-                        db.cursor.execute(self.get_insert_query(), row_data)
-                    elif change_type == 'delete':
-                        db.cursor.execute(self.get_delete_query(), (row_id,))
-                    elif change_type == 'update':
-                        db.cursor.execute(self.get_update_query(), row_data + [row_id])
-                db.conn.commit()
-                self.changes.clear()
-                QMessageBox.information(self, 'Успех', 'Изменения успешно сохранены!')
-        except Exception as e:
-            logging.error(f"Error saving changes: {e}")
-            QMessageBox.critical(self, 'Ошибка', f'Произошла ошибка при сохранении: {e}')
-        finally:
-            if db.conn:
-                db.conn.close()
-                logging.debug("Database connection closed.")
-
-    def make_table_read_only(self):
-        for row in range(self.table_widget.rowCount()):
-            for col in range(self.table_widget.columnCount()):
-                item = self.table_widget.item(row, col)
-                if item:
-                    item.setFlags(item.flags() & ~QtCore.Qt.ItemIsEditable)
+        self.save_button.setEnabled(False)
+        self.executor.submit(None, self.write_changes, list(self.changes),
+                             on_result=self.on_changes_saved, on_error=self.on_save_error)
+
+    def write_changes(self, changes):
+        # Выполняется в фоновом потоке: все изменения одной транзакцией, несколькими пакетными запросами
+        with Database(self.user, self.password) as db:
+            counts = ChangeSetWriter(self.table_name, self.edit_columns).write(db.cursor, changes)
+            db.conn.commit()
+        return counts
+
+    def on_changes_saved(self, counts):
+        self.save_button.setEnabled(True)
+        self.changes.clear()
+        self.update_table()  # Подтягиваем id, выданные базой новым строкам
+        QMessageBox.information(self, 'Успех', 'Изменения успешно сохранены!')
+
+    def on_save_error(self, error):
+        self.save_button.setEnabled(True)
+        logging.error(f"Error saving changes: {error}")
+        QMessageBox.critical(self, 'Ошибка', f'Произошла ошибка при сохранении: {error}')
+
+    def export_table(self):
+        run_export(self, *self.get_export_query(), self.table_name)
+
+    def get_export_query(self):
+        # Выгружается то же, что показывает таблица: весь справочник или результат поиска
+        search_text = self.search_box.text()
+        if search_text.strip():
+            return self.get_search_query(), search_params(search_text)
+        return self.get_select_query(), None
+
+    def closeEvent(self, event):
+        self.executor.cancel_all()
+        self.table_widget.close_stream()  # Недочитанная выборка больше не догружается
+        super().closeEvent(event)
 
     def get_select_query(self):
         raise NotImplementedError
@@ -0,0 +1,318 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import datetime
+import platform
+import statistics
+import subprocess
+import tempfile
+
+# Воспроизводимый замер производительности. Создаёт в локальном PostgreSQL отдельную базу (по умолчанию
+# Warehouses_bench), заполняет её синтетическими данными заданного объёма (setseed - одинаково при каждом запуске)
+# и без окон на экране замеряет настоящие пути кода: загрузку таблицы, поиск, перемещение, резерв корзины
+# и заполнение шаблона документа. Результат пишется в JSON, чтобы сравнивать коммиты:
+#   python Benchmark.py --user postgres --password ... --products 100000
+#   python Benchmark.py --user postgres --password ... --compare bench_results/<прошлый>.json
+
+SCHEMA = """
+    DROP TABLE IF EXISTS Order_items, Orders, ProductInWarehouse, Products, Clients, Warehouses,
+        StockMovements, StockSnapshots, StockFold, StockTotals, StockTotalDeltas CASCADE;
+    CREATE TABLE Warehouses (
+        id serial PRIMARY KEY,
+        name varchar(255) NOT NULL,
+        address text,
+        geo_text text,
+        geo_coordinates text
+    );
+    CREATE TABLE Clients (
+        id serial PRIMARY KEY,
+        full_name varchar(255) NOT NULL,
+        info text,
+        phonenumber varchar(20),
+        address text
+    );
+    CREATE TABLE Products (
+        id serial PRIMARY KEY,
+        name varchar(255) NOT NULL,
+        article varchar(50),
+        lifetime integer,
+        description text,
+        category varchar(255),
+        png_url bytea,
+        price numeric(12, 2)
+    );
+    CREATE TABLE ProductInWarehouse (
+        warehouse_id integer NOT NULL REFERENCES Warehouses (id) ON DELETE CASCADE,
+        product_id integer NOT NULL REFERENCES Products (id) ON DELETE CASCADE,
+        amount integer NOT NULL DEFAULT 0,
+        PRIMARY KEY (warehouse_id, product_id)
+    );
+    CREATE TABLE Orders (
+        id serial PRIMARY KEY,
+        client_id integer REFERENCES Clients (id) ON DELETE CASCADE,
+        price numeric(12, 2),
+        date timestamp,
+        status varchar(50)
+    );
+    CREATE TABLE Order_items (
+        order_id integer REFERENCES Orders (id) ON DELETE CASCADE,
+        product_id integer REFERENCES Products (id) ON DELETE CASCADE,
+        amount integer,
+        price numeric(12, 2),
+        warehouse_id integer REFERENCES Warehouses (id) ON DELETE CASCADE
+    );
+"""
+
+DATA = """
+    SELECT setseed(%(seed)s);
+    INSERT INTO Warehouses (name, address, geo_text, geo_coordinates)
+    SELECT 'Склад ' || g, 'г.Москва, ул.Складская, дом ' || g || ', корпус 1', 'Район ' || g,
+           round((55 + random())::numeric, 6) || ', ' || round((37 + random())::numeric, 6)
+    FROM generate_series(1, %(warehouses)s) g;
+    INSERT INTO Clients (full_name, info, phonenumber, address)
+    SELECT (ARRAY['Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Волков', 'Соколов'])[1 + floor(random() * 8)::int]
+           || ' ' || (ARRAY['Иван', 'Пётр', 'Алексей', 'Сергей', 'Андрей', 'Дмитрий'])[1 + floor(random() * 6)::int]
+           || ' ' || (ARRAY['Иванович', 'Петрович', 'Сергеевич', 'Андреевич'])[1 + floor(random() * 4)::int],
+           'Клиент ' || g, '+7' || lpad(floor(random() * 1e10)::bigint::text, 10, '0'),
+           'г.Москва, ул.Тверская, дом ' || g || ', квартира ' || (1 + floor(random() * 200)::int)
+    FROM generate_series(1, %(clients)s) g;
+    INSERT INTO Products (name, article, lifetime, description, category, price)
+    SELECT (ARRAY['Стол', 'Стул', 'Шкаф', 'Лампа', 'Полка', 'Кресло', 'Диван', 'Тумба'])[1 + floor(random() * 8)::int]
+           || ' ' || (ARRAY['офисный', 'деревянный', 'складной', 'угловой', 'детский'])[1 + floor(random() * 5)::int]
+           || ' ' || g,
+           (100000 + g)::text, 1 + floor(random() * 120)::int, 'Описание товара ' || g,
+           (ARRAY['Мебель', 'Свет', 'Хранение', 'Офис'])[1 + floor(random() * 4)::int],
+           round((100 + random() * 50000)::numeric, 2)
+    FROM generate_series(1, %(products)s) g;
+    INSERT INTO ProductInWarehouse (warehouse_id, product_id, amount)
+    SELECT w, p, 1 + floor(random() * 1000)::int
+    FROM generate_series(1, %(warehouses)s) w, generate_series(1, %(products)s) p
+    WHERE w <= 2 OR random() < %(stock_density)s;  -- на складах 1 и 2 есть все товары: по ним идут замеры
+    INSERT INTO Orders (client_id, price, date, status)
+    SELECT 1 + floor(random() * %(clients)s)::int, round((random() * 100000)::numeric, 2),
+           now() - random() * interval '365 days', (ARRAY['В процессе', 'Завершён'])[1 + floor(random() * 2)::int]
+    FROM generate_series(1, %(orders)s) g;
+    INSERT INTO Order_items (order_id, product_id, amount, price, warehouse_id)
+    SELECT o, 1 + floor(random() * %(products)s)::int, 1 + floor(random() * 10)::int,
+           round((100 + random() * 50000)::numeric, 2), 1 + floor(random() * %(warehouses)s)::int
+    FROM generate_series(1, %(orders)s) o, generate_series(1, %(items_per_order)s) i;
+    ANALYZE;
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Замер производительности на синтетических данных')
+    parser.add_argument('--user', required=True)
+    parser.add_argument('--password', default='')
+    parser.add_argument('--database', default='Warehouses_bench')
+    parser.add_argument('--warehouses', type=int, default=20)
+    parser.add_argument('--clients', type=int, default=10000)
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--stock-density', type=float, default=0.3, help='Доля товаров на складах 3..N')
+    parser.add_argument('--orders', type=int, default=50000)
+    parser.add_argument('--items-per-order', type=int, default=3)
+    parser.add_argument('--basket', type=int, default=50, help='Строк в перемещении, корзине и документе')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=float, default=0.42)
+    parser.add_argument('--keep-data', action='store_true', help='Не пересоздавать данные, если база уже есть')
+    parser.add_argument('--output', help='Файл результата; по умолчанию bench_results/<коммит>_<время>.json')
+    parser.add_argument('--compare', help='JSON прошлого запуска для сравнения')
+    return parser.parse_args()
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def prepare_database(args):
+    import psycopg2
+    if args.database == 'Warehouses':
+        sys.exit('Бенчмарк пересоздаёт таблицы - рабочую базу Warehouses использовать нельзя')
+    admin = psycopg2.connect(dbname='postgres', user=args.user, password=args.password, host='127.0.0.1', port='5432')
+    admin.autocommit = True
+    with admin.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", (args.database,))
+        created = cursor.fetchone() is None
+        if created:
+            cursor.execute(f'CREATE DATABASE "{args.database}"')
+    admin.close()
+    if args.keep_data and not created:
+        return
+    conn = psycopg2.connect(dbname=args.database, user=args.user, password=args.password,
+                            host='127.0.0.1', port='5432', options='-c client_encoding=UTF8')
+    start = time.perf_counter()
+    with conn, conn.cursor() as cursor:
+        cursor.execute(SCHEMA)
+        cursor.execute(DATA, {'seed': args.seed, 'warehouses': args.warehouses, 'clients': args.clients,
+                              'products': args.products, 'stock_density': args.stock_density,
+                              'orders': args.orders, 'items_per_order': args.items_per_order})
+    conn.close()
+    print(f'Данные сгенерированы за {time.perf_counter() - start:.1f} с')
+
+
+class Runner():
+    def __init__(self, app, repeat):
+        self.app = app
+        self.repeat = repeat
+        self.results = {}
+
+    def wait(self):
+        # Дожидаемся фоновых запросов окна и доставки их сигналов в окно
+        from PyQt5.QtCore import QThreadPool
+        QThreadPool.globalInstance().waitForDone()
+        self.app.processEvents()
+
+    def measure(self, name, action, with_index=False):
+        # with_index: action получает номер прогона (например, чтобы чередовать направление перемещения)
+        from QueryStats import query_stats
+        action()  # Прогрев: кэши, подготовка планов
+        self.wait()
+        runs, queries = [], []
+        for index in range(self.repeat):
+            calls_before = query_stats.totals()[0]
+            start = time.perf_counter()
+            if with_index:
+                action(index)
+            else:
+                action()
+            self.wait()
+            runs.append((time.perf_counter() - start) * 1000)
+            queries.append(query_stats.totals()[0] - calls_before)
+        self.results[name] = {
+            'runs_ms': [round(run, 3) for run in runs],
+            'min_ms': round(min(runs), 3),
+            'median_ms': round(statistics.median(runs), 3),
+            'mean_ms': round(statistics.mean(runs), 3),
+            'max_ms': round(max(runs), 3),
+            'queries_per_run': round(statistics.mean(queries), 1),
+        }
+        print(f"{name:40s} median {self.results[name]['median_ms']:10.2f} ms, "
+              f"queries {self.results[name]['queries_per_run']}")
+
+
+def run_benchmarks(args, runner):
+    from Database import Database
+    from ClientWindow import ClientWindow
+    from ProductWindow import ProductWindow
+    from TransferWindow import TransferWindow
+    from AddProductWindow import AddProductWindow
+    from StockSummaryWindow import StockSummaryWindow
+    from DocumentRenderer import render_batch
+    from Operations import Orders
+
+    with Database(args.user, args.password) as db:
+        db.cursor.execute("""
+            SELECT p.id, p.name, p.price FROM Products p
+            JOIN StockBalances piw ON piw.product_id = p.id AND piw.warehouse_id = 1
+            WHERE piw.amount > %s ORDER BY p.id LIMIT %s
+        """, (args.repeat * 2 + 2, args.basket))
+        products = db.cursor.fetchall()
+        db.cursor.execute("INSERT INTO Orders (client_id, price, date, status) VALUES (1, 0, now(), 'В процессе') RETURNING id")
+        order_id = db.cursor.fetchone()[0]
+        db.conn.commit()
+
+    clients = ClientWindow(args.user, args.password)
+    runner.measure('ClientWindow.update_table', clients.update_table)
+    clients.search_box.setText('иван')
+    runner.measure('ClientWindow.search_items', clients.search_items)
+
+    product_window = ProductWindow(args.user, args.password)
+    runner.measure('ProductWindow.update_table', product_window.update_table)
+    product_window.search_box.setText('стол')
+    runner.measure('ProductWindow.search_items', product_window.search_items)
+
+    summary = StockSummaryWindow(args.user, args.password)
+    summary.search_box.setText('стол')
+    runner.measure('StockSummaryWindow.update_table', summary.update_table)
+
+    transfer = TransferWindow(args.user, args.password)
+
+    def transfer_products(index=1):
+        # Чётные прогоны везут товар со склада 1 на склад 2, нечётные - обратно: остатки не истощаются
+        source, target = (1, 2) if index % 2 == 0 else (2, 1)
+        transfer.write_changes([('move', source, target, product_id, 1) for product_id, name, price in products])
+    runner.measure('TransferWindow.save_changes', transfer_products, with_index=True)
+
+    basket = AddProductWindow(order_id, args.user, args.password)
+    lines = [(product_id, 1, float(price)) for product_id, name, price in products]
+    runner.measure('AddProductWindow.add_products_to_order', lambda: basket.reserve_products(1, lines))
+
+    orders = Orders(Database(args.user, args.password))
+    allocation_lines = [(product_id, args.repeat * 3) for product_id, name, price in products]
+    runner.measure('Orders.allocate', lambda: orders.allocate((55.5, 37.5), allocation_lines))
+
+    documents = [{'{from_warehouse}': '1', '{to_warehouse}': '2', '{product_name}': name,
+                  '{product_id}': str(product_id), '{amount}': '1'} for product_id, name, price in products]
+    runner.measure('DocumentCreator.fill_template', lambda: render_batch('transferpreset.docx', documents))
+
+    for window in (clients, product_window, summary, transfer, basket):
+        window.close()
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding='utf-8') as file:
+        baseline = json.load(file)
+    print(f"\nСравнение с {baseline_path} (коммит {baseline.get('commit')}):")
+    for name, result in results.items():
+        old = baseline.get('results', {}).get(name)
+        if old:
+            ratio = result['median_ms'] / old['median_ms'] if old['median_ms'] else float('inf')
+            print(f"{name:40s} {old['median_ms']:10.2f} -> {result['median_ms']:10.2f} ms  x{ratio:.2f}")
+
+
+def main():
+    args = parse_args()
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    os.environ['WAREHOUSES_DB'] = args.database  # До импорта Database
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    prepare_database(args)
+
+    # Документы и очередь рендеринга пишутся во временную папку, шаблоны - копия presets
+    work_dir = tempfile.mkdtemp(prefix='warehouse_bench_')
+    shutil.copytree(os.path.join(script_dir, 'presets'), os.path.join(work_dir, 'presets'))
+    os.chdir(work_dir)
+
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication(sys.argv)
+    from LoginWindowmain import start_session
+    from ConnectionPool import close_all_pools
+    from ReferenceCache import stop_reference_cache
+    from RenderQueue import shutdown_render_queue
+    try:
+        start_session(args.user, args.password)
+        runner = Runner(app, args.repeat)
+        run_benchmarks(args, runner)
+    finally:
+        stop_reference_cache()
+        shutdown_render_queue()
+        close_all_pools()
+        os.chdir(script_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('password', 'output', 'compare')},
+        'results': runner.results,
+    }
+    output = args.output or os.path.join(
+        script_dir, 'bench_results', f"{report['commit'] or 'nocommit'}_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f'\nРезультаты: {output}')
+    if args.compare:
+        compare(runner.results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+import io
+import os
+import re
+import csv
+import logging
+from psycopg2 import sql
+from StockLedger import apply_inventory
+
+# Массовая загрузка товаров и остатков из CSV/XLSX. Файл читается потоком, строки проверяются
+# по тем же правилам, что и в ProductEditDialog/EditDialog, годные уходят через COPY во временную
+# таблицу, а оттуда одним запросом сливаются в Products / ProductInWarehouse.
+# Отклонённые строки с причиной пишутся в файл рядом с исходным: <имя>.rejects.csv
+
+PROGRESS_STEP = 10000  # Как часто (в строках) сообщать о ходе загрузки
+COPY_BATCH = 1000  # Сколько строк за раз превращается в текст для COPY
+
+PRODUCT_COLUMNS = ('name', 'article', 'lifetime', 'description', 'category', 'png_url', 'price')
+PRODUCT_OPTIONAL = ('png_url',)  # Картинки в прайс-листах обычно нет
+STOCK_COLUMNS = ('warehouse_id', 'article', 'amount')
+
+MAX_INT = 999999999  # Как у QSpinBox в диалогах
+ARTICLE = re.compile(r'^\d+$')
+PRICE = re.compile(r'^\d+(\.\d{1,4})?$')
+
+
+class BulkImportError(Exception):
+    pass
+
+
+def check_int(value, column):
+    if not value.isdigit() or int(value) > MAX_INT:
+        return f'{column}: ожидается целое число от 0 до {MAX_INT}'
+    return None
+
+
+def validate_product(row):
+    for column in PRODUCT_COLUMNS:
+        if column not in PRODUCT_OPTIONAL and not row[column]:
+            return f'{column}: пустое значение'
+    if not ARTICLE.match(row['article']):
+        return 'article: допускаются только цифры'
+    if not PRICE.match(row['price']):
+        return 'price: ожидается число, не больше 4 знаков после точки'
+    return check_int(row['lifetime'], 'lifetime')
+
+
+def validate_stock(row):
+    for column in STOCK_COLUMNS:
+        if not row[column]:
+            return f'{column}: пустое значение'
+    if not ARTICLE.match(row['article']):
+        return 'article: допускаются только цифры'
+    return check_int(row['warehouse_id'], 'warehouse_id') or check_int(row['amount'], 'amount')
+
+
+class SourceFile():
+    # Построчное чтение CSV или XLSX: (номер строки, {столбец: значение}), доля прочитанного - в fraction()
+    def __init__(self, path, columns, optional=()):
+        self.path = path
+        self.columns = columns
+        self.optional = optional
+        self.position = lambda: 0.0
+
+    def fraction(self):
+        return self.position()
+
+    def rows(self):
+        if self.path.lower().endswith('.xlsx'):
+            records = self.xlsx_records()
+        else:
+            records = self.csv_records()
+        header = None
+        for line, record in records:
+            values = ['' if value is None else str(value).strip() for value in record]
+            if header is None:
+                header = self.read_header(values)
+                continue
+            if not any(values):
+                continue  # Пустые строки в конце таблиц Excel
+            yield line, {column: values[index] if index < len(values) else '' for column, index in header.items()}
+
+    def read_header(self, values):
+        names = [value.lower() for value in values]
+        missing = [column for column in self.columns if column not in names and column not in self.optional]
+        if missing:
+            raise BulkImportError(f"В первой строке файла нет столбцов: {', '.join(missing)}")
+        return {column: names.index(column) for column in self.columns if column in names}
+
+    def csv_records(self):
+        size = max(os.path.getsize(self.path), 1)
+        with open(self.path, 'rb') as raw:
+            sample = raw.read(65536)
+            raw.seek(0)
+            try:
+                sample.decode('utf-8')
+                encoding = 'utf-8-sig'
+            except UnicodeDecodeError as e:
+                # Обрыв многобайтового символа на границе образца - всё ещё UTF-8
+                encoding = 'utf-8-sig' if e.start >= len(sample) - 3 else 'cp1251'  # Excel в русской локали
+            text = io.TextIOWrapper(raw, encoding=encoding, newline='')
+            first_line = sample.decode(encoding, errors='ignore').splitlines()[0] if sample else ''
+            try:
+                dialect = csv.Sniffer().sniff(first_line, delimiters=';,\t')
+            except csv.Error:
+                dialect = csv.excel
+            self.position = lambda: raw.tell() / size
+            for line, record in enumerate(csv.reader(text, dialect), 1):
+                yield line, record
+
+    def xlsx_records(self):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise BulkImportError('Для загрузки XLSX установите пакет openpyxl или сохраните файл как CSV')
+        workbook = load_workbook(self.path, read_only=True, data_only=True)
+        try:
+            sheet = workbook.active
+            total = max(sheet.max_row or 1, 1)
+            line = 0
+            self.position = lambda: line / total
+            for line, record in enumerate(sheet.iter_rows(values_only=True), 1):
+                yield line, record
+        finally:
+            workbook.close()
+
+
+class CopySource():
+    # Файлоподобный объект для copy_expert: проверяет строки по мере того, как COPY их запрашивает,
+    # поэтому файл любого размера не загружается в память целиком
+    def __init__(self, source, columns, validate, rejects, progress=None):
+        self.rows = source.rows()
+        self.source = source
+        self.columns = columns
+        self.validate = validate
+        self.rejects = rejects
+        self.progress = progress
+        self.buffer = ''
+        self.read_count = 0
+        self.loaded = 0
+        self.rejected = 0
+
+    def read(self, size=-1):
+        while self.rows is not None and (size is None or size < 0 or len(self.buffer) < size):
+            self.fill()
+        if size is None or size < 0:
+            data, self.buffer = self.buffer, ''
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def fill(self):
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator='\n')
+        for _ in range(COPY_BATCH):
+            try:
+                line, row = next(self.rows)
+            except StopIteration:
+                self.rows = None
+                break
+            self.read_count += 1
+            error = self.validate(row)
+            if error:
+                self.reject(line, error, row)
+            else:
+                writer.writerow([line] + [row.get(column) or None for column in self.columns])
+                self.loaded += 1
+            if self.progress is not None and self.read_count % PROGRESS_STEP == 0:
+                self.progress(int(self.source.fraction() * 90))  # Последние 10% - слияние в базе
+        self.buffer += out.getvalue()
+
+    def reject(self, line, reason, row):
+        self.rejected += 1
+        self.rejects.write(line, reason, [row.get(column, '') for column in self.columns])
+
+
+class RejectFile():
+    # Файл создаётся только при первой отклонённой строке
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = columns
+        self.file = None
+        self.writer = None
+        self.count = 0
+
+    def write(self, line, reason, values):
+        if self.file is None:
+            self.file = open(self.path, 'w', encoding='utf-8-sig', newline='')
+            self.writer = csv.writer(self.file, delimiter=';')
+            self.writer.writerow(['line', 'reason', *self.columns])
+        self.writer.writerow([line, reason, *values])
+        self.count += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+        elif os.path.exists(self.path):
+            os.remove(self.path)  # Отказы от прошлой загрузки этого файла уже неактуальны
+
+
+def reject_path(path):
+    return f'{os.path.splitext(path)[0]}.rejects.csv'
+
+
+def copy_rows(db, table, source, columns, validate, rejects, progress):
+    copy_source = CopySource(source, columns, validate, rejects, progress)
+    query = sql.SQL("COPY {} (line, {}) FROM STDIN WITH (FORMAT csv)").format(
+        sql.Identifier(table), sql.SQL(', ').join(sql.Identifier(column) for column in columns))
+    db.cursor.copy_expert(query.as_string(db.cursor), copy_source)
+    return copy_source
+
+
+def import_products(db, path, progress=None):
+    # Товары сопоставляются по артикулу: существующие обновляются, новые добавляются.
+    # Если артикул встречается в файле несколько раз, берётся последняя строка
+    source = SourceFile(path, PRODUCT_COLUMNS, PRODUCT_OPTIONAL)
+    rejects = RejectFile(reject_path(path), PRODUCT_COLUMNS)
+    columns = sql.SQL(', ').join(sql.Identifier(column) for column in PRODUCT_COLUMNS)
+    try:
+        with db:
+            # Типы столбцов staging-таблицы совпадают с Products
+            db.cursor.execute(sql.SQL("""
+                CREATE TEMP TABLE import_products ON COMMIT DROP AS
+                SELECT 0 AS line, {} FROM Products WITH NO DATA
+            """).format(columns))
+            copied = copy_rows(db, 'import_products', source, PRODUCT_COLUMNS, validate_product, rejects, progress)
+            db.cursor.execute(sql.SQL("""
+                WITH src AS (
+                    SELECT DISTINCT ON (article) * FROM import_products ORDER BY article, line DESC
+                ), updated AS (
+                    UPDATE Products p SET {updates}
+                    FROM src WHERE p.article = src.article
+                    RETURNING 1
+                ), inserted AS (
+                    INSERT INTO Products ({columns})
+                    SELECT {columns} FROM src
+                    WHERE NOT EXISTS (SELECT 1 FROM Products p WHERE p.article = src.article)
+                    RETURNING 1
+                )
+                SELECT (SELECT count(*) FROM inserted), (SELECT count(*) FROM updated)
+            """).format(
+                columns=columns,
+                updates=sql.SQL(', ').join(sql.SQL("{0} = src.{0}").format(sql.Identifier(column))
+                                           for column in PRODUCT_COLUMNS)))
+            inserted, updated = db.cursor.fetchone()
+            db.conn.commit()
+    finally:
+        rejects.close()
+    if progress is not None:
+        progress(100)
+    logging.debug(f"Product import {path}: {inserted} inserted, {updated} updated, {rejects.count} rejected")
+    return {'read': copied.read_count, 'inserted': inserted, 'updated': updated,
+            'rejected': rejects.count, 'rejects': rejects.path if rejects.count else None}
+
+
+def import_stock(db, path, progress=None):
+    # Остатки задаются абсолютным количеством (инвентаризация), товар ищется по артикулу.
+    # Строки с несуществующим складом или артикулом попадают в файл отказов после COPY
+    source = SourceFile(path, STOCK_COLUMNS)
+    rejects = RejectFile(reject_path(path), STOCK_COLUMNS)
+    try:
+        with db:
+            db.cursor.execute("""
+                CREATE TEMP TABLE import_stock (line integer, warehouse_id integer, article text, amount integer)
+                ON COMMIT DROP
+            """)
+            copied = copy_rows(db, 'import_stock', source, STOCK_COLUMNS, validate_stock, rejects, progress)
+            db.cursor.execute("""
+                SELECT s.line, s.warehouse_id, s.article, s.amount,
+                       NOT EXISTS (SELECT 1 FROM Warehouses w WHERE w.id = s.warehouse_id)
+                FROM import_stock s
+                WHERE NOT EXISTS (SELECT 1 FROM Warehouses w WHERE w.id = s.warehouse_id)
+                   OR NOT EXISTS (SELECT 1 FROM Products p WHERE p.article = s.article)
+                ORDER BY s.line
+            """)
+            for line, warehouse_id, article, amount, no_warehouse in db.cursor:
+                reason = 'склад не найден' if no_warehouse else 'товар с таким артикулом не найден'
+                rejects.write(line, reason, [warehouse_id, article, amount])
+            # Разница с текущими остатками попадает в журнал движений как инвентаризация
+            inserted, updated = apply_inventory(db.cursor, """
+                SELECT DISTINCT ON (s.warehouse_id, p.id) s.warehouse_id, p.id AS product_id, s.amount
+                FROM import_stock s
+                JOIN Warehouses w ON w.id = s.warehouse_id
+                JOIN Products p ON p.article = s.article
+                ORDER BY s.warehouse_id, p.id, s.line DESC
+            """, reference=os.path.basename(path))
+            db.conn.commit()
+    finally:
+        rejects.close()
+    if progress is not None:
+        progress(100)
+    logging.debug(f"Stock import {path}: {inserted} inserted, {updated} updated, {rejects.count} rejected")
+    return {'read': copied.read_count, 'inserted': inserted, 'updated': updated,
+            'rejected': rejects.count, 'rejects': rejects.path if rejects.count else None}
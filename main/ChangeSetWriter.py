@@ -0,0 +1,58 @@
+import logging
+from psycopg2 import sql
+from psycopg2.extras import execute_values, execute_batch
+
+
+class ChangeSetWriter():
+    # Сохраняет накопленные в окне изменения пачками: все удаления одним DELETE ... ANY,
+    # изменения через execute_batch, новые строки одним INSERT ... VALUES через execute_values.
+    # changes - список ('insert' | 'update' | 'delete', id, данные) в том виде, как его копят окна
+    def __init__(self, table_name, columns, page_size=1000):
+        self.table_name = table_name
+        self.columns = list(columns)
+        self.page_size = page_size
+
+    def group(self, changes):
+        # Новые строки окна несут отрицательный временный id (BaseWindow.pending_id):
+        # правка такой строки меняет данные её вставки, а не уходит в UPDATE
+        inserts = {}  # Временный id -> данные, в порядке добавления
+        updates = {}  # id -> данные; при нескольких правках одной строки побеждает последняя
+        deletes = set()
+        for change_type, row_id, row_data in changes:
+            if change_type == 'insert':
+                key = int(row_id) if row_id not in (None, '') else ('insert', len(inserts))
+                inserts[key] = tuple(row_data)
+            elif change_type == 'update':
+                if row_id in (None, '') or int(row_id) < 0:
+                    key = int(row_id) if row_id not in (None, '') else None
+                    if key in inserts:
+                        inserts[key] = tuple(row_data)
+                    else:
+                        logging.debug(f"Skipping update of an unknown unsaved row in {self.table_name}")
+                    continue
+                updates[int(row_id)] = tuple(row_data)
+            elif change_type == 'delete':
+                if int(row_id) < 0:
+                    inserts.pop(int(row_id), None)  # Строка так и не попала в базу
+                    continue
+                deletes.add(int(row_id))
+        for row_id in deletes:
+            updates.pop(row_id, None)  # Изменять удаляемую строку незачем
+        return list(inserts.values()), updates, deletes
+
+    def write(self, cursor, changes):
+        inserts, updates, deletes = self.group(changes)
+        table = sql.Identifier(self.table_name)
+        columns = [sql.Identifier(column) for column in self.columns]
+        if deletes:
+            cursor.execute(sql.SQL("DELETE FROM {} WHERE id = ANY(%s)").format(table), (sorted(deletes),))
+        if updates:
+            query = sql.SQL("UPDATE {} SET {} WHERE id = %s").format(
+                table, sql.SQL(', ').join(sql.SQL("{} = %s").format(column) for column in columns))
+            execute_batch(cursor, query.as_string(cursor), [data + (row_id,) for row_id, data in updates.items()],
+                          page_size=self.page_size)
+        if inserts:
+            query = sql.SQL("INSERT INTO {} ({}) VALUES %s").format(table, sql.SQL(', ').join(columns))
+            execute_values(cursor, query.as_string(cursor), inserts, page_size=self.page_size)
+        logging.debug(f"{self.table_name}: {len(inserts)} inserted, {len(updates)} updated, {len(deletes)} deleted")
+        return len(inserts), len(updates), len(deletes)
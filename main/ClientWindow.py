@@ -8,6 +8,8 @@ from PyQt5.QtWidgets import (
 )
 from psycopg2 import OperationalError, sql
 from Database import Database
+from SchemaCatalog import get_schema_catalog
+from Search import client_rank
 from BaseWindow import BaseWindow
 from EditDialog import EditDialog  # Импортируем EditDialog
 from ViewOrdersWindow import ViewOrdersWindow
@@ -16,9 +18,12 @@ logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %
 
 
 class ClientWindow(BaseWindow):
+    search_fields = ('full_name',)
+    edit_columns = ('full_name', 'info', 'phonenumber', 'address')
+
     def __init__(self, user, password):
         self.db = Database(user, password)
-        column_names = self.db.get_column_names('clients')
+        column_names = get_schema_catalog(user, password).column_names('clients')
         super().__init__('Клиенты', column_names, user, password, 'clients')
 
         self.view_orders_button = QPushButton('Посмотреть заказы')
@@ -27,10 +32,8 @@ class ClientWindow(BaseWindow):
         layout.addWidget(self.view_orders_button)
 
     def view_orders(self):
-        selected_items = self.table_widget.selectedItems()
-        if selected_items:
-            first_item = selected_items[0]
-            row = first_item.row()
+        row = self.table_widget.currentRow()
+        if row >= 0:
             client_id = self.table_widget.item(row, 0).text()
             view_orders_window = ViewOrdersWindow(self.user, self.password, client_id)
             view_orders_window.exec_()
@@ -45,8 +48,8 @@ class ClientWindow(BaseWindow):
 
     def get_insert_query(self):
         return """
-            INSERT INTO Clients (id, full_name, info, phonenumber, address)
-            VALUES (%s, %s, %s, %s, %s)
+            INSERT INTO Clients (full_name, info, phonenumber, address)
+            VALUES (%s, %s, %s, %s)
         """
 
     def get_delete_query(self):
@@ -59,82 +62,43 @@ class ClientWindow(BaseWindow):
         """
 
     def get_search_query(self):
-        return """SELECT id, full_name, info, phonenumber, address
+        return f"""SELECT id, full_name, info, phonenumber, address
             FROM Clients
-            WHERE LOWER(full_name) LIKE %s"""
+            WHERE LOWER(full_name) LIKE %(pattern)s
+            ORDER BY {client_rank()}, id"""
 
     def add_item(self):
-        dialog = EditDialog(self.table_widget)
+        dialog = EditDialog(self.table_widget, table='clients')
         if dialog.exec_() == QDialog.Accepted:
             data = dialog.get_data()
-            row_position = self.table_widget.rowCount()
-            self.table_widget.insertRow(row_position)
-            for col, value in enumerate(data):
-                self.table_widget.setItem(row_position, col + 1, QTableWidgetItem(value))  # Обновляем данные в таблице
-            self.update_ids()
-            self.make_table_read_only()
-            self.changes.append(('insert', None, data))
+            row_id = self.pending_id()  # Настоящий id появится после сохранения
+            self.table_widget.add_row([row_id, *data])
+            self.changes.append(('insert', row_id, data))
             QMessageBox.information(self, 'Успех', 'Элемент успешно добавлен!')
 
     def delete_item(self):
         selected_row = self.table_widget.currentRow()
         if selected_row >= 0:
             id_item = self.table_widget.item(selected_row, 0)
-            if id_item:
-                self.changes.append(('delete', id_item.text(), None))
+            if id_item and id_item.text():
+                self.record_delete(id_item.text())
             self.table_widget.removeRow(selected_row)
-            self.update_ids()
             QMessageBox.information(self, 'Успех', 'Элемент успешно удалён!')
 
-    def update_ids(self):
-        for row in range(self.table_widget.rowCount()):
-            self.table_widget.setItem(row, 0, QTableWidgetItem(str(row + 1)))
-
     def cancel_changes(self):
         self.update_table()
         self.changes.clear()
         QMessageBox.information(self, 'Успех', 'Изменения успешно откатаны')
 
-    def save_changes(self):
-        try:
-            with Database(self.user, self.password) as db:
-                for change in self.changes:
-                    change_type, row_id, row_data = change
-                    if change_type == 'insert':
-                        new_id = db.get_next_id('clients')
-                        db.cursor.execute(self.get_insert_query(), (new_id, *row_data))
-                    elif change_type == 'delete':
-                        db.cursor.execute(self.get_delete_query(), (row_id,))
-                    elif change_type == 'update':
-                        db.cursor.execute(self.get_update_query(), row_data + [row_id])
-
-                # Обновляем ID в базе данных
-                for row in range(self.table_widget.rowCount()):
-                    row_id = self.table_widget.item(row, 0).text()
-                    db.cursor.execute("UPDATE Clients SET id = %s WHERE id = %s", (row + 1, row_id))
-
-                db.conn.commit()
-                self.changes.clear()
-                QMessageBox.information(self, 'Успех', 'Изменения успешно сохранены!')
-        except Exception as e:
-            logging.error(f"Error saving changes: {e}")
-            QMessageBox.critical(self, 'Ошибка', f'Произошла ошибка при сохранении: {e}')
-        finally:
-            if db.conn:
-                db.conn.close()
-                logging.debug("Database connection closed.")
-
     def edit_item(self, row, column):
         logging.debug(f"Opening EditDialog for row {row}, column {column}")
-        dialog = EditDialog(self.table_widget, row)
+        dialog = EditDialog(self.table_widget, row, table='clients')
         result = dialog.exec_()
         if result == QDialog.Accepted:
             data = dialog.get_data()
             logging.debug(f"Collected data for update: {data}")
-            for col, value in enumerate(data):
-                self.table_widget.setItem(row, col + 1, QTableWidgetItem(value))  # Обновляем данные в таблице
+            self.table_widget.set_values(row, data, 1)  # Обновляем данные в таблице
             self.changes.append(('update', self.table_widget.item(row, 0).text(), data))
-            self.make_table_read_only()
             QMessageBox.information(self, 'Успех', 'Данные успешно обновлены!')
         elif result == QDialog.Rejected:
             logging.debug("EditDialog was cancelled.")
\ No newline at end of file
@@ -0,0 +1,183 @@
+import logging
+import threading
+import time
+import psycopg2
+from psycopg2 import extensions, pool
+
+
+class ConnectionPool():
+    # Общий пул соединений для одного логина: соединения открываются один раз
+    # и переиспользуются всеми окнами вместо psycopg2.connect на каждый запрос
+    def __init__(self, min_size=1, max_size=10, timeout=10, check_after=30, **conn_params):
+        self.conn_params = conn_params
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout  # Сколько ждать свободное соединение, сек
+        self.check_after = check_after  # Через сколько секунд простоя проверять соединение запросом
+        self.idle = []  # (соединение, время возврата в пул)
+        self.in_use = set()
+        self.connecting = 0  # Места, занятые подключениями, которые ещё открываются
+        self.closed = False
+        self.condition = threading.Condition()
+        self.counters = {
+            'created': 0,
+            'reused': 0,
+            'discarded': 0,
+            'waits': 0,
+            'timeouts': 0,
+        }
+
+    def warmup(self):
+        while True:
+            with self.condition:
+                if self.closed or len(self.idle) + len(self.in_use) + self.connecting >= self.min_size:
+                    return
+                self.connecting += 1
+            conn = self._connect()
+            with self.condition:
+                self.connecting -= 1
+                if self.closed:
+                    self._discard(conn)
+                else:
+                    self.idle.append((conn, time.monotonic()))
+                self.condition.notify()
+
+    def _connect(self):
+        # Вызывается без блокировки пула с уже занятым местом (connecting): медленное подключение
+        # не задерживает release и acquire других потоков. При ошибке место освобождается
+        try:
+            conn = psycopg2.connect(**self.conn_params)
+        except Exception:
+            with self.condition:
+                self.connecting -= 1
+                self.condition.notify()
+            raise
+        with self.condition:
+            self.counters['created'] += 1
+            logging.debug(f"Pool: opened connection #{self.counters['created']}")
+        return conn
+
+    def _is_alive(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if conn.info.transaction_status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if time.monotonic() - idle_since < self.check_after:
+            return True
+        # Соединение долго простаивало - сервер мог его закрыть
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        self.counters['discarded'] += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            conn, idle_since = self._reserve(deadline)
+            if conn is None:
+                conn = self._connect()
+                with self.condition:
+                    self.connecting -= 1
+                    if self.closed:
+                        self._discard(conn)
+                        self.condition.notify()
+                        raise pool.PoolError('Пул соединений закрыт')
+                    self.in_use.add(conn)
+                return conn
+            # Проверка соединения - запрос к серверу, тоже вне блокировки
+            if self._is_alive(conn, idle_since):
+                with self.condition:
+                    self.counters['reused'] += 1
+                return conn
+            with self.condition:
+                self.in_use.discard(conn)
+                self._discard(conn)
+                self.condition.notify()
+
+    def _reserve(self, deadline):
+        # Под блокировкой только выбор: простаивающее соединение (уже числится занятым) или место
+        # под новое - тогда (None, None)
+        with self.condition:
+            while True:
+                if self.closed:
+                    raise pool.PoolError('Пул соединений закрыт')
+                if self.idle:
+                    conn, idle_since = self.idle.pop()
+                    self.in_use.add(conn)
+                    return conn, idle_since
+                if len(self.in_use) + self.connecting < self.max_size:
+                    self.connecting += 1
+                    return None, None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.counters['timeouts'] += 1
+                    raise pool.PoolError(f'Нет свободных соединений (максимум {self.max_size})')
+                self.counters['waits'] += 1
+                self.condition.wait(remaining)
+
+    def release(self, conn):
+        with self.condition:
+            self.in_use.discard(conn)
+            if self.closed or conn.closed:
+                self._discard(conn)
+            else:
+                try:
+                    # Незавершённая транзакция (например, после SELECT) не должна уйти в пул
+                    if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                    self.idle.append((conn, time.monotonic()))
+                except psycopg2.Error:
+                    self._discard(conn)
+            self.condition.notify()
+
+    def stats(self):
+        with self.condition:
+            result = dict(self.counters)
+            result.update({
+                'idle': len(self.idle),
+                'in_use': len(self.in_use),
+                'connecting': self.connecting,
+                'max_size': self.max_size,
+            })
+            return result
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            for conn, _ in self.idle:
+                self._discard(conn)
+            self.idle.clear()
+            self.condition.notify_all()
+        logging.debug(f"Pool closed: {self.stats()}")
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(**conn_params):
+    # Один пул на логин (набор параметров подключения) на весь процесс
+    key = tuple(sorted(conn_params.items()))
+    with _pools_lock:
+        connection_pool = _pools.get(key)
+        if connection_pool is None or connection_pool.closed:
+            connection_pool = ConnectionPool(**conn_params)
+            _pools[key] = connection_pool
+        return connection_pool
+
+
+def close_all_pools():
+    with _pools_lock:
+        for connection_pool in _pools.values():
+            connection_pool.close()
+        _pools.clear()
@@ -9,6 +9,7 @@ from PyQt5.QtWidgets import (
 from PyQt5 import QtCore
 from psycopg2 import OperationalError, sql
 from Database import Database
+from ReferenceCache import get_reference_cache
 from EditDialog import EditDialog
 from datetime import datetime
 
@@ -61,12 +62,10 @@ class CurrentOrderWindow(QMainWindow):
 
     def update_clients(self):
         try:
-            with Database(self.user, self.password) as db:
-                db.cursor.execute("SELECT id, full_name FROM Clients")
-                clients = db.cursor.fetchall()
-                self.client_combo.clear()
-                for client in clients:
-                    self.client_combo.addItem(client[1], client[0])
+            clients = get_reference_cache().get('clients')
+            self.client_combo.clear()
+            for client in clients:
+                self.client_combo.addItem(client[1], client[0])
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка при загрузке клиентов: {e}")
 
@@ -122,16 +121,11 @@ class CurrentOrderWindow(QMainWindow):
         selected_row = self.table_widget.currentRow()
         if selected_row >= 0:
             id_item = self.table_widget.item(selected_row, 0)
-            if id_item:
+            if id_item and id_item.text():
                 self.changes.append(('delete', id_item.text(), None))
             self.table_widget.removeRow(selected_row)
-            self.update_ids()
             QMessageBox.information(self, "Успех", "Заказ успешно удален!")
 
-    def update_ids(self):
-        for row in range(self.table_widget.rowCount()):
-            self.table_widget.setItem(row, 0, QTableWidgetItem(str(row + 1)))
-
     def rollback_changes(self):
         self.update_table()
         self.changes.clear()
@@ -143,10 +137,9 @@ class CurrentOrderWindow(QMainWindow):
                 for change in self.changes:
                     change_type, client_id, row_data = change
                     if change_type == 'insert':
-                        new_id = db.get_next_id('orders')
                         db.cursor.execute(
-                            "INSERT INTO Orders (id, client_id, price, date, status) VALUES (%s, %s, %s, %s, %s)",
-                            (new_id, client_id, row_data[0], row_data[1], row_data[2])
+                            "INSERT INTO Orders (client_id, price, date, status) VALUES (%s, %s, %s, %s)",
+                            (client_id, row_data[0], row_data[1], row_data[2])
                         )
                     elif change_type == 'delete':
                         db.cursor.execute(
@@ -161,6 +154,7 @@ class CurrentOrderWindow(QMainWindow):
 
                 db.conn.commit()
                 self.changes.clear()
+                self.update_table()  # Подтягиваем id, выданные базой новым заказам
                 QMessageBox.information(self, "Успех", "Изменения успешно сохранены!")
         except Exception as e:
             if db.conn:
@@ -1,3 +1,4 @@
+import os
 import sys
 import logging
 import psycopg2
@@ -7,42 +8,81 @@ from PyQt5.QtWidgets import (
     QLabel, QLineEdit
 )
 from psycopg2 import OperationalError, sql
+from psycopg2.pool import PoolError
+from ConnectionPool import get_pool
+from PreparedStatements import PreparedCursor, register_statement
 from LoginWindowmain import GlobalData
 
+DATABASE_NAME = os.environ.get('WAREHOUSES_DB', 'Warehouses')  # Бенчмарк подставляет свою базу
+
+PRODUCTS_BY_ORDER = register_statement('products_by_order', """
+            SELECT p.id, p.name, oi.amount, oi.price, oi.warehouse_id
+            FROM Order_items oi 
+            JOIN Products p ON oi.product_id = p.id 
+            WHERE oi.order_id = %s
+            """)
+
 
 class Database():
     def __init__(self, user, password):
-        self.dbname = 'Warehouses'
+        self.dbname = DATABASE_NAME
         self.user = user
         self.password = password
         self.host = "127.0.0.1"
         self.port = "5432"
         self.conn = None
         self.cursor = None
+        self.depth = 0  # Вложенные with self (например, в ensure_* и журнале движений) используют то же соединение
+
+    def get_pool(self):
+        return get_pool(
+            dbname=self.dbname,
+            user=self.user,
+            password=self.password,
+            host=self.host,
+            port=self.port,
+            options='-c client_encoding=UTF8',
+            cursor_factory=PreparedCursor  # Статистика, журнал медленных запросов и подготовленные операторы
+        )
+
+    def create_pool(self):
+        # Вызывается один раз при входе: сразу открывает соединение и проверяет логин
+        connection_pool = self.get_pool()
+        connection_pool.warmup()
+        return connection_pool
+
+    def pool_stats(self):
+        return self.get_pool().stats()
 
     def __enter__(self):
+        self.depth += 1
+        if self.conn is not None:
+            return self
         try:
-            self.conn = psycopg2.connect(
-                dbname=self.dbname,
-                user=self.user,
-                password=self.password,
-                host=self.host,
-                port=self.port,
-                options='-c client_encoding=UTF8'
-            )
+            self.conn = self.get_pool().acquire()
             self.cursor = self.conn.cursor()
-            print("Database connection successful.")
-        except OperationalError as e:
-            print(f"Error connecting to the database: {e}")
-            QMessageBox.critical(None, "Database Error", f"Error connecting to the database: {e}")
-            sys.exit(1)
+        except (OperationalError, PoolError) as e:
+            self.depth -= 1
+            if self.conn is not None:
+                self.get_pool().release(self.conn)
+                self.conn = None
+            # Ошибку показывает вызывающий: окно - в своём обработчике (в том числе on_error фоновой задачи,
+            # где диалог вне потока GUI уронил бы Qt), OperationsCli - в журнале и коде выхода
+            logging.error(f"Error connecting to the database: {e}")
+            raise
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        self.depth -= 1
+        if self.depth > 0:
+            return False
         if self.cursor:
             self.cursor.close()
         if self.conn:
-            self.conn.close()
+            # Возвращаем соединение в пул, незакоммиченные изменения откатываются
+            self.get_pool().release(self.conn)
+        self.conn = None
+        self.cursor = None
         if exc_type:
             print(f"Ошибка закрытия соединения: {exc_val}")
         return False
@@ -63,13 +103,7 @@ class Database():
 
     def get_products_by_order(self, order_id):
         try:
-            query = """
-            SELECT p.id, p.name, oi.amount, oi.price, oi.warehouse_id
-            FROM Order_items oi 
-            JOIN Products p ON oi.product_id = p.id 
-            WHERE oi.order_id = %s
-            """
-            self.cursor.execute(query, (order_id,))
+            self.cursor.execute(PRODUCTS_BY_ORDER, (order_id,))
             result = self.cursor.fetchall()
             return result
         except Exception as e:
@@ -94,20 +128,10 @@ class Database():
             print(f"Ошибка при получении ID склада: {e}")
             return None
 
-    def get_column_names(self, tablename):
-        try:
-            with self as db:
-                self.cursor.execute(f"SELECT * FROM {tablename} LIMIT 0;")
-                column_names = [desc[0] for desc in self.cursor.description]
-                return column_names
-        except Exception as e:
-            print(f"Ошибка при получении имён столбцов: {e}")
-            return None
-
     def get_product_in_warehouse(self, warehouseid):
         try:
-            self.cursor.execute(f"""SELECT warehouse_id, product_id, amount, Products.name FROM ProductInWarehouse
-            JOIN Products ON Products.id = ProductInWarehouse.product_id
+            self.cursor.execute(f"""SELECT warehouse_id, product_id, amount, Products.name FROM StockBalances
+            JOIN Products ON Products.id = StockBalances.product_id
             WHERE warehouse_id = {warehouseid}
             """)
             result = self.cursor.fetchall()
@@ -116,30 +140,65 @@ class Database():
             print(f"Ошибка при товаров на складе: {e}")
             return None
 
-    def get_next_id(self, table_name):
+    def ensure_stock_key(self):
+        # Для INSERT ... ON CONFLICT нужен уникальный ключ (warehouse_id, product_id) в ProductInWarehouse
         try:
-            self.cursor.execute(f"SELECT MAX(id) FROM {table_name}")
-            max_id = self.cursor.fetchone()[0]
-            return (max_id or 0) + 1
+            with self as db:
+                db.cursor.execute("""
+                    SELECT 1 FROM pg_index i
+                    WHERE i.indrelid = 'productinwarehouse'::regclass AND i.indisunique
+                    AND (SELECT array_agg(a.attname::text ORDER BY a.attname) FROM pg_attribute a
+                         WHERE a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)) = ARRAY['product_id', 'warehouse_id']
+                """)
+                if db.cursor.fetchone() is None:
+                    db.cursor.execute("""
+                        CREATE UNIQUE INDEX IF NOT EXISTS productinwarehouse_warehouse_product_key
+                        ON ProductInWarehouse (warehouse_id, product_id)
+                    """)
+                    logging.debug("Unique key created on ProductInWarehouse (warehouse_id, product_id)")
+                db.conn.commit()
         except Exception as e:
-            print(f"Ошибка при нумерации: {e}")
-            return None
-    def update_id(self, table_name):
+            # Например, в таблице уже есть дубли строк по складу и товару - их нужно слить вручную
+            print(f"Ошибка при создании ключа остатков: {e}")
+
+    def ensure_order_items_key(self):
+        # Для INSERT ... ON CONFLICT в резерве корзины нужен уникальный ключ строки заказа (order_id, warehouse_id,
+        # product_id): один товар заказа может браться с нескольких складов (план allocate), и удаление строк
+        # заказа тоже ищет их по складу. Строки-дубли, оставшиеся от прежних версий, сливаются в одну
         try:
-            self.cursor.execute(f"SELECT * FROM {table_name} ORDER BY id")
-            rows = self.cursor.fetchall()
-            for new_id, row in enumerate(rows, start=1):
-                old_id = row[0]
-                self.cursor.execute(f"UPDATE {table_name} SET id = %s WHERE id = %s", (new_id, old_id))
+            with self as db:
+                db.cursor.execute("SELECT to_regclass('order_items_order_warehouse_product_key') IS NULL")
+                if db.cursor.fetchone()[0]:
+                    db.cursor.execute("LOCK TABLE Order_Items IN SHARE ROW EXCLUSIVE MODE")
+                    db.cursor.execute("""
+                        WITH duplicates AS (
+                            DELETE FROM Order_Items oi
+                            USING (SELECT order_id, warehouse_id, product_id FROM Order_Items
+                                   GROUP BY order_id, warehouse_id, product_id HAVING count(*) > 1) d
+                            WHERE oi.order_id = d.order_id AND oi.warehouse_id = d.warehouse_id
+                            AND oi.product_id = d.product_id
+                            RETURNING oi.order_id, oi.warehouse_id, oi.product_id, oi.amount, oi.price
+                        )
+                        INSERT INTO Order_Items (order_id, product_id, amount, price, warehouse_id)
+                        SELECT order_id, product_id, SUM(amount), max(price), warehouse_id FROM duplicates
+                        GROUP BY order_id, warehouse_id, product_id
+                    """)
+                    if db.cursor.rowcount:
+                        logging.debug(f"Order items: {db.cursor.rowcount} duplicated lines merged")
+                    db.cursor.execute("""
+                        CREATE UNIQUE INDEX order_items_order_warehouse_product_key
+                        ON Order_Items (order_id, warehouse_id, product_id)
+                    """)
+                    logging.debug("Unique key created on Order_Items (order_id, warehouse_id, product_id)")
+                db.conn.commit()
         except Exception as e:
-            print(f"Ошибка при нумерации: {e}")
-            return None
-        
+            print(f"Ошибка при создании ключа строк заказа: {e}")
+
     def get_products_by_warehouse(self, warehouse_id):
         try:
             query = """
             SELECT p.name, piw.amount
-            FROM ProductInWarehouse piw
+            FROM StockBalances piw
             JOIN Products p ON piw.product_id = p.id
             WHERE piw.warehouse_id = %s
             """
@@ -158,4 +217,33 @@ class Database():
             return result[0] if result else None
         except Exception as e:
             print(f"Error fetching product ID by name: {e}")
-            return None
\ No newline at end of file
+            return None
+
+
+class RowStream():
+    # Постраничное чтение большой выборки: в память попадают только запрошенные страницы, а не весь fetchall().
+    # Каждая страница - отдельный запрос LIMIT/OFFSET на соединении из пула, которое сразу возвращается:
+    # окно с недочитанной выборкой не держит ни соединение, ни открытую транзакцию, сколько бы оно ни было открыто.
+    # Запрос должен заканчиваться ORDER BY по уникальному ключу (..., id), иначе страницы могут пересекаться
+    def __init__(self, db, query, params=None, page_size=200):
+        self.db = db
+        self.query = query.strip().rstrip(';')
+        self.params = params
+        self.page_size = page_size
+        self.offset = 0
+        self.exhausted = False
+
+    def fetch_page(self):
+        if self.exhausted:
+            return []
+        with self.db as db:
+            db.cursor.execute(f"{self.query} LIMIT {int(self.page_size)} OFFSET {int(self.offset)}", self.params)
+            rows = db.cursor.fetchall()
+            db.conn.rollback()
+        self.offset += len(rows)
+        if len(rows) < self.page_size:
+            self.close()  # Всё прочитано
+        return rows
+
+    def close(self):
+        self.exhausted = True
@@ -0,0 +1,81 @@
+from PyQt5.QtWidgets import (
+    QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QPushButton, QTableWidget, QTableWidgetItem, QLabel
+)
+from PyQt5 import QtCore
+from QueryStats import query_stats, SLOW_QUERY_MS, SLOW_LOG_PATH
+from PreparedStatements import prepared_stats
+
+
+class DiagnosticsWindow(QMainWindow):
+    # Самые затратные запросы за сеанс и число обращений к базе по окнам и действиям
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle('Диагностика запросов')
+        self.setGeometry(500, 150, 1100, 700)
+
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel(f'Запросы по общему времени (медленнее {SLOW_QUERY_MS} мс пишутся в {SLOW_LOG_PATH})'))
+        self.queries_table = QTableWidget()
+        self.queries_table.setColumnCount(8)
+        self.queries_table.setHorizontalHeaderLabels(
+            ['Запрос', 'Вызовов', 'Всего, мс', 'Среднее, мс', 'Максимум, мс', 'Строк', 'Ошибок', 'Окна'])
+        layout.addWidget(self.queries_table)
+
+        layout.addWidget(QLabel('Обращения к базе по окнам и действиям'))
+        self.actions_table = QTableWidget()
+        self.actions_table.setColumnCount(3)
+        self.actions_table.setHorizontalHeaderLabels(['Окно.действие', 'Запросов', 'Всего, мс'])
+        layout.addWidget(self.actions_table)
+
+        layout.addWidget(QLabel('Подготовленные операторы (EXECUTE вместо разбора запроса)'))
+        self.prepared_table = QTableWidget()
+        self.prepared_table.setColumnCount(4)
+        self.prepared_table.setHorizontalHeaderLabels(['Оператор', 'Подготовок', 'Готовый план', 'Без подготовки'])
+        layout.addWidget(self.prepared_table)
+
+        button_layout = QHBoxLayout()
+        self.refresh_button = QPushButton('Обновить')
+        self.refresh_button.clicked.connect(self.update_tables)
+        button_layout.addWidget(self.refresh_button)
+        self.reset_button = QPushButton('Сбросить')
+        self.reset_button.clicked.connect(self.reset_stats)
+        button_layout.addWidget(self.reset_button)
+        layout.addLayout(button_layout)
+
+        container = QWidget()
+        container.setLayout(layout)
+        self.setCentralWidget(container)
+
+        self.update_tables()
+
+    def update_tables(self):
+        queries = query_stats.top_queries()
+        self.queries_table.setRowCount(len(queries))
+        for i, (query, calls, total_ms, avg_ms, max_ms, rows, errors, actions) in enumerate(queries):
+            values = [query, calls, f'{total_ms:.1f}', f'{avg_ms:.1f}', f'{max_ms:.1f}', rows, errors, ', '.join(actions)]
+            for j, value in enumerate(values):
+                item = QTableWidgetItem(str(value))
+                item.setFlags(item.flags() & ~QtCore.Qt.ItemIsEditable)
+                if j == 0:
+                    item.setToolTip(query)
+                self.queries_table.setItem(i, j, item)
+
+        actions = query_stats.top_actions()
+        self.actions_table.setRowCount(len(actions))
+        for i, (action, calls, total_ms) in enumerate(actions):
+            for j, value in enumerate([action, calls, f'{total_ms:.1f}']):
+                item = QTableWidgetItem(str(value))
+                item.setFlags(item.flags() & ~QtCore.Qt.ItemIsEditable)
+                self.actions_table.setItem(i, j, item)
+
+        prepared = prepared_stats()
+        self.prepared_table.setRowCount(len(prepared))
+        for i, values in enumerate(prepared):
+            for j, value in enumerate(values):
+                item = QTableWidgetItem(str(value))
+                item.setFlags(item.flags() & ~QtCore.Qt.ItemIsEditable)
+                self.prepared_table.setItem(i, j, item)
+
+    def reset_stats(self):
+        query_stats.reset()
+        self.update_tables()
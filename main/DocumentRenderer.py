@@ -0,0 +1,242 @@
+import os
+import re
+import copy
+import zipfile
+import datetime
+import threading
+from xml.sax.saxutils import escape
+from lxml import etree
+
+# Заполнение шаблонов docx. Модуль не зависит от Qt, поэтому выполняется в процессах RenderQueue.
+# Шаблон компилируется один раз: плейсхолдеры собираются в целые run-ы (оформление сохраняется),
+# XML частей документа режется на куски "текст / ключ", и заполнение - это склейка кусков со значениями
+
+W = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+PLACEHOLDER = re.compile(r'\{\w+\}')
+TEXT_PARTS = re.compile(r'word/(document|header\d*|footer\d*)\.xml$')
+ROW_MARKER = 'row-template'
+
+_templates = {}  # Имя файла -> (mtime, CompiledTemplate)
+_templates_lock = threading.Lock()
+
+
+def w(tag):
+    return f'{{{W}}}{tag}'
+
+
+class CompiledTemplate():
+    def __init__(self, template_path):
+        with zipfile.ZipFile(template_path) as archive:
+            self.entries = [(info, archive.read(info.filename)) for info in archive.infolist()]
+        self.trees = {}  # Части с текстом: document.xml, колонтитулы
+        self.parts = {}  # Часть -> [текст, ключ, текст, ключ, ..., текст]
+        for info, content in self.entries:
+            if TEXT_PARTS.match(info.filename):
+                tree = etree.fromstring(content)
+                for paragraph in tree.iter(w('p')):  # Абзацы в таблицах и колонтитулах тоже
+                    merge_placeholder_runs(paragraph)
+                self.trees[info.filename] = tree
+                self.parts[info.filename] = split_segments(serialize(tree))
+        self.batch_forms = {}  # Заголовок в таблице или нет -> (до строки, строка таблицы, после строки)
+        self.lock = threading.Lock()
+
+    def batch_form(self, title_in_table):
+        with self.lock:
+            form = self.batch_forms.get(title_in_table)
+            if form is None:
+                form = compile_batch(self.trees['word/document.xml'], title_in_table)
+                self.batch_forms[title_in_table] = form
+            return form
+
+    def title_keys(self):
+        paragraphs = placeholder_paragraphs(self.trees['word/document.xml'])
+        return PLACEHOLDER.findall(paragraph_text(paragraphs[0])) if paragraphs else []
+
+    def render(self, rows):
+        first = rows[0]
+        filled = {name: fill_segments(segments, first) for name, segments in self.parts.items()}
+        if len(rows) > 1:
+            # Заголовок остаётся абзацем, только если одинаков для всех строк
+            title_in_table = any(row.get(key) != first.get(key) for row in rows for key in self.title_keys())
+            before, row_segments, after = self.batch_form(title_in_table)
+            filled['word/document.xml'] = (fill_segments(before, first)
+                                           + ''.join(fill_segments(row_segments, row) for row in rows)
+                                           + fill_segments(after, first))
+        return filled
+
+    def save(self, output_path, filled):
+        with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for info, content in self.entries:
+                if info.filename in filled:
+                    content = filled[info.filename].encode('utf-8')
+                archive.writestr(info, content)
+
+
+def load_template(template_name):
+    # Шаблон компилируется один раз и перекомпилируется, только если файл в presets изменился
+    template_path = os.path.join('presets', template_name)
+    mtime = os.path.getmtime(template_path)
+    with _templates_lock:
+        cached = _templates.get(template_name)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, CompiledTemplate(template_path))
+            _templates[template_name] = cached
+        return cached[1]
+
+
+def render_template(template_name, data):
+    return render_batch(template_name, [data])
+
+
+def render_batch(template_name, rows):
+    # Один документ на всю операцию: заголовок заполняется один раз,
+    # поля товара превращаются в таблицу - по строке на каждый товар
+    template = load_template(template_name)
+    filled = template.render(rows)
+
+    # Путь к папке для сохранения
+    docs_folder = 'docs'
+    if not os.path.exists(docs_folder):
+        os.makedirs(docs_folder, exist_ok=True)
+
+    output_path = os.path.join(docs_folder, generate_unique_filename(template_name))
+    # Сохраняем заполненный документ
+    template.save(output_path, filled)
+    return output_path
+
+
+def text_nodes(paragraph):
+    return [node for node in paragraph.iter(w('t'))]
+
+
+def paragraph_text(paragraph):
+    return ''.join(node.text or '' for node in text_nodes(paragraph))
+
+
+def set_text(node, text):
+    node.text = text
+    node.set(XML_SPACE, 'preserve')
+
+
+def merge_placeholder_runs(paragraph):
+    # Word часто режет "{name}" на несколько run-ов. Плейсхолдер целиком переносится в run,
+    # где он начинается, - заменяется только текст, свойства run-а остаются
+    nodes = text_nodes(paragraph)
+    if len(nodes) < 2:
+        return
+    offsets = []
+    position = 0
+    for node in nodes:
+        offsets.append(position)
+        position += len(node.text or '')
+    text = ''.join(node.text or '' for node in nodes)
+
+    def node_at(position):
+        for index in range(len(nodes) - 1, -1, -1):
+            if offsets[index] <= position:
+                return index
+        return 0
+
+    for match in reversed(list(PLACEHOLDER.finditer(text))):
+        first, last = node_at(match.start()), node_at(match.end() - 1)
+        if first == last:
+            continue
+        start_text = nodes[first].text or ''
+        set_text(nodes[first], start_text[:match.start() - offsets[first]] + match.group())
+        for index in range(first + 1, last):
+            set_text(nodes[index], '')
+        set_text(nodes[last], (nodes[last].text or '')[match.end() - offsets[last]:])
+
+
+def keep_text(paragraph, start, end):
+    # Оставляет в абзаце только текст [start, end), не трогая оформление run-ов
+    position = 0
+    for node in text_nodes(paragraph):
+        text = node.text or ''
+        node_start, node_end = position, position + len(text)
+        position = node_end
+        kept = text[max(start, node_start) - node_start:max(min(end, node_end), node_start) - node_start]
+        if kept != text:
+            set_text(node, kept)
+
+
+def placeholder_paragraphs(tree):
+    body = tree.find(w('body'))
+    return [paragraph for paragraph in body.iterchildren(w('p')) if PLACEHOLDER.search(paragraph_text(paragraph))]
+
+
+def table_cell(paragraph):
+    cell = etree.Element(w('tc'))
+    cell.append(paragraph)
+    return cell
+
+
+def compile_batch(document, title_in_table):
+    # Абзацы с полями товара заменяются таблицей: строка подписей и одна строка-образец,
+    # которая при заполнении повторяется для каждого товара
+    tree = copy.deepcopy(document)
+    paragraphs = placeholder_paragraphs(tree)
+    lines = paragraphs if title_in_table else paragraphs[1:]
+    if not lines:
+        return split_segments(serialize(tree)), [], []
+
+    table = etree.Element(w('tbl'))
+    properties = etree.SubElement(table, w('tblPr'))
+    etree.SubElement(properties, w('tblW'), {w('w'): '0', w('type'): 'auto'})
+    borders = etree.SubElement(properties, w('tblBorders'))
+    for side in ('top', 'left', 'bottom', 'right', 'insideH', 'insideV'):
+        etree.SubElement(borders, w(side), {w('val'): 'single', w('sz'): '4', w('space'): '0', w('color'): 'auto'})
+    grid = etree.SubElement(table, w('tblGrid'))
+    header_row = etree.Element(w('tr'))
+    template_row = etree.Element(w('tr'))
+    for paragraph in lines:
+        etree.SubElement(grid, w('gridCol'))
+        text = paragraph_text(paragraph)
+        label, value = copy.deepcopy(paragraph), copy.deepcopy(paragraph)
+        if ':' in text:
+            # "Имя товара: {name}" -> подпись "Имя товара", в ячейке "{name}"
+            colon = text.index(':')
+            keep_text(label, 0, len(text[:colon].rstrip()))
+            keep_text(value, len(text) - len(text[colon + 1:].lstrip()), len(text))
+        else:
+            keep_text(label, 0, 0)
+            for node in text_nodes(label)[:1]:
+                set_text(node, ' '.join(PLACEHOLDER.sub('', text).split()))
+        header_row.append(table_cell(label))
+        template_row.append(table_cell(value))
+    table.append(header_row)
+    table.append(etree.Comment(ROW_MARKER))
+    table.append(template_row)
+    table.append(etree.Comment(ROW_MARKER))
+
+    lines[0].addprevious(table)
+    for paragraph in lines:
+        paragraph.getparent().remove(paragraph)
+
+    before, row, after = serialize(tree).split(f'<!--{ROW_MARKER}-->')
+    return split_segments(before), split_segments(row), split_segments(after)
+
+
+def serialize(tree):
+    return etree.tostring(tree, xml_declaration=True, encoding='UTF-8', standalone=True).decode('utf-8')
+
+
+def split_segments(xml):
+    # Нечётные элементы - ключи вида "{name}", чётные - XML между ними
+    return re.split(r'(\{\w+\})', xml)
+
+
+def fill_segments(segments, data):
+    parts = list(segments)
+    for index in range(1, len(parts), 2):
+        value = data.get(parts[index])
+        if value is not None:
+            parts[index] = escape(str(value))
+    return ''.join(parts)
+
+
+def generate_unique_filename(base_name):
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")  # Документы рендерятся параллельно
+    base_name_without_extension = os.path.splitext(base_name)[0]
+    return f"{base_name_without_extension}_{timestamp}.docx"
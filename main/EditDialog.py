@@ -3,12 +3,22 @@ from PyQt5.QtCore import QDate, QRegExp
 from PyQt5.QtGui import QRegExpValidator
 import logging
 import re
+from SchemaCatalog import get_schema_catalog
+
+# Столбцы со своим форматом ввода; тип остальных берётся из каталога схемы
+FORMATTED_COLUMNS = {
+    'address': 'ADDRESS',
+    'geo_coordinates': 'GEO_COORDINATES',
+    'phonenumber': 'PHONE',
+    'full_name': 'FULL_NAME',
+}
 
 class EditDialog(QDialog):
-    def __init__(self, table_widget, row=None, column=None, max_value=None):
+    def __init__(self, table_widget, row=None, column=None, max_value=None, table=None):
         super().__init__()
         self.setWindowTitle("Edit Data")
         self.table_widget = table_widget
+        self.table = table  # Таблица базы, из которой столбцы table_widget; None - тип ищется по имени столбца
         self.row = row
         self.column = column
         self.max_value = max_value
@@ -64,31 +74,9 @@ class EditDialog(QDialog):
         layout.addWidget(self.reject_button)
 
     def get_data_type(self, column_name):
-        data_types = {
-            'id': 'INTEGER',
-            'name': 'VARCHAR',
-            'article': 'VARCHAR',
-            'lifetime': 'INT',
-            'description': 'TEXT',
-            'category': 'VARCHAR',
-            'png_url': 'BYTEA',
-            'address': 'ADDRESS',
-            'geo_text': 'TEXT',
-            'geo_coordinates': 'GEO_COORDINATES',
-            'warehouse_id': 'INT',
-            'product_id': 'INT',
-            'amount': 'INT',
-            'orders': 'TEXT',
-            'info': 'TEXT',
-            'phonenumber': 'PHONE',
-            'client_id': 'INT',
-            'price': 'INT',
-            'date': 'TIMESTAMP',
-            'status': 'VARCHAR',
-            'order_id': 'INT',
-            'full_name': 'FULL_NAME'
-        }
-        return data_types.get(column_name, 'VARCHAR')
+        if column_name in FORMATTED_COLUMNS:
+            return FORMATTED_COLUMNS[column_name]
+        return get_schema_catalog().column_type(column_name, self.table)
 
     def create_widget(self, data_type, label):
         logging.debug(f"Creating widget for data type: {data_type}")
@@ -4,6 +4,8 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5 import QtCore
 from Database import Database
+from Operations import Orders
+from Search import product_match, product_rank, search_params
 from AddProductWindow import AddProductWindow
 
 
@@ -83,26 +85,13 @@ class EditOrderDialog(QDialog):
 
     def save_changes(self):
         try:
-            with Database(self.user, self.password) as db:
-                for change in self.changes:
-                    change_type, product_id, order_id, warehouse_id, amount = change
-                    if change_type == 'delete':
-                        db.cursor.execute(
-                            'DELETE FROM Order_Items WHERE product_id = %s AND order_id = %s AND warehouse_id = %s',
-                            (product_id, order_id, warehouse_id))
-                        db.cursor.execute('SELECT * FROM ProductInWarehouse WHERE product_id = %s and warehouse_id = %s', (product_id, warehouse_id))
-                        result = db.cursor.fetchall()
-                        if result:
-                            db.cursor.execute('UPDATE ProductInWarehouse SET amount = amount + %s WHERE product_id = %s and warehouse_id = %s',
-                                              (amount, product_id, warehouse_id))
-                        else:
-                            db.cursor.execute('INSERT INTO ProductInWarehouse (warehouse_id, product_id, amount) VALUES (%s, %s, %s)', (warehouse_id, product_id, amount))
-                db.conn.commit()
-                self.changes.clear()
-                QMessageBox.information(self, 'Успех', 'Изменения успешно сохранены!')
+            # Товар из удалённых строк заказа возвращается на склад
+            Orders(Database(self.user, self.password)).remove_items(
+                [(order_id, product_id, warehouse_id)
+                 for change_type, product_id, order_id, warehouse_id, amount in self.changes if change_type == 'delete'])
+            self.changes.clear()
+            QMessageBox.information(self, 'Успех', 'Изменения успешно сохранены!')
         except Exception as e:
-            if db.conn:
-                db.conn.rollback()
             QMessageBox.critical(self, 'Ошибка', f'Произошла ошибка при сохранении: {e}')
 
     def make_table_read_only(self):
@@ -131,12 +120,13 @@ class EditOrderDialog(QDialog):
 
         try:
             with Database(self.user, self.password) as db:
-                db.cursor.execute("""
+                db.cursor.execute(f"""
                 SELECT p.id, p.name, oi.amount, oi.price, oi.warehouse_id
                 FROM Order_items oi 
                 JOIN Products p ON oi.product_id = p.id 
-                WHERE oi.order_id = %s AND LOWER(p.name) LIKE %s
-                """, (self.order_id, '%' + search_text + '%'))
+                WHERE oi.order_id = %(order_id)s AND {product_match('p')}
+                ORDER BY {product_rank('p')}
+                """, search_params(search_text, order_id=self.order_id))
                 products = db.cursor.fetchall()
 
                 self.table_widget.setRowCount(len(products))
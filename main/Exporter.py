@@ -0,0 +1,111 @@
+import os
+import logging
+import itertools
+from PyQt5.QtWidgets import QFileDialog, QProgressDialog, QMessageBox
+from Database import Database
+
+# Выгрузка таблицы окна в CSV/XLSX прямо из базы, а не из виджета: CSV пишется через COPY ... TO STDOUT,
+# XLSX - через серверный курсор в write-only книгу openpyxl. Память не растёт с размером выборки,
+# выгрузка идёт в фоновом потоке окна
+
+PROGRESS_STEP = 10000  # Как часто (в строках) сообщать о ходе выгрузки
+XLSX_PAGE = 2000
+
+export_counter = itertools.count(1)
+
+
+class RowCounter():
+    # Файл для copy_expert: пишет строки COPY в файл и считает их для прогресса
+    def __init__(self, file, progress=None):
+        self.file = file
+        self.progress = progress
+        self.rows = 0
+
+    def write(self, data):
+        self.file.write(data)
+        lines = data.count('\n') if isinstance(data, str) else data.count(b'\n')
+        before, self.rows = self.rows, self.rows + lines
+        if self.progress is not None and before // PROGRESS_STEP != self.rows // PROGRESS_STEP:
+            self.progress(self.rows)
+
+
+def export_csv(db, query, params, path, progress=None):
+    with db:
+        # Запросы окон бывают с ';' в конце - внутри COPY (...) это синтаксическая ошибка
+        source = db.cursor.mogrify(query, params).decode('utf-8').strip().rstrip(';').rstrip()
+        copy_query = f"COPY ({source}) TO STDOUT WITH (FORMAT csv, HEADER)"
+        # utf-8-sig - чтобы Excel сразу открывал кириллицу
+        with open(path, 'w', encoding='utf-8-sig', newline='') as file:
+            counter = RowCounter(file, progress)
+            db.cursor.copy_expert(copy_query, counter)
+    return max(counter.rows - 1, 0)  # Без строки заголовка
+
+
+def export_xlsx(db, query, params, path, progress=None):
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise RuntimeError('Для выгрузки в XLSX установите пакет openpyxl или выберите CSV')
+    workbook = Workbook(write_only=True)  # Строки сразу уходят во временный файл, а не копятся в памяти
+    sheet = workbook.create_sheet()
+    rows = 0
+    with db:
+        with db.conn.cursor(name=f'export_{next(export_counter)}') as cursor:
+            cursor.itersize = XLSX_PAGE
+            cursor.execute(query, params)
+            header_written = False
+            for row in cursor:
+                if not header_written:
+                    sheet.append([column[0] for column in cursor.description])
+                    header_written = True
+                sheet.append(list(row))
+                rows += 1
+                if progress is not None and rows % PROGRESS_STEP == 0:
+                    progress(rows)
+            if not header_written and cursor.description:
+                sheet.append([column[0] for column in cursor.description])
+    workbook.save(path)
+    return rows
+
+
+def export_query(db, query, params, path, progress=None):
+    # Выполняется в фоновом потоке. Недописанный файл удаляется, чтобы не выдать его за полную выгрузку
+    try:
+        if path.lower().endswith('.xlsx'):
+            rows = export_xlsx(db, query, params, path, progress)
+        else:
+            rows = export_csv(db, query, params, path, progress)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    logging.debug(f"Exported {rows} rows to {path}")
+    return path, rows
+
+
+def run_export(window, query, params, default_name):
+    # Общий для BaseWindow и BaseProductWindow диалог выгрузки: выбор файла, прогресс, отмена
+    path, _ = QFileDialog.getSaveFileName(window, 'Экспорт', f'{default_name}.csv', 'CSV (*.csv);;Excel (*.xlsx)')
+    if not path:
+        return
+    dialog = QProgressDialog('Выгрузка...', 'Отмена', 0, 0, window)
+    dialog.setWindowTitle('Экспорт')
+    dialog.setMinimumDuration(0)
+    dialog.canceled.connect(lambda: window.executor.cancel('export'))
+
+    def finish():
+        dialog.canceled.disconnect()
+        dialog.close()
+
+    def on_done(result):
+        finish()
+        QMessageBox.information(window, 'Экспорт', f'Выгружено строк: {result[1]}\nФайл: {result[0]}')
+
+    def on_error(error):
+        finish()
+        QMessageBox.critical(window, 'Ошибка', f'Ошибка при экспорте: {error}')
+
+    window.executor.submit_with_progress('export', export_query, Database(window.user, window.password),
+                                         query, params, path,
+                                         on_result=on_done, on_error=on_error,
+                                         on_progress=lambda rows: dialog.setLabelText(f'Выгружено строк: {rows}'))
@@ -0,0 +1,32 @@
+import logging
+from psycopg2 import sql
+
+# id берутся из последовательностей: без MAX(id) + 1 и без перенумерации таблиц.
+# Общая для main/ и Менеджер/ - оба вызывают ensure_id_sequences при входе со своим Database
+
+ID_TABLES = ('products', 'clients', 'warehouses', 'orders')
+
+
+def ensure_id_sequences(db, tables=ID_TABLES):
+    # Для таблиц, где у id ещё нет значения по умолчанию, последовательность создаётся один раз.
+    # Столбцы identity уже получают id сами - их не трогаем
+    try:
+        with db:
+            db.cursor.execute("""
+                SELECT table_name FROM information_schema.columns
+                WHERE table_schema = current_schema() AND column_name = 'id'
+                AND column_default IS NULL AND is_identity = 'NO' AND table_name = ANY(%s)
+            """, (list(tables),))
+            for (table_name,) in db.cursor.fetchall():
+                sequence = sql.Identifier(f'{table_name}_id_seq')
+                table = sql.Identifier(table_name)
+                db.cursor.execute(sql.SQL("CREATE SEQUENCE IF NOT EXISTS {} OWNED BY {}.id").format(sequence, table))
+                db.cursor.execute(sql.SQL("ALTER TABLE {} ALTER COLUMN id SET DEFAULT nextval(%s::regclass)").format(table),
+                                  (f'{table_name}_id_seq',))
+                db.cursor.execute(sql.SQL("SELECT setval(%s::regclass, COALESCE((SELECT MAX(id) FROM {}), 0) + 1, false)").format(table),
+                                  (f'{table_name}_id_seq',))
+                logging.debug(f"Sequence attached to {table_name}.id")
+            db.conn.commit()
+    except Exception as e:
+        # Например, у кладовщика нет прав на ALTER TABLE - тогда схему готовит администратор
+        print(f"Ошибка при настройке последовательностей id: {e}")
@@ -0,0 +1,191 @@
+import logging
+
+# Сводка остатков по всем складам: StockTotals хранит по каждому товару общее количество и число складов,
+# где он есть. Разбивка товар x склад - это сам ProductInWarehouse (с индексом по product_id для выборки
+# по товару). Сводку ведут триггеры уровня оператора на ProductInWarehouse: из таблиц переходов
+# (старые и новые строки оператора) считается изменение по каждому товару и дописывается строкой
+# в StockTotalDeltas. Так сводка верна при любом пути изменения остатков и никогда не пересчитывается целиком.
+# Движения журнала попадают в ProductInWarehouse при переносе (StockLedger.fold_movements), поэтому сводка
+# отстаёт от StockBalances до ближайшего переноса - его делают перед fold_stock_totals.
+# Изменения только дописываются: операции с остатками не блокируют строки сводки и не ждут друг друга
+# из-за одного товара на разных складах. fold_stock_totals переносит накопленное в StockTotals
+# (при входе и при открытии окна сводки); читатели складывают StockTotals с ещё не перенесёнными изменениями
+
+# Событие -> изменения по строкам: (товар, количество, есть ли товар на складе), старые строки со знаком минус.
+# Отрицательный остаток в сводку не идёт - так же, как при полном подсчёте
+CHANGES = {
+    'insert': "SELECT product_id, GREATEST(amount, 0), (amount > 0)::integer FROM new_rows",
+    'delete': "SELECT product_id, -GREATEST(amount, 0), -(amount > 0)::integer FROM old_rows",
+    'update': """SELECT product_id, GREATEST(amount, 0), (amount > 0)::integer FROM new_rows
+                 UNION ALL
+                 SELECT product_id, -GREATEST(amount, 0), -(amount > 0)::integer FROM old_rows""",
+}
+
+TRANSITIONS = {
+    'insert': 'NEW TABLE AS new_rows',
+    'delete': 'OLD TABLE AS old_rows',
+    'update': 'OLD TABLE AS old_rows NEW TABLE AS new_rows',
+}
+
+# Ещё не перенесённые в StockTotals изменения по товарам - для LEFT JOIN к сводке
+PENDING_DELTAS = """
+    SELECT product_id, SUM(amount) AS amount, SUM(warehouses) AS warehouses
+    FROM StockTotalDeltas
+    GROUP BY product_id
+"""
+
+FOLD_QUERY = """
+    WITH folded AS (
+        DELETE FROM StockTotalDeltas RETURNING product_id, amount, warehouses
+    )
+    INSERT INTO StockTotals AS t (product_id, amount, warehouses)
+    SELECT product_id, SUM(amount), SUM(warehouses) FROM folded
+    GROUP BY product_id
+    ORDER BY product_id
+    ON CONFLICT (product_id) DO UPDATE
+    SET amount = t.amount + EXCLUDED.amount, warehouses = t.warehouses + EXCLUDED.warehouses, updated_at = now()
+"""
+
+TOTALS_QUERY = """
+    INSERT INTO StockTotals (product_id, amount, warehouses)
+    SELECT product_id, COALESCE(SUM(amount) FILTER (WHERE amount > 0), 0), count(*) FILTER (WHERE amount > 0)
+    FROM ProductInWarehouse
+    GROUP BY product_id
+"""
+
+
+def ensure_inventory_summary(db):
+    # Вызывается при входе. Триггеры ставятся один раз; если их нет (первый запуск, ProductInWarehouse
+    # пересоздана или сводка прежнего вида без StockTotalDeltas), сводка заполняется заново под блокировкой,
+    # чтобы не потерять параллельные изменения
+    try:
+        with db:
+            db.cursor.execute("SELECT to_regclass('stocktotaldeltas') IS NOT NULL")
+            deltas_exist = db.cursor.fetchone()[0]
+            db.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS StockTotals (
+                    product_id integer PRIMARY KEY,
+                    amount bigint NOT NULL,
+                    warehouses integer NOT NULL,
+                    updated_at timestamptz NOT NULL DEFAULT now()
+                )
+            """)
+            db.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS StockTotalDeltas (
+                    id bigserial PRIMARY KEY,
+                    product_id integer NOT NULL,
+                    amount bigint NOT NULL,
+                    warehouses integer NOT NULL
+                )
+            """)
+            db.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS productinwarehouse_product_idx ON ProductInWarehouse (product_id)")
+            db.cursor.execute("""
+                SELECT count(*) FROM pg_trigger
+                WHERE tgrelid = 'productinwarehouse'::regclass AND tgname LIKE 'productinwarehouse_totals_%'
+            """)
+            if db.cursor.fetchone()[0] < len(CHANGES) + 1 or not deltas_exist:
+                db.cursor.execute("LOCK TABLE ProductInWarehouse IN SHARE ROW EXCLUSIVE MODE")
+                for event, changes in CHANGES.items():
+                    db.cursor.execute(f"""
+                        CREATE OR REPLACE FUNCTION stock_totals_{event}() RETURNS trigger AS $$
+                        BEGIN
+                            INSERT INTO StockTotalDeltas (product_id, amount, warehouses)
+                            SELECT product_id, SUM(amount), SUM(present)
+                            FROM ({changes}) AS changes (product_id, amount, present)
+                            GROUP BY product_id
+                            HAVING SUM(amount) <> 0 OR SUM(present) <> 0;
+                            RETURN NULL;
+                        END
+                        $$ LANGUAGE plpgsql
+                    """)
+                    db.cursor.execute(f"DROP TRIGGER IF EXISTS productinwarehouse_totals_{event} ON ProductInWarehouse")
+                    db.cursor.execute(f"""
+                        CREATE TRIGGER productinwarehouse_totals_{event}
+                        AFTER {event.upper()} ON ProductInWarehouse
+                        REFERENCING {TRANSITIONS[event]}
+                        FOR EACH STATEMENT EXECUTE PROCEDURE stock_totals_{event}()
+                    """)
+                db.cursor.execute("""
+                    CREATE OR REPLACE FUNCTION stock_totals_truncate() RETURNS trigger AS $$
+                    BEGIN
+                        DELETE FROM StockTotals;
+                        DELETE FROM StockTotalDeltas;
+                        RETURN NULL;
+                    END
+                    $$ LANGUAGE plpgsql
+                """)
+                db.cursor.execute("DROP TRIGGER IF EXISTS productinwarehouse_totals_truncate ON ProductInWarehouse")
+                db.cursor.execute("""
+                    CREATE TRIGGER productinwarehouse_totals_truncate
+                    AFTER TRUNCATE ON ProductInWarehouse
+                    FOR EACH STATEMENT EXECUTE PROCEDURE stock_totals_truncate()
+                """)
+                db.cursor.execute("DELETE FROM StockTotals")
+                db.cursor.execute("DELETE FROM StockTotalDeltas")
+                db.cursor.execute(TOTALS_QUERY)
+                logging.debug(f"Stock totals built for {db.cursor.rowcount} products")
+            db.conn.commit()
+    except Exception as e:
+        # Например, у пользователя нет прав на CREATE TRIGGER - сводку готовит администратор
+        print(f"Ошибка при создании сводки остатков: {e}")
+    fold_stock_totals(db)
+
+
+def fold_stock_totals(db):
+    # Переносит накопленные изменения в StockTotals одним запросом, строки сводки - в порядке id товара.
+    # Видимые транзакции изменения удаляются и прибавляются атомарно; незакоммиченные заберёт следующий перенос.
+    # Параллельный перенос не ждёт, а пропускается
+    try:
+        with db:
+            db.cursor.execute("SELECT pg_try_advisory_xact_lock(hashtext('stock_totals_fold'))")
+            if db.cursor.fetchone()[0]:
+                db.cursor.execute(FOLD_QUERY)
+                if db.cursor.rowcount:
+                    logging.debug(f"Stock totals: changes of {db.cursor.rowcount} products folded")
+            db.conn.commit()
+    except Exception as e:
+        print(f"Ошибка при переносе изменений в сводку остатков: {e}")
+
+
+def product_totals(cursor, product_ids):
+    # Общий остаток по каждому товару: {товар: (количество, складов)}; товара нет в сводке - его нет нигде
+    cursor.execute("""
+        SELECT product_id, SUM(amount), SUM(warehouses)
+        FROM (SELECT product_id, amount, warehouses FROM StockTotals WHERE product_id = ANY(%(products)s)
+              UNION ALL
+              SELECT product_id, amount, warehouses FROM StockTotalDeltas WHERE product_id = ANY(%(products)s)) totals
+        GROUP BY product_id
+    """, {'products': list({int(product_id) for product_id in product_ids})})
+    return {product_id: (amount, warehouses) for product_id, amount, warehouses in cursor.fetchall()}
+
+
+def product_breakdown(cursor, product_id):
+    # Где лежит товар: (id склада, склад, количество), больше - выше
+    cursor.execute("""
+        SELECT w.id, w.name, piw.amount
+        FROM StockBalances piw
+        JOIN Warehouses w ON w.id = piw.warehouse_id
+        WHERE piw.product_id = %s AND piw.amount > 0
+        ORDER BY piw.amount DESC, w.name
+    """, (int(product_id),))
+    return cursor.fetchall()
+
+
+def audit_totals(cursor):
+    # Сверка сводки с ProductInWarehouse: (товар, в сводке, по складам) там, где они расходятся
+    cursor.execute(f"""
+        WITH actual AS (
+            SELECT product_id, COALESCE(SUM(amount) FILTER (WHERE amount > 0), 0) AS amount
+            FROM ProductInWarehouse
+            GROUP BY product_id
+        ), summary AS (
+            SELECT product_id, COALESCE(t.amount, 0) + COALESCE(d.amount, 0) AS amount
+            FROM StockTotals t FULL JOIN ({PENDING_DELTAS}) d USING (product_id)
+        )
+        SELECT product_id, COALESCE(summary.amount, 0), COALESCE(actual.amount, 0)
+        FROM summary FULL JOIN actual USING (product_id)
+        WHERE COALESCE(summary.amount, 0) <> COALESCE(actual.amount, 0)
+        ORDER BY product_id
+    """)
+    return cursor.fetchall()
@@ -1,3 +1,5 @@
+import time
+STARTED = time.perf_counter()  # Отсчёт холодного старта - до импорта Qt и psycopg2
 import sys
 import logging
 import psycopg2
@@ -8,6 +10,8 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtCore import pyqtSignal
 from psycopg2 import OperationalError, sql
+from ConnectionPool import close_all_pools
+from WindowRegistry import report_startup
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -50,15 +54,59 @@ class LoginWindow(QMainWindow):
         GlobalData.username = user
         GlobalData.password = password
         try:
+            start = time.perf_counter()
+            start_session(user, password)
+            session_ready = time.perf_counter()
             from MainWindow import MainWindow
             self.main_window = MainWindow(user, password)
             self.main_window.show()
+            report_startup('session', session_ready - start)
+            report_startup('main window', time.perf_counter() - session_ready)
             self.close()
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to open Main Window: {e}")
 
+def prepare_database(user, password):
+    # Пул соединений и схема, без которой не работают операции с остатками; OperationsCli вызывает только её
+    from Database import Database
+    db = Database(user, password)
+    db.create_pool()  # Один пул соединений на всю сессию
+    from IdSequences import ensure_id_sequences
+    ensure_id_sequences(db)
+    db.ensure_stock_key()
+    db.ensure_order_items_key()
+    from StockLedger import ensure_stock_ledger
+    ensure_stock_ledger(db)
+    from InventorySummary import ensure_inventory_summary
+    ensure_inventory_summary(db)  # Сводку ведут триггеры - они должны стоять до первого изменения остатков
+    return db
+
+def start_session(user, password):
+    # Подготовка сеанса после входа; Benchmark вызывает её так же, без окна входа
+    db = prepare_database(user, password)
+    from Search import ensure_search_indexes
+    ensure_search_indexes(db)
+    from ReferenceCache import ensure_reference_triggers, start_reference_cache
+    ensure_reference_triggers(db)
+    start_reference_cache(user, password)  # Справочники читаются один раз за сеанс
+    from RenderQueue import get_render_queue
+    get_render_queue().resume()  # Документы, не созданные из-за падения программы
+    from SchemaCatalog import load_schema_catalog
+    load_schema_catalog(db)  # Имена и типы столбцов для окон и диалогов, без запросов при каждом открытии
+    return db
+
+def end_session():
+    # Очередь документов и слушатель справочников закрываются, если сеанс успел их запустить
+    from RenderQueue import shutdown_render_queue
+    from ReferenceCache import stop_reference_cache
+    close_all_pools()
+    shutdown_render_queue()
+    stop_reference_cache()
+
 if __name__ == '__main__':
     app = QApplication(sys.argv)
+    app.aboutToQuit.connect(end_session)
     main_window = LoginWindow()
     main_window.show()
+    report_startup('login window', time.perf_counter() - STARTED)
     sys.exit(app.exec_())
\ No newline at end of file
@@ -7,13 +7,7 @@ from PyQt5.QtWidgets import (
     QLabel, QLineEdit
 )
 from psycopg2 import OperationalError, sql
-from SalesWindow import SalesWindow
-from ProductWindow import ProductWindow
-from TransferWindow import TransferWindow
-from WriteOffProductWindow import WriteOffProductWindow
-from ClientWindow import ClientWindow
-from WarehouseWindow import WarehouseWindow
-from ReceivingWindow import ReceivingWindow
+from WindowRegistry import WindowRegistry  # Модули окон импортируются при первом открытии
 import os
 import subprocess
 
@@ -25,6 +19,7 @@ class MainWindow(QMainWindow):
         self.setGeometry(600, 200, 600, 400)
         self.user = user
         self.password = password
+        self.windows = WindowRegistry(user, password)
         layout = QVBoxLayout()
 
         self.buttons = {}
@@ -36,8 +31,10 @@ class MainWindow(QMainWindow):
             ('Списание товаров', self.open_write_off_window),
             ('Клиенты', self.open_clients_window),
             ('Склады', self.open_warehouses_window),
+            ('Остатки по складам', self.open_stock_summary_window),
             ('Документы', self.open_documents_window),
-            ('Шаблоны', self.open_templates_window)
+            ('Шаблоны', self.open_templates_window),
+            ('Диагностика', self.open_diagnostics_window)
         ]
 
         for btn_text, handler in buttons:
@@ -50,39 +47,37 @@ class MainWindow(QMainWindow):
         container.setLayout(layout)
         self.setCentralWidget(container)
 
+    def open_window(self, key):
+        # Нет соединения с базой (в том числе пул исчерпан) - сообщаем и остаёмся в главном окне
+        try:
+            self.windows.open(key)
+        except Exception as e:
+            logging.error(f"Error opening window {key}: {e}")
+            QMessageBox.critical(self, 'Ошибка', f'Ошибка открытия окна: {e}')
+
     def open_sales_window(self):
-        self.sales_window = SalesWindow(self.user, self.password)
-        self.sales_window.show()
+        self.open_window('sales')
 
     def open_product_window(self):
-        self.productwindow = ProductWindow(self.user, self.password)
-        self.productwindow.show()
+        self.open_window('products')
 
     def open_receiving_window(self):
-        self.receivingwindow = ReceivingWindow(self.user, self.password)
-        self.receivingwindow.show()
+        self.open_window('receiving')
 
     def open_transfer_window(self):
-        self.transfer_window = TransferWindow(self.user, self.password)
-        self.transfer_window.show()
+        self.open_window('transfer')
 
     def open_write_off_window(self):
-        self.write_off_window = WriteOffProductWindow(self.user, self.password)
-        self.write_off_window.show()
+        self.open_window('write_off')
 
     def open_clients_window(self):
-        try:
-            self.client_window = ClientWindow(self.user, self.password)
-            self.client_window.show()
-        except Exception as e:
-            QMessageBox.critical(self, 'Ошибка', f'Ошибка открытия окна с клиентами: {e}')
+        self.open_window('clients')
 
     def open_warehouses_window(self):
-        #try:
-        self.warehouse_window = WarehouseWindow(self.user, self.password)
-        self.warehouse_window.show()
-        #except Exception as e:
-            #QMessageBox.critical(self, 'Ошибка', f'Ошибка открытия окна со складами: {e}')
+        self.open_window('warehouses')
+
+    def open_stock_summary_window(self):
+        self.open_window('stock_summary')
 
     def open_documents_window(self):
         project_root = os.path.dirname(os.path.abspath(__file__))
@@ -97,6 +92,9 @@ class MainWindow(QMainWindow):
         # Открываем папку с помощью проводника Windows
         subprocess.run(["explorer", folder_path])
 
+    def open_diagnostics_window(self):
+        self.open_window('diagnostics')
+
     def open_templates_window(self):
         project_root = os.path.dirname(os.path.abspath(__file__))
         folder_name = "presets"
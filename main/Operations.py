@@ -0,0 +1,247 @@
+import logging
+from StockLedger import (StockShortage, apply_movements, move_stock, reserve_basket, lock_stock, materialize_snapshots,
+                         fold_movements, audit_balances)
+from InventorySummary import audit_totals, fold_stock_totals
+from Allocator import propose_allocation
+
+# Складские операции без окон и виджетов: перемещение, приёмка, списание, состав заказа.
+# Их вызывают окна main/ и Менеджер/ (из фонового потока) и консольный OperationsCli для ночных заданий.
+# На вход - числа (id склада, id товара, количество), а не текст ячеек таблиц.
+# Каждый вызов - одна транзакция: коммит при успехе, откат при нехватке товара или ошибке
+
+
+def with_products(cursor, results):
+    # Карточки товаров для документов операции читаются в той же транзакции, до коммита: если товар не найден,
+    # остатки не меняются. К каждой строке apply_movements добавляется
+    # (id, название, артикул, срок годности, описание, категория, цена)
+    cursor.execute("SELECT id, name, article, lifetime, description, category, price FROM Products WHERE id = ANY(%s)",
+                   (list({result[2] for result in results}),))
+    products = {row[0]: row for row in cursor.fetchall()}
+    missing = sorted({result[2] for result in results} - set(products))
+    if missing:
+        raise ValueError('Товары не найдены: ' + ', '.join(str(product_id) for product_id in missing))
+    return [result + (products[result[2]],) for result in results]
+
+
+class Inventory():
+    def __init__(self, db):
+        self.db = db
+
+    def transfer(self, lines):
+        # Всё перемещение - один вызов журнала движений: списание со склада-источника и приход
+        # на склад-получатель по каждой строке, остатки сворачиваются по парам (склад, товар).
+        # lines: [(склад откуда, склад куда, id товара, количество)].
+        # Возвращает (строка, id товара, название, откуда, куда, количество, остаток на складе-источнике, хватило ли товара).
+        # Если хоть где-то остаток ушёл в минус - транзакция откатывается целиком
+        if not lines:
+            return []
+        movements = []
+        for from_warehouse, to_warehouse, product_id, amount in lines:
+            movements.append((from_warehouse, product_id, -amount))
+            movements.append((to_warehouse, product_id, amount))
+        with self.db as db:
+            applied = apply_movements(db.cursor, movements, 'transfer')
+            db.cursor.execute("SELECT id, name FROM Products WHERE id = ANY(%s)", (list({int(line[2]) for line in lines}),))
+            names = dict(db.cursor.fetchall())
+            results = []
+            for index, (from_warehouse, to_warehouse, product_id, amount) in enumerate(lines):
+                source = applied[2 * index]  # Строка списания со склада-источника
+                results.append((index + 1, int(product_id), names.get(int(product_id)), from_warehouse, to_warehouse, amount,
+                                source[4], source[5]))
+            if all(result[7] for result in results):
+                db.conn.commit()
+            else:
+                db.conn.rollback()
+        return results
+
+    def receive(self, lines, reference=None):
+        # Приёмка: lines [(склад, id товара, количество)], все строки - один запрос к журналу.
+        # Возвращает строки apply_movements с карточкой товара в конце (см. with_products)
+        with self.db as db:
+            results = with_products(db.cursor, move_stock(db.cursor, lines, 'receiving', reference))
+            db.conn.commit()
+        return results
+
+    def write_off(self, lines, reference=None):
+        # Списание: lines [(склад, id товара, количество)]. Если остаток успели уменьшить в другом окне,
+        # StockShortage отменяет всё списание. Возвращает то же, что receive
+        with self.db as db:
+            results = move_stock(db.cursor, [(warehouse_id, product_id, -amount) for warehouse_id, product_id, amount in lines],
+                                 'write-off', reference)
+            results = with_products(db.cursor, results)
+            db.conn.commit()
+        return results
+
+    def product_ids(self, keys, column='article'):
+        # Для файлов ночных заданий и окон Менеджера, где товар известен по артикулу или названию: ключ -> id
+        if column not in ('article', 'name'):
+            raise ValueError(f'Товар ищется по article или name, а не по {column}')
+        with self.db as db:
+            db.cursor.execute(f"SELECT {column}, id FROM Products WHERE {column} = ANY(%s)", (list(set(keys)),))
+            return dict(db.cursor.fetchall())
+
+    def snapshot(self):
+        materialize_snapshots(self.db)
+        fold_movements(self.db)
+        fold_stock_totals(self.db)
+
+    def audit(self, warehouse_id=None):
+        with self.db as db:
+            return audit_balances(db.cursor, warehouse_id)
+
+    def audit_totals(self):
+        with self.db as db:
+            return audit_totals(db.cursor)
+
+
+class Orders():
+    def __init__(self, db):
+        self.db = db
+
+    def add_items(self, order_id, warehouse_id, lines):
+        # Вся корзина резервируется одним запросом. lines: [(id товара, количество, цена)].
+        # Возвращает (строка, товар, количество, доступно, хватило ли товара); если чего-то не хватило,
+        # в заказ не попадает ничего
+        with self.db as db:
+            results = reserve_basket(db.cursor, order_id, warehouse_id, lines)
+            if all(result[4] for result in results):
+                db.conn.commit()
+            else:
+                db.conn.rollback()
+        return results
+
+    def allocate(self, origin, lines):
+        # Какие склады ближе к точке доставки origin (широта, долгота) закроют строки [(id товара, количество)].
+        # Только предложение, остатки не меняются. Возвращает (отгрузки [(склад, км, [(товар, количество)])],
+        # не хватает {товар: количество})
+        with self.db as db:
+            proposal = propose_allocation(db.cursor, origin, lines)
+            db.conn.rollback()
+        return proposal
+
+    def add_allocation(self, order_id, shipments, prices):
+        # Резерв по предложению allocate: каждая отгрузка - корзина своего склада, весь план одной транзакцией.
+        # prices - {товар: цена}. Возвращает [(склад, строки reserve_basket)]; если пока клерк смотрел на план,
+        # товар где-то разобрали, не резервируется ничего
+        with self.db as db:
+            # Все пары плана блокируются заранее, одним запросом в порядке (склад, товар) - том же,
+            # в котором их берёт apply_movements. Иначе корзины складов брали бы блокировки по очереди,
+            # и два плана с одними товарами на разных складах могли бы ждать друг друга
+            lock_stock(db.cursor, [(warehouse_id, product_id)
+                                   for warehouse_id, km, taken in shipments for product_id, quantity in taken])
+            results = []
+            for warehouse_id, km, taken in sorted(shipments):
+                lines = [(product_id, quantity, prices[product_id]) for product_id, quantity in taken]
+                results.append((warehouse_id, reserve_basket(db.cursor, order_id, warehouse_id, lines)))
+            if all(result[4] for warehouse_id, lines in results for result in lines):
+                db.conn.commit()
+            else:
+                db.conn.rollback()
+        return results
+
+    def remove_items(self, lines):
+        # Удаление строк заказов: lines [(заказ, id товара, склад)]. Товар возвращается на склад
+        # в том количестве, что было в заказе по данным базы. Возвращает удалённые (заказ, товар, склад, количество)
+        if not lines:
+            return []
+        order_ids, product_ids, warehouse_ids = ([int(value) for value in column] for column in zip(*lines))
+        with self.db as db:
+            db.cursor.execute("""
+                DELETE FROM Order_Items oi
+                USING unnest(%s::integer[], %s::integer[], %s::integer[]) AS r(order_id, product_id, warehouse_id)
+                WHERE oi.order_id = r.order_id AND oi.product_id = r.product_id AND oi.warehouse_id = r.warehouse_id
+                RETURNING oi.order_id, oi.product_id, oi.warehouse_id, oi.amount
+            """, (order_ids, product_ids, warehouse_ids))
+            removed = db.cursor.fetchall()
+            returns = {}
+            for order_id, product_id, warehouse_id, amount in removed:
+                returns.setdefault(order_id, []).append((warehouse_id, product_id, amount))
+            for order_id, movements in sorted(returns.items()):
+                move_stock(db.cursor, movements, 'order-return', f'order {order_id}')
+            db.conn.commit()
+        logging.debug(f"Removed {len(removed)} of {len(lines)} order lines")
+        return removed
+
+
+class NamedStock():
+    # Те же операции для схемы Менеджера, где товар известен только по названию:
+    # ProductInWarehouse (warehouse_id, product_name, amount, price) с ключом (warehouse_id, product_name)
+    # и Order_items (order_id, product_name, quantity, price). Журнала движений в этой схеме нет.
+    # Как и в Inventory, каждый вызов - одна транзакция; если хоть по одной строке товара не хватает,
+    # StockShortage отменяет всё
+    def __init__(self, db):
+        self.db = db
+
+    def apply(self, cursor, changes):
+        # changes: [(склад, название, изменение, цена или None)]. Изменения складываются по парам (склад, название),
+        # строки остатков блокируются в порядке пар. Новая строка берёт цену того же товара с другого склада операции
+        net = {}
+        prices = {}
+        for warehouse_id, product_name, delta, price in changes:
+            key = (int(warehouse_id), product_name)
+            net[key] = net.get(key, 0) + int(delta)
+            if price is not None:
+                prices[key] = price
+        keys = sorted(key for key, delta in net.items() if delta)
+        if not keys:
+            return
+        cursor.execute("""
+            SELECT warehouse_id, product_name, amount, price FROM ProductInWarehouse
+            WHERE (warehouse_id, product_name) IN (SELECT * FROM unnest(%s::integer[], %s::text[]))
+            ORDER BY warehouse_id, product_name
+            FOR UPDATE
+        """, ([warehouse_id for warehouse_id, product_name in keys], [product_name for warehouse_id, product_name in keys]))
+        current = {(warehouse_id, product_name): (amount, price) for warehouse_id, product_name, amount, price in cursor.fetchall()}
+        failed = [(line, warehouse_id, product_name, net[(warehouse_id, product_name)],
+                   current.get((warehouse_id, product_name), (0, None))[0] + net[(warehouse_id, product_name)], False)
+                  for line, (warehouse_id, product_name) in enumerate(keys, start=1)
+                  if current.get((warehouse_id, product_name), (0, None))[0] + net[(warehouse_id, product_name)] < 0]
+        if failed:
+            raise StockShortage(failed)
+        known = {product_name: price for (warehouse_id, product_name), (amount, price) in current.items()}
+        cursor.execute("""
+            INSERT INTO ProductInWarehouse AS piw (warehouse_id, product_name, amount, price)
+            SELECT * FROM unnest(%s::integer[], %s::text[], %s::integer[], %s::numeric[])
+            ON CONFLICT (warehouse_id, product_name) DO UPDATE
+            SET amount = piw.amount + EXCLUDED.amount, price = EXCLUDED.price
+        """, ([warehouse_id for warehouse_id, product_name in keys], [product_name for warehouse_id, product_name in keys],
+              [net[key] for key in keys],
+              [prices.get(key, current[key][1] if key in current else known.get(key[1])) for key in keys]))
+
+    def transfer(self, lines):
+        # lines: [(склад откуда, склад куда, название, количество)]
+        changes = []
+        for from_warehouse, to_warehouse, product_name, amount in lines:
+            changes.append((from_warehouse, product_name, -amount, None))
+            changes.append((to_warehouse, product_name, amount, None))
+        with self.db as db:
+            self.apply(db.cursor, changes)
+            db.conn.commit()
+
+    def receive(self, warehouse_id, lines, removed=()):
+        # Приёмка: lines [(название, количество, цена)]; removed - названия, строки которых убираются со склада
+        with self.db as db:
+            if removed:
+                db.cursor.execute("DELETE FROM ProductInWarehouse WHERE warehouse_id = %s AND product_name = ANY(%s)",
+                                  (int(warehouse_id), list(removed)))
+            self.apply(db.cursor, [(warehouse_id, product_name, amount, price) for product_name, amount, price in lines])
+            db.conn.commit()
+
+    def write_off(self, warehouse_id, lines):
+        # lines: [(название, количество)]
+        with self.db as db:
+            self.apply(db.cursor, [(warehouse_id, product_name, -amount, None) for product_name, amount in lines])
+            db.conn.commit()
+
+    def add_items(self, order_id, warehouse_id, lines):
+        # Корзина заказа: lines [(название, количество, цена)]; товар списывается со склада вместе с записью в заказ
+        if not lines:
+            return
+        with self.db as db:
+            self.apply(db.cursor, [(warehouse_id, product_name, -amount, None) for product_name, amount, price in lines])
+            db.cursor.execute("""
+                INSERT INTO Order_items (order_id, product_name, quantity, price)
+                SELECT %s, product_name, quantity, price FROM unnest(%s::text[], %s::integer[], %s::numeric[])
+                    AS r(product_name, quantity, price)
+            """, (int(order_id), [line[0] for line in lines], [int(line[1]) for line in lines], [line[2] for line in lines]))
+            db.conn.commit()
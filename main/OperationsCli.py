@@ -0,0 +1,168 @@
+import os
+import sys
+import argparse
+import logging
+
+# Складские операции из командной строки - для ночных заданий без окон:
+#   python OperationsCli.py --user USER transfer moves.csv
+#   python OperationsCli.py --user USER add-items 42 3 basket.csv
+#   python OperationsCli.py --user USER import-stock stock.xlsx
+#   python OperationsCli.py --user USER snapshot
+#   python OperationsCli.py --user USER allocate --origin "55.75, 37.61" [--order 42] basket.csv
+# Пароль берётся из --password или переменной окружения WAREHOUSES_PASSWORD.
+# Файлы - CSV или XLSX с заголовком; товар в столбце product задаётся артикулом (--by article),
+# названием (--by name) или id (--by id). Выполняется то же, что при сохранении в окнах (Operations),
+# одной транзакцией на файл. Код выхода 1 - операция не выполнена (например, не хватило товара)
+
+FILE_COLUMNS = {
+    'transfer': ('from_warehouse', 'to_warehouse', 'product', 'amount'),
+    'receive': ('warehouse', 'product', 'amount'),
+    'write-off': ('warehouse', 'product', 'amount'),
+    'add-items': ('product', 'amount', 'price'),
+    'allocate': ('product', 'amount', 'price'),
+    'remove-items': ('order', 'product', 'warehouse'),
+}
+
+
+class CliError(Exception):
+    pass
+
+
+def read_lines(path, command, by, inventory):
+    # Строки файла с товаром, уже переведённым в id. Ошибки - с номером строки, до обращения к остаткам
+    from BulkImport import SourceFile
+    columns = FILE_COLUMNS[command]
+    rows = list(SourceFile(path, columns).rows())
+    if by == 'id':
+        products = None
+    else:
+        products = inventory.product_ids([row['product'] for line, row in rows], by)
+    lines = []
+    for line, row in rows:
+        values = []
+        for column in columns:
+            value = row[column]
+            if column == 'product' and products is not None:
+                if value not in products:
+                    raise CliError(f"Строка {line}: товар {value} не найден")
+                values.append(products[value])
+                continue
+            try:
+                values.append(float(value) if column == 'price' else int(value))
+            except ValueError:
+                raise CliError(f"Строка {line}: в столбце {column} не число: {value}")
+        lines.append(tuple(values))
+    return lines
+
+
+def run(args, db):
+    from Operations import Inventory, Orders
+    from StockLedger import StockShortage
+    inventory = Inventory(db)
+    orders = Orders(db)
+    command = args.command
+
+    if command == 'snapshot':
+        inventory.snapshot()
+        return 0
+    if command == 'audit':
+        mismatches = inventory.audit(args.warehouse)
+        for warehouse_id, product_id, balance, ledger in mismatches:
+            print(f"Склад {warehouse_id}, товар {product_id}: в остатках {balance}, по журналу {ledger}")
+        print(f"Расхождений: {len(mismatches)}")
+        if args.warehouse is None:
+            totals = inventory.audit_totals()
+            for product_id, summary, actual in totals:
+                print(f"Товар {product_id}: в сводке {summary}, по складам {actual}")
+            print(f"Расхождений в сводке остатков: {len(totals)}")
+            mismatches = mismatches + totals
+        return 1 if mismatches else 0
+    if command in ('import-products', 'import-stock'):
+        from BulkImport import import_products, import_stock
+        result = (import_products if command == 'import-products' else import_stock)(db, args.file)
+        print(', '.join(f'{key}: {value}' for key, value in result.items()))
+        return 0
+
+    lines = read_lines(args.file, command, args.by, inventory)
+    try:
+        if command == 'transfer':
+            results = inventory.transfer(lines)
+            failed = [f"строка {line}: товар {product_id} на складе {from_warehouse}, не хватает {-balance} шт."
+                      for line, product_id, name, from_warehouse, to_warehouse, amount, balance, ok in results if not ok]
+        elif command == 'receive':
+            results = inventory.receive(lines, f'cli {os.path.basename(args.file)}')
+            failed = []
+        elif command == 'write-off':
+            results = inventory.write_off(lines, f'cli {os.path.basename(args.file)}')
+            failed = []
+        elif command == 'allocate':
+            results, failed = allocate(args, orders, lines)
+        elif command == 'add-items':
+            results = orders.add_items(args.order, args.warehouse, lines)
+            failed = [f"строка {line}: товар {product_id}, запрошено {quantity}, доступно {available or 0}"
+                      for line, product_id, quantity, available, ok in results if not ok]
+        else:
+            results = orders.remove_items(lines)
+            failed = []
+    except StockShortage as e:
+        results, failed = [], [str(e)]
+    if failed:
+        print('Операция не выполнена, недостаточно товара:\n' + '\n'.join(failed))
+        return 1
+    print(f"Выполнено, строк: {len(results)}")
+    return 0
+
+
+def allocate(args, orders, lines):
+    # Печатает предложенные отгрузки; с --order сразу резервирует их в заказ
+    from Allocator import parse_coordinates
+    origin = parse_coordinates(args.origin)
+    if origin is None:
+        raise CliError(f"Координаты доставки не разобраны: {args.origin}")
+    shipments, missing = orders.allocate(origin, [(product_id, amount) for product_id, amount, price in lines])
+    for warehouse_id, km, taken in shipments:
+        print(f"Склад {warehouse_id} ({km:.1f} км): " + ', '.join(f"товар {product_id} - {quantity}" for product_id, quantity in taken))
+    failed = [f"товар {product_id}, не хватает {quantity}" for product_id, quantity in missing.items()]
+    if failed or args.order is None:
+        return shipments, failed
+    results = orders.add_allocation(args.order, shipments, {product_id: price for product_id, amount, price in lines})
+    failed = [f"склад {warehouse_id}, товар {product_id}: запрошено {quantity}, доступно {available or 0}"
+              for warehouse_id, reserved in results for line, product_id, quantity, available, ok in reserved if not ok]
+    return results, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Складские операции без окон')
+    parser.add_argument('--user', required=True)
+    parser.add_argument('--password', default=os.environ.get('WAREHOUSES_PASSWORD', ''))
+    parser.add_argument('--by', choices=('article', 'name', 'id'), default='article',
+                        help='Чем задан товар в столбце product')
+    commands = parser.add_subparsers(dest='command', required=True)
+    for command in ('transfer', 'receive', 'write-off', 'remove-items', 'import-products', 'import-stock'):
+        commands.add_parser(command).add_argument('file')
+    add_items = commands.add_parser('add-items')
+    add_items.add_argument('order', type=int)
+    add_items.add_argument('warehouse', type=int)
+    add_items.add_argument('file')
+    allocate_parser = commands.add_parser('allocate', help='Подобрать склады для корзины по расстоянию')
+    allocate_parser.add_argument('--origin', required=True, help='Точка доставки: "широта, долгота"')
+    allocate_parser.add_argument('--order', type=int, help='Зарезервировать предложенное в этот заказ')
+    allocate_parser.add_argument('file')
+    commands.add_parser('snapshot')
+    commands.add_parser('audit').add_argument('--warehouse', type=int)
+    args = parser.parse_args(argv)
+
+    from LoginWindowmain import prepare_database
+    from ConnectionPool import close_all_pools
+    try:
+        db = prepare_database(args.user, args.password)
+        return run(args, db)
+    except Exception as e:
+        logging.error(f"{args.command}: {e}")
+        return 1
+    finally:
+        close_all_pools()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import re
+import logging
+import threading
+import weakref
+from psycopg2 import errors, extensions
+from QueryStats import InstrumentedCursor
+
+# Частые параметризованные запросы (остатки склада в окнах товаров, состав заказа, журнал движений,
+# резерв корзины) выполняются как серверные подготовленные операторы: PREPARE один раз на соединение пула,
+# дальше EXECUTE по имени - сервер не разбирает и не планирует текст запроса заново.
+# Запрос регистрируется по тексту, вызывающий код по-прежнему пишет cursor.execute(query, params):
+# курсор PreparedCursor сам подменяет его на EXECUTE. Соединение, которого курсор ещё не видел (новое
+# после обрыва или пересозданное пулом), сначала сбрасывает операторы DEALLOCATE ALL и готовит их заново;
+# если сервер их потерял, запрос выполняется обычным образом
+
+NAMED = re.compile(r'%\((\w+)\)s')
+POSITIONAL = re.compile(r'%s')
+
+_statements = {}  # Текст запроса -> PreparedStatement
+_prepared = weakref.WeakKeyDictionary()  # Соединение -> имена уже подготовленных на нём операторов или None
+_lock = threading.Lock()
+
+
+class PreparedStatement():
+    def __init__(self, name, query, types=None):
+        self.name = name
+        self.query = query
+        names = NAMED.findall(query)
+        if names:
+            self.params = list(dict.fromkeys(names))  # Порядок первого появления - номера $1, $2, ...
+            numbers = {param: index + 1 for index, param in enumerate(self.params)}
+            text = NAMED.sub(lambda match: f'${numbers[match.group(1)]}', query)
+            types = [(types or {}).get(param, 'unknown') for param in self.params]
+        else:
+            self.params = None
+            count = len(POSITIONAL.findall(query))
+            positions = iter(range(1, count + 1))
+            text = POSITIONAL.sub(lambda match: f'${next(positions)}', query)
+            types = list(types or ()) + ['unknown'] * (count - len(types or ()))
+        text = text.replace('%%', '%')  # PREPARE уходит без параметров - psycopg2 не снимает экранирование
+        self.prepare_sql = f"PREPARE {name} ({', '.join(types)}) AS {text}" if types else f"PREPARE {name} AS {text}"
+        self.execute_sql = f"EXECUTE {name} ({', '.join(['%s'] * len(types))})" if types else f"EXECUTE {name}"
+        self.counters = {'prepares': 0, 'hits': 0, 'fallbacks': 0}
+
+    def values(self, params):
+        if self.params is None:
+            return tuple(params or ())
+        return tuple(params[param] for param in self.params)
+
+
+def register_statement(name, query, types=None):
+    # types: {параметр: тип} для %(имя)s или список типов для %s; без типа сервер выводит его из запроса
+    with _lock:
+        statement = _statements.get(query)
+        if statement is None:
+            statement = PreparedStatement(name, query, types)
+            _statements[query] = statement
+    return query
+
+
+def prepared_stats():
+    # (оператор, подготовок, выполнений готового плана, обычных выполнений вместо EXECUTE)
+    with _lock:
+        return sorted((statement.name, statement.counters['prepares'], statement.counters['hits'],
+                       statement.counters['fallbacks']) for statement in _statements.values())
+
+
+def forget_connection(conn):
+    # Что подготовлено на сервере, неизвестно: перед следующим PREPARE соединение сбрасывает все операторы
+    with _lock:
+        _prepared[conn] = None
+
+
+class PreparedCursor(InstrumentedCursor):
+    # cursor_factory для пула Database: зарегистрированные запросы выполняются через EXECUTE
+    def execute(self, query, params=None):
+        statement = _statements.get(query) if self.name is None and isinstance(query, str) else None
+        if statement is None:
+            return super().execute(query, params)  # Серверные курсоры (DECLARE) и остальные запросы как есть
+        conn = self.connection
+        idle_before = conn.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE
+        with _lock:
+            names = _prepared.get(conn)  # None - что подготовлено на сервере, неизвестно
+            ready = names is not None and statement.name in names
+        try:
+            if not ready:
+                if names is None:
+                    super().execute('DEALLOCATE ALL')
+                super().execute(statement.prepare_sql)
+                with _lock:
+                    _prepared[conn] = (_prepared.get(conn) or set()) | {statement.name}
+                    statement.counters['prepares'] += 1
+            else:
+                with _lock:
+                    statement.counters['hits'] += 1
+            return super().execute(statement.execute_sql, statement.values(params))
+        except (errors.InvalidSqlStatementName, errors.DuplicatePreparedStatement):
+            # Сервер и пул разошлись (например, сеанс сброшен DISCARD ALL). Повторить запрос можно,
+            # только если он был первым в транзакции - иначе она уже прервана и откатывается вызывающим
+            forget_connection(conn)
+            if not idle_before:
+                raise
+            conn.rollback()
+            with _lock:
+                statement.counters['fallbacks'] += 1
+            logging.debug(f"Prepared statement {statement.name} out of sync with server, running plain query")
+            return super().execute(query, params)
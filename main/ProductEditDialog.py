@@ -2,6 +2,7 @@ from PyQt5.QtWidgets import QDialog, QFormLayout, QDateEdit, QSpinBox, QLineEdit
 from PyQt5.QtCore import QDate, QRegExp
 from PyQt5.QtGui import QRegExpValidator
 import logging
+from SchemaCatalog import get_schema_catalog
 
 
 class ProductEditDialog(QDialog):
@@ -43,17 +44,7 @@ class ProductEditDialog(QDialog):
         layout.addWidget(self.reject_button)
     
     def get_data_type(self, column_name):
-        data_types = {
-            'id': 'INTEGER',
-            'name': 'VARCHAR',
-            'article': 'VARCHAR',
-            'lifetime': 'INT',
-            'description': 'TEXT',
-            'category': 'VARCHAR',
-            'png_url': 'BYTEA',
-            'price': 'REAL'
-        }
-        return data_types.get(column_name, 'VARCHAR')
+        return get_schema_catalog().column_type(column_name, 'products')
     
     def create_widget(self, data_type, label):
         logging.debug(f"Creating widget for data type: {data_type}")
@@ -4,23 +4,29 @@ import psycopg2
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QWidget,
     QPushButton, QMessageBox, QTableWidget, QComboBox, QTableWidgetItem,
-    QLabel, QLineEdit, QDialog
+    QLabel, QLineEdit, QDialog, QFileDialog, QProgressDialog
 )
 from psycopg2 import OperationalError, sql
-from Database import Database
+from Database import Database, RowStream
+from SchemaCatalog import get_schema_catalog
+from Search import product_match, product_rank, search_params
 from BaseWindow import BaseWindow
 from ProductEditDialog import ProductEditDialog
+from BulkImport import import_products, import_stock
 from PyQt5 import QtCore
 
 
 class ProductWindow(BaseWindow):
+    search_fields = ('name', 'article')
+    edit_columns = ('name', 'article', 'lifetime', 'description', 'category', 'png_url', 'price')
+
     def __init__(self, user, password):
         self.user = user
         self.password = password
         try:
             with Database(self.user, self.password) as db:
                 self.combo_box = QComboBox()  # Initialize combo_box here
-                column_names = db.get_column_names('products')
+                column_names = get_schema_catalog(self.user, self.password).column_names('products')
                 super().__init__('Товары', column_names, self.user, self.password, 'products')
                 self.changes = []  # Для отслеживания изменений
 
@@ -28,7 +34,8 @@ class ProductWindow(BaseWindow):
                 self.search_label = QLabel("Поиск товара:")
                 self.search_box = QLineEdit()
                 self.search_button = QPushButton("Поиск")
-                self.search_button.clicked.connect(self.search_products)
+                self.live_search.set_search_box(self.search_box)
+                self.search_button.clicked.connect(self.live_search.run_server_search)
 
                 # Добавляем элементы поиска в основной layout
                 search_layout = QHBoxLayout()
@@ -36,7 +43,17 @@ class ProductWindow(BaseWindow):
                 search_layout.addWidget(self.search_box)
                 search_layout.addWidget(self.search_button)
 
+                # Массовая загрузка прайс-листа и остатков из CSV/XLSX
+                import_layout = QHBoxLayout()
+                self.import_products_button = QPushButton("Импорт товаров")
+                self.import_products_button.clicked.connect(lambda: self.run_import('Импорт товаров', import_products))
+                import_layout.addWidget(self.import_products_button)
+                self.import_stock_button = QPushButton("Импорт остатков")
+                self.import_stock_button.clicked.connect(lambda: self.run_import('Импорт остатков', import_stock))
+                import_layout.addWidget(self.import_stock_button)
+
                 main_layout = self.centralWidget().layout()
+                main_layout.addLayout(import_layout)
                 main_layout.addLayout(search_layout)
                 main_layout.addWidget(self.table_widget)
 
@@ -48,19 +65,15 @@ class ProductWindow(BaseWindow):
 
     def update_table(self):
         try:
-            with Database(self.user, self.password) as db:
-                db.cursor.execute('SELECT * FROM Products')
-                products = db.cursor.fetchall()
-                self.table_widget.setRowCount(len(products))
-                self.table_widget.setColumnCount(len(self.table_headers))
-                self.table_widget.setHorizontalHeaderLabels(self.table_headers)
-                for i, product in enumerate(products):
-                    for j, value in enumerate(product):
-                        self.table_widget.setItem(i, j, QTableWidgetItem(str(value)))
-                self.make_table_read_only()
+            # Товаров может быть очень много - грузим страницами по мере прокрутки
+            stream = RowStream(Database(self.user, self.password), self.get_select_query())
+            self.table_widget.set_stream(stream, self.table_headers)
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка при обновлении таблицы: {e}")
 
+    def search_items(self):
+        self.search_products()
+
     def search_products(self):
         search_text = self.search_box.text().lower()
         if not search_text:
@@ -68,42 +81,70 @@ class ProductWindow(BaseWindow):
             return
 
         try:
-            with Database(self.user, self.password) as db:
-                db.cursor.execute("""
-                    SELECT *
-                    FROM Products
-                    WHERE LOWER(name) LIKE %s
-                """, ('%' + search_text + '%',))
-                products = db.cursor.fetchall()
-
-                self.table_widget.setRowCount(len(products))
-                self.table_widget.setColumnCount(len(self.table_headers))
-                self.table_widget.setHorizontalHeaderLabels(self.table_headers)
-                for i, product in enumerate(products):
-                    for j, value in enumerate(product):
-                        self.table_widget.setItem(i, j, QTableWidgetItem(str(value)))
-                self.make_table_read_only()
+            stream = RowStream(Database(self.user, self.password), self.get_search_query(), search_params(search_text))
+            self.table_widget.set_stream(stream, self.table_headers)
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка при поиске: {e}")
 
+    def run_import(self, title, import_func):
+        if self.changes:
+            QMessageBox.warning(self, 'Ошибка', 'Сначала сохраните или отмените изменения в таблице')
+            return
+        path, _ = QFileDialog.getOpenFileName(self, title, '', 'Таблицы (*.csv *.xlsx)')
+        if not path:
+            return
+        self.import_dialog = QProgressDialog(f'Загрузка {path}...', 'Отмена', 0, 100, self)
+        self.import_dialog.setWindowTitle(title)
+        self.import_dialog.setMinimumDuration(0)
+        self.import_dialog.canceled.connect(self.cancel_import)
+        self.import_products_button.setEnabled(False)
+        self.import_stock_button.setEnabled(False)
+        # Файл читается и загружается в фоновом потоке, транзакция одна на весь файл
+        self.executor.submit_with_progress('import', import_func, Database(self.user, self.password), path,
+                                           on_result=self.on_import_done, on_error=self.on_import_error,
+                                           on_progress=self.import_dialog.setValue)
+
+    def cancel_import(self):
+        # Задача остановится на следующем отчёте о прогрессе, транзакция откатится
+        self.executor.cancel('import')
+        self.import_products_button.setEnabled(True)
+        self.import_stock_button.setEnabled(True)
+
+    def finish_import(self):
+        self.import_dialog.canceled.disconnect()
+        self.import_dialog.close()
+        self.import_products_button.setEnabled(True)
+        self.import_stock_button.setEnabled(True)
+
+    def on_import_done(self, result):
+        self.finish_import()
+        self.update_table()
+        message = (f"Прочитано строк: {result['read']}\n"
+                   f"Добавлено: {result['inserted']}, обновлено: {result['updated']}\n"
+                   f"Отклонено: {result['rejected']}")
+        if result['rejects']:
+            message += f"\nПричины отказов: {result['rejects']}"
+        QMessageBox.information(self, 'Импорт завершён', message)
+
+    def on_import_error(self, error):
+        self.finish_import()
+        QMessageBox.critical(self, 'Ошибка', f'Ошибка при импорте, изменения не сохранены: {error}')
+
     def add_item(self):
         dialog = ProductEditDialog(self.table_widget)
         if dialog.exec_() == QDialog.Accepted:
             data = dialog.get_data()
-            row_position = self.table_widget.rowCount()
-            self.table_widget.insertRow(row_position)
-            for col, value in enumerate(data):
-                self.table_widget.setItem(row_position, col + 1, QTableWidgetItem(value))  # Обновляем данные в таблице
-            self.update_ids()
-            self.changes.append(('insert', None, data))
+            row_id = self.pending_id()  # Настоящий id появится после сохранения
+            self.table_widget.add_row([row_id, *data])
+            self.changes.append(('insert', row_id, data))
             QMessageBox.information(self, 'Успех', 'Элемент успешно добавлен!')
 
     def delete_item(self):
         selected_row = self.table_widget.currentRow()
         if selected_row >= 0:
             id_item = self.table_widget.item(selected_row, 0)
-            if id_item:
-                self.changes.append(('delete', id_item.text(), None))
+            if id_item and id_item.text():
+                self.record_delete(id_item.text())
             self.table_widget.removeRow(selected_row)
             QMessageBox.information(self, 'Успех', 'Товар успешно удалён!')
 
@@ -112,38 +153,21 @@ class ProductWindow(BaseWindow):
         self.changes.clear()
         QMessageBox.information(self, 'Успех', 'Изменения успешно откатаны')
 
-    def save_changes(self):
-        try:
-            with Database(self.user, self.password) as db:
-                for change in self.changes:
-                    change_type, row_id, row_data = change
-                    logging.debug(f"Processing change: {change_type}, {row_id}, {row_data}")
-                    if change_type == 'insert':
-                        new_id = db.get_next_id('products')
-                        logging.debug(f"Inserting new row with ID {new_id} and data: {row_data}")
-                        db.cursor.execute(self.get_insert_query(), (new_id, *row_data))
-                    elif change_type == 'delete':
-                        logging.debug(f"Deleting row with ID {row_id}")
-                        db.cursor.execute(self.get_delete_query(), (row_id,))
-                    elif change_type == 'update':
-                        logging.debug(f"Updating row with ID {row_id} and data: {row_data}")
-                        db.cursor.execute(self.get_update_query(), row_data + [row_id])
-
-                db.conn.commit()
-                self.changes.clear()
-                QMessageBox.information(self, 'Успех', 'Изменения успешно сохранены!')
-        except Exception as e:
-            logging.error(f"Error saving changes: {e}")
-            QMessageBox.critical(self, 'Ошибка', f'Произошла ошибка при сохранении: {e}')
-        finally:
-            if db.conn:
-                db.conn.close()
-                logging.debug("Database connection closed.")
+    def get_select_query(self):
+        return 'SELECT * FROM Products ORDER BY id'
+
+    def get_search_query(self):
+        return f"""
+            SELECT *
+            FROM Products
+            WHERE {product_match()}
+            ORDER BY {product_rank()}, id
+        """
 
     def get_insert_query(self):
         return """
-            INSERT INTO Products (id, name, article, lifetime, description, category, png_url, price)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            INSERT INTO Products (name, article, lifetime, description, category, png_url, price)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
         """
 
     def get_delete_query(self):
@@ -155,24 +179,12 @@ class ProductWindow(BaseWindow):
             WHERE id = %s
         """
 
-    def update_ids(self):
-        for row in range(self.table_widget.rowCount()):
-            self.table_widget.setItem(row, 0, QTableWidgetItem(str(row + 1)))
-
     def edit_item(self, row, column):
         logging.debug(f"Opening ProductEditDialog for row {row}, column {column}")
         dialog = ProductEditDialog(self.table_widget, row)
         if dialog.exec_() == QDialog.Accepted:
             data = dialog.get_data()
             logging.debug(f"Collected data for update: {data}")
-            for col, value in enumerate(data):
-                self.table_widget.setItem(row, col + 1, QTableWidgetItem(value))  # Обновляем данные в таблице
+            self.table_widget.set_values(row, data, 1)  # Обновляем данные в таблице
             self.changes.append(('update', self.table_widget.item(row, 0).text(), data))
             QMessageBox.information(self, 'Успех', 'Данные успешно обновлены!')
-
-    def make_table_read_only(self):
-        for row in range(self.table_widget.rowCount()):
-            for col in range(self.table_widget.columnCount()):
-                item = self.table_widget.item(row, col)
-                if item:
-                    item.setFlags(item.flags() & ~QtCore.Qt.ItemIsEditable)
\ No newline at end of file
@@ -0,0 +1,115 @@
+import logging
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from Database import Database
+
+
+class TaskSignals(QObject):
+    finished = pyqtSignal(object)  # Результат функции
+    failed = pyqtSignal(str)  # Текст ошибки
+    progress = pyqtSignal(int)  # Процент выполнения для долгих задач
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class QueryTask(QRunnable):
+    # Одна задача для пула потоков. Внутри нельзя трогать виджеты -
+    # результат возвращается в окно через сигналы
+    def __init__(self, func, *args):
+        super().__init__()
+        self.func = func
+        self.args = args
+        self.signals = TaskSignals()
+        self.cancelled = False
+        self.conn = None  # Соединение с выполняющимся запросом, чтобы его можно было прервать
+
+    def report(self, percent):
+        # Передаётся долгим задачам: сообщает прогресс в окно и прерывает задачу после отмены
+        if self.cancelled:
+            raise TaskCancelled()
+        self.signals.progress.emit(percent)
+
+    def cancel(self):
+        self.cancelled = True
+        conn = self.conn
+        if conn is not None:
+            try:
+                conn.cancel()  # Просим сервер прервать уже ненужный запрос
+            except Exception as e:
+                logging.debug(f"Query cancel failed: {e}")
+
+    def run(self):
+        if self.cancelled:
+            return
+        try:
+            result = self.func(*self.args)
+        except Exception as e:
+            if not self.cancelled:
+                logging.error(f"Background task failed: {e}")
+                self.signals.failed.emit(str(e))
+            return
+        if not self.cancelled:
+            self.signals.finished.emit(result)
+
+
+class QueryExecutor(QObject):
+    # Выполняет запросы к базе в фоне, чтобы окно не зависало.
+    # Новая задача с тем же ключом отменяет предыдущую (например, при смене склада в combo box)
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.thread_pool = QThreadPool.globalInstance()
+        self.tasks = {}
+
+    def submit(self, key, func, *args, on_result=None, on_error=None):
+        task = QueryTask(func, *args)
+        return self.start(key, task, on_result, on_error)
+
+    def submit_with_progress(self, key, func, *args, on_result=None, on_error=None, on_progress=None):
+        # func получает последним аргументом функцию report(процент)
+        task = QueryTask(func, *args)
+        task.args = args + (task.report,)
+        if on_progress is not None:
+            task.signals.progress.connect(on_progress)
+        return self.start(key, task, on_result, on_error)
+
+    def submit_query(self, key, user, password, query, params=None, on_result=None, on_error=None):
+        task = QueryTask(None)
+
+        def fetch():
+            with Database(user, password) as db:
+                task.conn = db.conn
+                try:
+                    db.cursor.execute(query, params)
+                    return db.cursor.fetchall()
+                finally:
+                    task.conn = None
+
+        task.func = fetch
+        return self.start(key, task, on_result, on_error)
+
+    def start(self, key, task, on_result, on_error):
+        if key is not None:
+            self.cancel(key)
+            self.tasks[key] = task
+            task.signals.finished.connect(lambda _: self.forget(key, task))
+            task.signals.failed.connect(lambda _: self.forget(key, task))
+        if on_result is not None:
+            task.signals.finished.connect(on_result)
+        if on_error is not None:
+            task.signals.failed.connect(on_error)
+        self.thread_pool.start(task)
+        return task
+
+    def forget(self, key, task):
+        if self.tasks.get(key) is task:
+            del self.tasks[key]
+
+    def cancel(self, key):
+        task = self.tasks.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    def cancel_all(self):
+        for key in list(self.tasks):
+            self.cancel(key)
@@ -0,0 +1,173 @@
+import os
+import re
+import sys
+import time
+import logging
+import threading
+from logging.handlers import RotatingFileHandler
+from psycopg2.extensions import cursor as base_cursor
+
+# Учёт запросов к базе: каждый execute курсора InstrumentedCursor попадает в статистику
+# по "отпечатку" запроса (текст без литералов и лишних пробелов) и по окну/действию, из которого он выполнен.
+# Запросы дольше SLOW_QUERY_MS пишутся в ротируемый журнал logs/slow_queries.log
+
+SLOW_QUERY_MS = 200
+SLOW_LOG_PATH = os.path.join('logs', 'slow_queries.log')
+SLOW_LOG_SIZE = 5 * 1024 * 1024
+SLOW_LOG_BACKUPS = 5
+PARAMS_LIMIT = 500  # Сколько символов параметров сохранять в журнале
+
+# Модули-обёртки: окно/действие ищется выше них по стеку
+INFRASTRUCTURE = ('QueryStats', 'Database', 'QueryExecutor', 'StockLedger', 'ChangeSetWriter', 'PreparedStatements',
+                  'BulkImport', 'Exporter', 'Operations', 'SchemaCatalog', 'ReferenceCache', 'Search', 'extras', 'ConnectionPool')
+
+NUMBER = re.compile(r'\b\d+(\.\d+)?\b')
+STRING = re.compile(r"'(?:[^']|'')*'")
+PLACEHOLDER = re.compile(r'%(\([^)]*\))?s')
+IN_LIST = re.compile(r'\(\s*\?(\s*,\s*\?)+\s*\)')
+SPACES = re.compile(r'\s+')
+
+_fingerprints = {}  # Текст запроса -> отпечаток; запросов в программе немного, кэш не растёт
+
+
+def fingerprint(query):
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', errors='replace')
+    elif not isinstance(query, str):
+        query = str(query)  # sql.Composed
+    cached = _fingerprints.get(query)
+    if cached is None:
+        text = STRING.sub('?', query)
+        text = PLACEHOLDER.sub('?', text)
+        text = NUMBER.sub('?', text)
+        text = IN_LIST.sub('(...)', text)
+        cached = SPACES.sub(' ', text).strip()
+        _fingerprints[query] = cached
+    return cached
+
+
+def current_action():
+    # Первый кадр стека вне модулей-обёрток: "ИмяОкна.метод" или "модуль.функция"
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = os.path.splitext(os.path.basename(frame.f_code.co_filename))[0]
+        if module not in INFRASTRUCTURE and 'psycopg2' not in frame.f_code.co_filename:
+            owner = frame.f_locals.get('self')
+            if owner is not None:
+                return f'{type(owner).__name__}.{frame.f_code.co_name}'
+            return f'{module}.{frame.f_code.co_name}'
+        frame = frame.f_back
+    return 'unknown'
+
+
+class QueryStats():
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queries = {}  # Отпечаток -> счётчики
+        self.actions = {}  # Окно.действие -> счётчики
+        self.slow_log = None
+
+    def get_slow_log(self):
+        if self.slow_log is None:
+            slow_log = logging.getLogger('slow_queries')
+            slow_log.propagate = False
+            try:
+                os.makedirs(os.path.dirname(SLOW_LOG_PATH), exist_ok=True)
+                handler = RotatingFileHandler(SLOW_LOG_PATH, maxBytes=SLOW_LOG_SIZE,
+                                              backupCount=SLOW_LOG_BACKUPS, encoding='utf-8')
+                handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+                slow_log.addHandler(handler)
+            except OSError as e:
+                print(f"Не удалось открыть журнал медленных запросов: {e}")
+            self.slow_log = slow_log
+        return self.slow_log
+
+    def record(self, query, params, duration, rowcount, action, error=None):
+        key = fingerprint(query)
+        milliseconds = duration * 1000
+        rows = max(rowcount, 0)
+        with self.lock:
+            stats = self.queries.get(key)
+            if stats is None:
+                stats = {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0, 'errors': 0, 'actions': set()}
+                self.queries[key] = stats
+            stats['calls'] += 1
+            stats['total_ms'] += milliseconds
+            stats['max_ms'] = max(stats['max_ms'], milliseconds)
+            stats['rows'] += rows
+            stats['errors'] += error is not None
+            stats['actions'].add(action)
+            action_stats = self.actions.setdefault(action, {'calls': 0, 'total_ms': 0.0})
+            action_stats['calls'] += 1
+            action_stats['total_ms'] += milliseconds
+        if milliseconds >= SLOW_QUERY_MS:
+            self.get_slow_log().warning(
+                f"{milliseconds:.1f} ms, rows={rows}, action={action}{', error=' + str(error) if error else ''}\n"
+                f"  {key}\n  params={repr(params)[:PARAMS_LIMIT]}")
+
+    def top_queries(self, limit=50):
+        # (отпечаток, вызовов, всего мс, среднее мс, максимум мс, строк, ошибок, действия) по убыванию общего времени
+        with self.lock:
+            items = [(key, stats['calls'], stats['total_ms'], stats['total_ms'] / stats['calls'], stats['max_ms'],
+                      stats['rows'], stats['errors'], sorted(stats['actions']))
+                     for key, stats in self.queries.items()]
+        items.sort(key=lambda item: item[2], reverse=True)
+        return items[:limit]
+
+    def top_actions(self, limit=50):
+        # (окно.действие, запросов к базе, всего мс)
+        with self.lock:
+            items = [(action, stats['calls'], stats['total_ms']) for action, stats in self.actions.items()]
+        items.sort(key=lambda item: item[2], reverse=True)
+        return items[:limit]
+
+    def totals(self):
+        # (всего запросов, всего мс) - для замера числа обращений к базе за действие
+        with self.lock:
+            return (sum(stats['calls'] for stats in self.actions.values()),
+                    sum(stats['total_ms'] for stats in self.actions.values()))
+
+    def reset(self):
+        with self.lock:
+            self.queries.clear()
+            self.actions.clear()
+
+
+query_stats = QueryStats()
+
+
+class InstrumentedCursor(base_cursor):
+    # cursor_factory для psycopg2.connect: обычный курсор, который замеряет каждый execute.
+    # execute_values / execute_batch вызывают execute постранично - каждая страница считается отдельным запросом
+    def execute(self, query, params=None):
+        action = current_action()
+        start = time.perf_counter()
+        try:
+            result = super().execute(query, params)
+        except Exception as e:
+            query_stats.record(query, params, time.perf_counter() - start, -1, action, e)
+            raise
+        query_stats.record(query, params, time.perf_counter() - start, self.rowcount, action)
+        return result
+
+    def executemany(self, query, params_list):
+        action = current_action()
+        start = time.perf_counter()
+        try:
+            result = super().executemany(query, params_list)
+        except Exception as e:
+            query_stats.record(query, None, time.perf_counter() - start, -1, action, e)
+            raise
+        query_stats.record(query, None, time.perf_counter() - start, self.rowcount, action)
+        return result
+
+    def copy_expert(self, query, file, size=8192):
+        action = current_action()
+        start = time.perf_counter()
+        try:
+            result = super().copy_expert(query, file, size)
+        except Exception as e:
+            query_stats.record(query, None, time.perf_counter() - start, -1, action, e)
+            raise
+        query_stats.record(query, None, time.perf_counter() - start, self.rowcount, action)
+        return result
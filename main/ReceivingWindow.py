@@ -7,9 +7,15 @@ from PyQt5.QtWidgets import (
     QLabel, QSpinBox, QLineEdit
 )
 from psycopg2 import OperationalError, sql
-from Database import Database
+from Database import Database, RowStream
+from SchemaCatalog import get_schema_catalog
+from ReferenceCache import get_reference_cache
+from Search import product_match, product_rank, search_params
 from PyQt5 import QtCore
 from documentcreator import DocumentCreator
+from TableModel import DataTableView, ComboBoxDelegate, RowFilter, LiveSearch
+from QueryExecutor import QueryExecutor
+from Operations import Inventory
 
 class ReceivingWindow(QMainWindow):
     def __init__(self, user, password):
@@ -20,6 +26,7 @@ class ReceivingWindow(QMainWindow):
         self.setGeometry(600, 200, 800, 600)
 
         self.changes = []  # For tracking changes
+        self.executor = QueryExecutor(self)  # Saving runs in the background
 
         layout = QVBoxLayout()
 
@@ -30,7 +37,6 @@ class ReceivingWindow(QMainWindow):
         self.search_box = QLineEdit()
         search_layout.addWidget(self.search_box)
         self.search_button = QPushButton("Поиск")
-        self.search_button.clicked.connect(self.search_products)
         search_layout.addWidget(self.search_button)
         layout.addLayout(search_layout)
 
@@ -38,19 +44,29 @@ class ReceivingWindow(QMainWindow):
         main_layout = QHBoxLayout()
 
         # Table for products in the selected warehouse
-        self.warehouse_table = QTableWidget()
-        with Database(self.user, self.password) as db:
-            column_names = db.get_column_names('products')
-            self.warehouse_table.setColumnCount(len(column_names))
-            self.warehouse_table.setHorizontalHeaderLabels(column_names)
+        column_names = get_schema_catalog(self.user, self.password).column_names('products')
+        self.warehouse_table = DataTableView(column_names)
         main_layout.addWidget(self.warehouse_table)
 
-        # Table for moving products
-        self.move_table = QTableWidget()
-        self.move_table.setColumnCount(2)
-        self.move_table.setHorizontalHeaderLabels(['Количество', 'Склад назначения'])
+        # Table for moving products: one row per loaded product, edited in place
+        self.warehouses = self.load_warehouses()
+        self.move_table = DataTableView(['Количество', 'Склад назначения'], editable_columns=(0, 1))
+        self.move_table.setItemDelegateForColumn(1, ComboBoxDelegate(self.warehouses, "Выберите склад", self.move_table))
         main_layout.addWidget(self.move_table)
 
+        # Products are fetched page by page, move_table grows together with warehouse_table
+        self.warehouse_table.table_model.modelReset.connect(self.reset_move_table)
+        self.warehouse_table.table_model.rowsInserted.connect(self.sync_move_table)
+
+        # Search as you type filters loaded rows locally; both tables hide the same rows
+        search_columns = [column_names.index(field) for field in ('name', 'article') if field in (column_names or [])]
+        self.row_filter = RowFilter(search_columns or None, self)
+        self.warehouse_table.set_row_filter(self.row_filter)
+        self.move_table.set_row_filter(self.row_filter, owner=False)
+        self.live_search = LiveSearch(self.search_box, self.row_filter, self.warehouse_table.is_complete,
+                                      self.search_products, parent=self)
+        self.search_button.clicked.connect(self.live_search.run_server_search)
+
         layout.addLayout(main_layout)
 
         # Buttons for operations
@@ -78,31 +94,23 @@ class ReceivingWindow(QMainWindow):
         self.update_table()
 
     def load_warehouses(self):
-        with Database(self.user, self.password) as db:
-            warehouses = db.get_warehouses()
-            return [(warehouse[1], warehouse[0]) for warehouse in warehouses]
+        return [(warehouse[1], warehouse[0]) for warehouse in get_reference_cache().get('warehouses')]
+
+    def reset_move_table(self):
+        self.move_table.set_rows([])
+        self.sync_move_table()
+
+    def sync_move_table(self):
+        missing = self.warehouse_table.rowCount() - self.move_table.rowCount()
+        if missing > 0:
+            self.move_table.add_rows([(0, None)] * missing)
 
     def update_table(self):
-        warehouses = self.load_warehouses()
-        with Database(self.user, self.password) as db:
-            db.cursor.execute("""
-                SELECT *
-                FROM Products""")
-            products = db.cursor.fetchall()
-            self.warehouse_table.setRowCount(len(products))
-            self.move_table.setRowCount(len(products))
-            self.warehouse_table.setColumnCount(len(products[0]))
-            for i, product in enumerate(products):
-                for j in range(len(products[0])):
-                    self.warehouse_table.setItem(i, j, QTableWidgetItem(str(product[j])))
-                quantity_spinbox = QSpinBox()
-                quantity_spinbox.setMaximum(999999999)
-                self.move_table.setCellWidget(i, 0, quantity_spinbox)
-                to_warehouse_combo = QComboBox()
-                to_warehouse_combo.addItem("Выберите склад", None)
-                for name, id in warehouses:
-                    to_warehouse_combo.addItem(name, id)
-                self.move_table.setCellWidget(i, 1, to_warehouse_combo)
+        stream = RowStream(Database(self.user, self.password), """
+            SELECT *
+            FROM Products
+            ORDER BY id""")
+        self.warehouse_table.set_stream(stream)
 
     def search_products(self):
         search_text = self.search_box.text().lower()
@@ -110,36 +118,18 @@ class ReceivingWindow(QMainWindow):
             self.update_table()
             return
 
-        with Database(self.user, self.password) as db:
-            db.cursor.execute("""
-                SELECT *
-                FROM Products
-                WHERE LOWER(name) LIKE %s
-            """, ('%' + search_text + '%',))
-            products = db.cursor.fetchall()
-
-            self.warehouse_table.setRowCount(len(products))
-            self.move_table.setRowCount(len(products))
-            self.warehouse_table.setColumnCount(len(products[0]) if products else 0)
-            for i, product in enumerate(products):
-                for j in range(len(product)):
-                    self.warehouse_table.setItem(i, j, QTableWidgetItem(str(product[j])))
-                quantity_spinbox = QSpinBox()
-                quantity_spinbox.setMaximum(999999999)
-                self.move_table.setCellWidget(i, 0, quantity_spinbox)
-                to_warehouse_combo = QComboBox()
-                to_warehouse_combo.addItem("Выберите склад", None)
-                for name, id in self.load_warehouses():
-                    to_warehouse_combo.addItem(name, id)
-                self.move_table.setCellWidget(i, 1, to_warehouse_combo)
+        stream = RowStream(Database(self.user, self.password), f"""
+            SELECT *
+            FROM Products
+            WHERE {product_match()}
+            ORDER BY {product_rank()}, id
+        """, search_params(search_text))
+        self.warehouse_table.set_stream(stream)
 
     def move_products(self):
         for i in range(self.move_table.rowCount()):
-            quantity_spinbox = self.move_table.cellWidget(i, 0)
-            quantity = quantity_spinbox.value()
-            to_warehouse_combo = self.move_table.cellWidget(i, 1)
-            to_warehouse_id = to_warehouse_combo.currentData()
-            product_id = self.warehouse_table.item(i, 0).text()
+            quantity, to_warehouse_id = self.move_table.row_values(i)
+            product_id = self.warehouse_table.row_values(i)[0]
             if quantity > 0 and to_warehouse_id:
                 self.changes.append(('move', to_warehouse_id, product_id, quantity))
         QMessageBox.information(self, 'Успех', 'Товары подготовлены к приёмке. Нажмите "Сохранить" для подтверждения.')
@@ -150,60 +140,44 @@ class ReceivingWindow(QMainWindow):
         QMessageBox.information(self, 'Отменено', 'Изменения отменены!')
 
     def save_changes(self):
-        try:
-            with Database(self.user, self.password) as db:
-                if self.changes:
-                    for change in self.changes:
-                        change_type, to_warehouse, product_id, quantity = change
-                        if change_type == 'move':
-                            db.cursor.execute("""
-                                SELECT amount FROM ProductInWarehouse
-                                WHERE warehouse_id = %s AND product_id = %s
-                            """, (to_warehouse, product_id))
-                            result = db.cursor.fetchone()
-                            if result:
-                                db.cursor.execute("""
-                                    UPDATE ProductInWarehouse
-                                    SET amount = amount + %s
-                                    WHERE warehouse_id = %s AND product_id = %s
-                                """, (quantity, to_warehouse, product_id))
-                            else:
-                                db.cursor.execute("""
-                                    INSERT INTO ProductInWarehouse (warehouse_id, product_id, amount)
-                                    VALUES (%s, %s, %s)
-                                """, (to_warehouse, product_id, quantity))
-                            db.cursor.execute('''SELECT name, article, lifetime, description, category, price 
-                            FROM Products 
-                            WHERE ID = %s''', (product_id))
-                            res = db.cursor.fetchone()
-                            data = {'{warehouse_id}': str(to_warehouse),
-                                    '{name}': str(res[0]),
-                                    '{art}': str(res[1]),
-                                    '{lifetime}': str(res[2]),
-                                    '{description}': str(res[3]),
-                                    '{category}': str(res[4]),
-                                    '{price}': str(res[5]),
-                                    '{amount}': str(quantity)}
-                            doc = DocumentCreator('receivingpreset.docx', data)
-                            doc.exec_()
-
-                db.conn.commit()
-                self.changes.clear()
-                QMessageBox.information(self, "Успех", "Изменения успешно сохранены!")
-        except Exception as e:
-            if db.conn:
-                db.conn.rollback()
-            logging.error(f"Error saving changes: {e}")
-            QMessageBox.critical(self, "Ошибка", f"Произошла ошибка при сохранении: {e}")
-
-    def make_table_read_only(self):
-        for row in range(self.warehouse_table.rowCount()):
-            for col in range(self.warehouse_table.columnCount()):
-                item = self.warehouse_table.item(row, col)
-                if item:
-                    item.setFlags(item.flags() & ~QtCore.Qt.ItemIsEditable)
-        for row in range(self.move_table.rowCount()):
-            for col in range(self.move_table.columnCount()):
-                item = self.move_table.item(row, 0)
-                if item:
-                    item.setFlags(item.flags() & ~QtCore.Qt.ItemIsEditable)
\ No newline at end of file
+        self.save_button.setEnabled(False)
+        self.executor.submit(None, self.write_changes, list(self.changes),
+                             on_result=self.on_changes_saved, on_error=self.on_save_error)
+
+    def write_changes(self, changes):
+        # Runs in a worker thread: database only, no widgets
+        documents = []
+        moves = [(to_warehouse, product_id, quantity)
+                 for change_type, to_warehouse, product_id, quantity in changes if change_type == 'move']
+        # All lines go to the ledger in one statement; product cards are read in the same transaction
+        results = Inventory(Database(self.user, self.password)).receive(moves)
+        del self.changes[:len(changes)]  # Committed: pressing save again must not receive the same lines twice
+        for line, to_warehouse, product_id, quantity, balance, ok, product in results:
+            res = product[1:]  # name, article, lifetime, description, category, price
+            documents.append({'{warehouse_id}': str(to_warehouse),
+                              '{name}': str(res[0]),
+                              '{art}': str(res[1]),
+                              '{lifetime}': str(res[2]),
+                              '{description}': str(res[3]),
+                              '{category}': str(res[4]),
+                              '{price}': str(res[5]),
+                              '{amount}': str(quantity)})
+        return documents
+
+    def on_changes_saved(self, documents):
+        self.save_button.setEnabled(True)
+        if documents:
+            # Один документ на всю операцию, по строке таблицы на каждый товар
+            doc = DocumentCreator('receivingpreset.docx', documents)
+            doc.exec_()
+        QMessageBox.information(self, "Успех", "Изменения успешно сохранены!")
+
+    def on_save_error(self, error):
+        self.save_button.setEnabled(True)
+        logging.error(f"Error saving changes: {error}")
+        QMessageBox.critical(self, "Ошибка", f"Произошла ошибка при сохранении: {error}")
+
+    def closeEvent(self, event):
+        self.executor.cancel_all()
+        self.warehouse_table.close_stream()
+        super().closeEvent(event)
@@ -0,0 +1,204 @@
+import select
+import logging
+import threading
+import psycopg2
+from PyQt5.QtCore import QObject, pyqtSignal
+
+# Справочники (склады, клиенты, товары) читаются один раз за сеанс и держатся в памяти.
+# Небольшие справочники (склады, клиенты) держатся целиком; товаров может быть очень много, поэтому
+# они кэшируются по одной строке - при первом обращении к товару по id.
+# Триггеры в базе шлют NOTIFY reference_changed с именем таблицы после любого изменения,
+# отдельный поток слушает канал и сбрасывает устаревший справочник
+
+CHANNEL = 'reference_changed'
+
+REFERENCE_TABLES = {
+    'warehouses': 'id, name, geo_coordinates',  # Координаты - для подбора складов (Allocator)
+    'clients': 'id, full_name',
+    'products': 'id, name, article, lifetime, description, category, price',
+}
+
+ROW_CACHED = {'products'}  # Справочники, которые не загружаются целиком в get_by_id
+
+
+class ReferenceCache(QObject):
+    changed = pyqtSignal(str)  # Имя таблицы, справочник которой устарел
+
+    def __init__(self, user, password):
+        super().__init__()
+        self.user = user
+        self.password = password
+        self.rows = {}  # Таблица -> список строк
+        self.index = {}  # Таблица -> {id: строка}
+        self.row_cache = {}  # Таблица из ROW_CACHED -> {id: строка} уже запрошенных строк
+        self.versions = {table: 0 for table in REFERENCE_TABLES}
+        self.lock = threading.Lock()
+        self.listening = False  # Без слушателя кэшу нельзя доверять - читаем из базы каждый раз
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def get(self, table):
+        with self.lock:
+            if self.listening and table in self.rows:
+                return self.rows[table]
+            version = self.versions[table]
+        from Database import Database  # Database импортирует LoginWindowmain, который импортирует этот модуль
+        with Database(self.user, self.password) as db:
+            db.cursor.execute(f"SELECT {REFERENCE_TABLES[table]} FROM {table} ORDER BY id")
+            rows = db.cursor.fetchall()
+        with self.lock:
+            # Если пока шёл запрос пришло уведомление, результат уже мог устареть - не сохраняем его
+            if self.listening and self.versions[table] == version:
+                self.rows[table] = rows
+                self.index.pop(table, None)
+        return rows
+
+    def get_by_id(self, table, row_id):
+        row_id = int(row_id)
+        with self.lock:
+            listening = self.listening
+            version = self.versions[table]
+            if listening and row_id in self.row_cache.get(table, {}):
+                return self.row_cache[table][row_id]
+        if not listening or table in ROW_CACHED:
+            # Кэш выключен или справочник большой - читаем одну строку, а не весь справочник
+            from Database import Database
+            with Database(self.user, self.password) as db:
+                db.cursor.execute(f"SELECT {REFERENCE_TABLES[table]} FROM {table} WHERE id = %s", (row_id,))
+                row = db.cursor.fetchone()
+            with self.lock:
+                if row is not None and table in ROW_CACHED and self.listening and self.versions[table] == version:
+                    self.row_cache.setdefault(table, {})[row_id] = row
+            return row
+        rows = self.get(table)
+        with self.lock:
+            index = self.index.get(table)
+            if index is None or self.rows.get(table) is not rows:
+                index = {row[0]: row for row in rows}
+                if self.rows.get(table) is rows:
+                    self.index[table] = index
+        return index.get(row_id)
+
+    def version(self, table):
+        with self.lock:
+            return self.versions[table]
+
+    def invalidate(self, table=None):
+        tables = [table] if table else list(REFERENCE_TABLES)
+        with self.lock:
+            for name in tables:
+                if name not in self.versions:
+                    continue
+                self.versions[name] += 1
+                self.rows.pop(name, None)
+                self.index.pop(name, None)
+                self.row_cache.pop(name, None)
+        for name in tables:
+            if name in self.versions:
+                logging.debug(f"Reference cache: {name} invalidated")
+                self.changed.emit(name)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.listen, name='reference-cache-listener', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def connect(self):
+        from Database import Database
+        params = Database(self.user, self.password)
+        conn = psycopg2.connect(dbname=params.dbname, user=params.user, password=params.password,
+                                host=params.host, port=params.port, options='-c client_encoding=UTF8')
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANNEL}")
+        return conn
+
+    def triggers_installed(self, conn):
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM pg_trigger WHERE tgname = ANY(%s)",
+                           ([f'{table}_reference_change' for table in REFERENCE_TABLES],))
+            return cursor.fetchone()[0] == len(REFERENCE_TABLES)
+
+    def listen(self):
+        # Отдельное соединение вне пула: оно всё время занято ожиданием уведомлений
+        while not self.stop_event.is_set():
+            conn = None
+            try:
+                conn = self.connect()
+                if not self.triggers_installed(conn):
+                    logging.error("Reference cache disabled: notify triggers are missing")
+                    conn.close()
+                    return
+                with self.lock:
+                    self.listening = True
+                while not self.stop_event.is_set():
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    tables = set()
+                    while conn.notifies:
+                        tables.add(conn.notifies.pop(0).payload)
+                    for table in tables:
+                        self.invalidate(table)
+            except Exception as e:
+                logging.error(f"Reference cache listener failed: {e}")
+            finally:
+                with self.lock:
+                    self.listening = False
+                # Пока соединения нет, уведомления могли потеряться - начинаем с пустого кэша
+                self.invalidate()
+                if conn is not None:
+                    conn.close()
+            self.stop_event.wait(5)
+
+
+def ensure_reference_triggers(db):
+    # Вызывается при входе: триггеры уровня оператора шлют уведомление один раз на запрос, а не на строку
+    try:
+        with db:
+            db.cursor.execute("SELECT tgname FROM pg_trigger WHERE tgname = ANY(%s)",
+                              ([f'{table}_reference_change' for table in REFERENCE_TABLES],))
+            existing = {row[0] for row in db.cursor.fetchall()}
+            missing = [table for table in REFERENCE_TABLES if f'{table}_reference_change' not in existing]
+            if not missing:
+                return
+            db.cursor.execute(f"""
+                CREATE OR REPLACE FUNCTION notify_reference_change() RETURNS trigger AS $$
+                BEGIN
+                    PERFORM pg_notify('{CHANNEL}', TG_TABLE_NAME);
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+            """)
+            for table in missing:
+                db.cursor.execute(f"""
+                    CREATE TRIGGER {table}_reference_change
+                    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+                    FOR EACH STATEMENT EXECUTE PROCEDURE notify_reference_change()
+                """)
+            db.conn.commit()
+    except Exception as e:
+        # Без прав на создание триггеров кэш не включается - справочники читаются из базы каждый раз
+        print(f"Ошибка при создании триггеров справочников: {e}")
+
+
+_reference_cache = None
+
+
+def start_reference_cache(user, password):
+    global _reference_cache
+    stop_reference_cache()
+    _reference_cache = ReferenceCache(user, password)
+    _reference_cache.start()
+    return _reference_cache
+
+
+def get_reference_cache():
+    return _reference_cache
+
+
+def stop_reference_cache():
+    if _reference_cache is not None:
+        _reference_cache.stop()
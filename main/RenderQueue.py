@@ -0,0 +1,159 @@
+import os
+import json
+import uuid
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, CancelledError
+from concurrent.futures.process import BrokenProcessPool
+from PyQt5.QtCore import QObject, pyqtSignal
+from DocumentRenderer import render_batch
+
+
+class RenderJob(QObject):
+    # Дескриптор задания: окно подписывается на сигналы и не ждёт, пока документ будет готов
+    finished = pyqtSignal(str)  # Путь к готовому документу
+    failed = pyqtSignal(str)  # Текст ошибки
+
+    def __init__(self, job_id, template_name, rows):
+        super().__init__()
+        self.job_id = job_id
+        self.template_name = template_name
+        self.rows = rows
+        self.status = 'queued'  # queued / done / failed
+        self.path = None
+        self.error = None
+
+
+class RenderQueue(QObject):
+    # Очередь рендеринга docx в отдельных процессах: заполнение шаблонов не нагружает окно.
+    # Каждое задание сначала записывается в queue_folder и удаляется только после рендеринга,
+    # поэтому после падения программы незавершённые документы досоздаются при следующем входе
+    job_done = pyqtSignal(object)  # RenderJob, завершённый успешно или с ошибкой
+
+    def __init__(self, queue_folder=os.path.join('docs', 'queue'), max_workers=2):
+        super().__init__()
+        self.queue_folder = queue_folder
+        self.max_workers = max_workers
+        self.executor = None
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self.executor
+
+    def job_path(self, job_id):
+        return os.path.join(self.queue_folder, f'{job_id}.json')
+
+    def save_job(self, job):
+        os.makedirs(self.queue_folder, exist_ok=True)
+        temp_path = self.job_path(job.job_id) + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({'job_id': job.job_id, 'template_name': job.template_name, 'rows': job.rows},
+                      file, ensure_ascii=False)
+        os.replace(temp_path, self.job_path(job.job_id))  # Файл задания появляется целиком или не появляется
+
+    def remove_job(self, job):
+        try:
+            os.remove(self.job_path(job.job_id))
+        except OSError as e:
+            logging.error(f"Render job {job.job_id}: failed to remove job file: {e}")
+
+    def submit(self, template_name, rows):
+        job = RenderJob(uuid.uuid4().hex, template_name, [dict(row) for row in rows])
+        self.save_job(job)
+        self.start(job)
+        return job
+
+    def start(self, job):
+        with self.lock:
+            self.jobs[job.job_id] = job
+            try:
+                future = self.get_executor().submit(render_batch, job.template_name, job.rows)
+            except BrokenProcessPool:
+                # Процесс-рендерер упал - пул пересоздаётся, задание остаётся на диске
+                self.executor = None
+                future = self.get_executor().submit(render_batch, job.template_name, job.rows)
+        # Колбэк вызывается в служебном потоке пула, сигналы доходят до окон через очередь событий Qt
+        future.add_done_callback(lambda done: self.on_done(job, done))
+
+    def on_done(self, job, future):
+        with self.lock:
+            self.jobs.pop(job.job_id, None)
+        try:
+            job.path = future.result()
+        except CancelledError:
+            return  # Программа закрывается, задание выполнится при следующем запуске
+        except BrokenProcessPool as e:
+            # Файл задания не удаляем: документ будет создан при следующем resume()
+            with self.lock:
+                self.executor = None
+            self.fail(job, f"Процесс рендеринга завершился аварийно: {e}")
+            return
+        except Exception as e:
+            self.remove_job(job)  # Ошибка в шаблоне или данных - повтор не поможет
+            self.fail(job, str(e))
+            return
+        self.remove_job(job)
+        job.status = 'done'
+        logging.debug(f"Render job {job.job_id} done: {job.path}")
+        job.finished.emit(job.path)
+        self.job_done.emit(job)
+
+    def fail(self, job, error):
+        job.status = 'failed'
+        job.error = error
+        logging.error(f"Render job {job.job_id} failed: {error}")
+        job.failed.emit(error)
+        self.job_done.emit(job)
+
+    def resume(self):
+        # Досоздаёт документы, задания которых остались на диске после прошлого запуска
+        if not os.path.isdir(self.queue_folder):
+            return []
+        resumed = []
+        for file_name in sorted(os.listdir(self.queue_folder)):
+            if not file_name.endswith('.json'):
+                continue
+            job_id = file_name[:-len('.json')]
+            if job_id in self.jobs:
+                continue
+            try:
+                with open(os.path.join(self.queue_folder, file_name), encoding='utf-8') as file:
+                    saved = json.load(file)
+                job = RenderJob(saved['job_id'], saved['template_name'], saved['rows'])
+            except (OSError, ValueError, KeyError) as e:
+                logging.error(f"Render queue: unreadable job file {file_name}: {e}")
+                continue
+            self.start(job)
+            resumed.append(job)
+        if resumed:
+            logging.debug(f"Render queue: resumed {len(resumed)} job(s)")
+        return resumed
+
+    def pending(self):
+        with self.lock:
+            return list(self.jobs.values())
+
+    def shutdown(self):
+        # Незавершённые задания остаются в queue_folder и будут выполнены при следующем запуске
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_render_queue = None
+
+
+def get_render_queue():
+    global _render_queue
+    if _render_queue is None:
+        _render_queue = RenderQueue()
+    return _render_queue
+
+
+def shutdown_render_queue():
+    if _render_queue is not None:
+        _render_queue.shutdown()
@@ -8,10 +8,14 @@ from PyQt5.QtWidgets import (
 )
 from psycopg2 import OperationalError, sql
 from Database import Database
+from Search import product_match, product_rank, search_params
 from CurrentOrderWindow import CurrentOrderWindow
 from AddProductWindow import AddProductWindow
 from PyQt5 import QtCore
 from documentcreator import DocumentCreator
+from TableModel import DataTableView
+from QueryExecutor import QueryExecutor
+from Operations import Orders
 
 
 
@@ -24,6 +28,7 @@ class SalesWindow(QMainWindow):
         self.setGeometry(600, 200, 800, 600)
 
         self.changes = []  # Для отслеживания изменений
+        self.executor = QueryExecutor(self)
 
         layout = QVBoxLayout()
 
@@ -54,7 +59,7 @@ class SalesWindow(QMainWindow):
         layout.addLayout(search_layout)
 
         # Таблица для отображения товаров в заказе
-        self.table_widget = QTableWidget()
+        self.table_widget = DataTableView(['Product ID', 'Product Name', 'Amount', 'Price', 'Warehouse ID'])
         layout.addWidget(self.table_widget)
 
         # Кнопки для удаления товаров и подтверждения изменений
@@ -88,22 +93,22 @@ class SalesWindow(QMainWindow):
             print(f"Error loading orders: {e}")
             QMessageBox.critical(self, "Error", f"Error loading orders: {e}")
 
+    def refresh(self):
+        # Повторное открытие из MainWindow: список заказов обновляется, выбранный заказ остаётся
+        order_id = self.orders_combo.currentData()
+        self.orders_combo.blockSignals(True)
+        self.load_orders()
+        index = self.orders_combo.findData(order_id)
+        if index >= 0:
+            self.orders_combo.setCurrentIndex(index)
+        self.orders_combo.blockSignals(False)
+        self.update_table()
+
     def update_table(self):
         try:
             with Database(self.user, self.password) as db:
                 order_id = self.orders_combo.currentData()
-                products = db.get_products_by_order(order_id)
-                self.table_widget.setRowCount(len(products))
-                self.table_widget.setColumnCount(5)
-                headers = ['Product ID', 'Product Name', 'Amount', 'Price', 'Warehouse ID']
-                self.table_widget.setHorizontalHeaderLabels(headers)
-                for i, (id, name, amount, price, warehouse_id) in enumerate(products):
-                    self.table_widget.setItem(i, 0, QTableWidgetItem(str(id)))
-                    self.table_widget.setItem(i, 1, QTableWidgetItem(str(name)))
-                    self.table_widget.setItem(i, 2, QTableWidgetItem(str(amount)))
-                    self.table_widget.setItem(i, 3, QTableWidgetItem(str(price)))
-                    self.table_widget.setItem(i, 4, QTableWidgetItem(str(warehouse_id)))
-                self.make_table_read_only()
+                self.table_widget.set_rows(db.get_products_by_order(order_id))
         except Exception as e:
             print(f"Error updating sales table: {e}")
             QMessageBox.critical(self, "Error", f"Error updating table: {e}")
@@ -124,44 +129,39 @@ class SalesWindow(QMainWindow):
             QMessageBox.critical(self, 'Error', f'Error opening add product window: {e}')
 
     def save_changes(self):
-        try:
-            with Database(self.user, self.password) as db:
-                for change in self.changes:
-                    change_type, product_id, order_id, warehouse_id, amount = change
-                    if change_type == 'delete':
-                        db.cursor.execute(
-                            'DELETE FROM Order_Items WHERE product_id = %s AND order_id = %s AND warehouse_id = %s',
-                            (product_id, order_id, warehouse_id))
-                        db.cursor.execute('SELECT * FROM ProductInWarehouse WHERE product_id = %s and warehouse_id = %s', (product_id, warehouse_id))
-                        result = db.cursor.fetchall()
-                        if result:
-                            db.cursor.execute('UPDATE ProductInWarehouse SET amount = amount + %s WHERE product_id = %s and warehouse_id = %s',
-                                              (amount, product_id, warehouse_id))
-                        else:
-                            db.cursor.execute('INSERT INTO ProductInWarehouse (warehouse_id, product_id, amount) VALUES (%s, %s, %s)', (warehouse_id, product_id, amount))
-                for i in range(self.table_widget.rowCount()):
-                    data = {'{order_id}':str(self.orders_combo.currentData()),
-                    '{product_id}':str(self.table_widget.item(i, 0).text()),
-                    '{product_name}':str(self.table_widget.item(i, 1).text()),
-                    '{amount}':str(self.table_widget.item(i, 2).text()),
-                    '{price}':str(self.table_widget.item(i, 3).text()),
-                    '{warehouse_id}':str(self.table_widget.item(i, 4).text())}
-                    doc = DocumentCreator('salespreset.docx', data)
-                    doc.exec_()
-                db.conn.commit()
-                self.changes.clear()
-                QMessageBox.information(self, 'Успех', 'Изменения успешно сохранены!')
-        except Exception as e:
-            if db.conn:
-                db.conn.rollback()
-            QMessageBox.critical(self, 'Ошибка', f'Произошла ошибка при сохранении: {e}')
-
-    def make_table_read_only(self):
-        for row in range(self.table_widget.rowCount()):
-            for col in range(self.table_widget.columnCount()):
-                item = self.table_widget.item(row, col)
-                if item:
-                    item.setFlags(item.flags() & ~QtCore.Qt.ItemIsEditable)
+        # Данные для документов берём из таблицы здесь, в потоке интерфейса
+        documents = []
+        for i in range(self.table_widget.rowCount()):
+            documents.append({'{order_id}': str(self.orders_combo.currentData()),
+                              '{product_id}': str(self.table_widget.item(i, 0).text()),
+                              '{product_name}': str(self.table_widget.item(i, 1).text()),
+                              '{amount}': str(self.table_widget.item(i, 2).text()),
+                              '{price}': str(self.table_widget.item(i, 3).text()),
+                              '{warehouse_id}': str(self.table_widget.item(i, 4).text())})
+        self.confirm_button.setEnabled(False)
+        self.executor.submit(None, self.write_changes, list(self.changes),
+                             on_result=lambda _: self.on_changes_saved(documents),
+                             on_error=self.on_save_error)
+
+    def write_changes(self, changes):
+        # Выполняется в фоновом потоке: только база, без виджетов
+        # Товар из удалённых строк заказов возвращается на склад
+        Orders(Database(self.user, self.password)).remove_items(
+            [(order_id, product_id, warehouse_id)
+             for change_type, product_id, order_id, warehouse_id, amount in changes if change_type == 'delete'])
+
+    def on_changes_saved(self, documents):
+        self.confirm_button.setEnabled(True)
+        self.changes.clear()
+        if documents:
+            # Один документ на всю операцию, по строке таблицы на каждый товар
+            doc = DocumentCreator('salespreset.docx', documents)
+            doc.exec_()
+        QMessageBox.information(self, 'Успех', 'Изменения успешно сохранены!')
+
+    def on_save_error(self, error):
+        self.confirm_button.setEnabled(True)
+        QMessageBox.critical(self, 'Ошибка', f'Произошла ошибка при сохранении: {error}')
 
     def delete_item(self):
         selected_row = self.table_widget.currentRow()
@@ -184,25 +184,13 @@ class SalesWindow(QMainWindow):
 
         try:
             with Database(self.user, self.password) as db:
-                db.cursor.execute("""
+                db.cursor.execute(f"""
                 SELECT p.id, p.name, oi.amount, oi.price, oi.warehouse_id
                 FROM Order_items oi 
                 JOIN Products p ON oi.product_id = p.id 
-                WHERE oi.order_id = %s AND LOWER(p.name) LIKE %s
-                """, (order_id, '%' + search_text + '%'))
-                products = db.cursor.fetchall()
-
-                self.table_widget.setRowCount(len(products))
-                self.table_widget.setColumnCount(
-                    5)  # Установите количество столбцов, соответствующее вашему шаблону таблицы
-
-                headers = ['Product ID', 'Product Name', 'Amount', 'Price', 'Warehouse ID']
-                self.table_widget.setHorizontalHeaderLabels(headers)
-
-                for i, product in enumerate(products):
-                    for j in range(len(product)):
-                        self.table_widget.setItem(i, j, QTableWidgetItem(str(product[j])))
-
-                self.make_table_read_only()  # Делает таблицу доступной только для чтения
+                WHERE oi.order_id = %(order_id)s AND {product_match('p')}
+                ORDER BY {product_rank('p')}
+                """, search_params(search_text, order_id=order_id))
+                self.table_widget.set_rows(db.cursor.fetchall())
         except Exception as e:
             QMessageBox.critical(self, 'Ошибка', f'Произошла ошибка при поиске: {e}')
\ No newline at end of file
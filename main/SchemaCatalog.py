@@ -0,0 +1,179 @@
+import os
+import json
+import logging
+import threading
+
+# Каталог схемы базы: столбцы с типами, ограничения и индексы всех таблиц текущей схемы.
+# Читается один раз за сеанс, а между сеансами хранится на диске (cache/schema_<база>.json).
+# Версия схемы - md5 по столбцам, ограничениям и индексам из pg_catalog (один короткий запрос при входе);
+# если она совпала с версией файла, information_schema не читается вовсе.
+# Окна и диалоги берут имена и типы столбцов отсюда, а не запросом SELECT * ... LIMIT 0 при каждом открытии
+
+CACHE_FOLDER = 'cache'
+
+VERSION_QUERY = """
+    SELECT md5(concat_ws('|',
+        (SELECT string_agg(concat_ws('.', c.relname, a.attnum, a.attname, a.atttypid, a.attnotnull, a.attisdropped),
+                           ',' ORDER BY c.relname, a.attnum)
+         FROM pg_attribute a JOIN pg_class c ON c.oid = a.attrelid
+         WHERE c.relnamespace = current_schema()::regnamespace AND c.relkind IN ('r', 'p', 'v', 'm') AND a.attnum > 0),
+        (SELECT string_agg(conname || ':' || pg_get_constraintdef(oid), ',' ORDER BY conname)
+         FROM pg_constraint WHERE connamespace = current_schema()::regnamespace),
+        (SELECT string_agg(indexname || ':' || indexdef, ',' ORDER BY indexname)
+         FROM pg_indexes WHERE schemaname = current_schema())))
+"""
+
+# Тип PostgreSQL -> тип поля в EditDialog
+FIELD_TYPES = {
+    'smallint': 'INT', 'integer': 'INT', 'bigint': 'INT',
+    'numeric': 'REAL', 'real': 'REAL', 'double precision': 'REAL', 'money': 'REAL',
+    'date': 'DATE',
+    'timestamp without time zone': 'TIMESTAMP', 'timestamp with time zone': 'TIMESTAMP',
+    'bytea': 'BYTEA',
+}
+
+
+class SchemaCatalog():
+    def __init__(self, version, tables, constraints, indexes):
+        self.version = version
+        self.tables = tables  # Таблица -> [{column, type, nullable, default, length}] в порядке столбцов
+        self.constraints = constraints  # Таблица -> [{name, type, columns, definition}]
+        self.indexes = indexes  # Таблица -> [{name, unique, definition}]
+        self.by_column = {}  # Имя столбца -> тип, если во всех таблицах он один и тот же
+        for columns in tables.values():
+            for column in columns:
+                name = column['column']
+                if self.by_column.get(name, column['type']) != column['type']:
+                    self.by_column[name] = None  # Одно имя - разные типы: без таблицы не угадать
+                else:
+                    self.by_column[name] = column['type']
+
+    def columns(self, table):
+        return self.tables.get(table.lower(), [])
+
+    def column_names(self, table):
+        return [column['column'] for column in self.columns(table)]
+
+    def column(self, table, name):
+        for column in self.columns(table):
+            if column['column'] == name:
+                return column
+        return None
+
+    def column_type(self, name, table=None):
+        # Тип поля для диалога; без таблицы - по имени столбца, если оно однозначно
+        if table is not None:
+            column = self.column(table, name)
+            data_type = column['type'] if column else None
+        else:
+            data_type = self.by_column.get(name)
+        return FIELD_TYPES.get(data_type, 'VARCHAR')
+
+    def table_constraints(self, table):
+        return self.constraints.get(table.lower(), [])
+
+    def table_indexes(self, table):
+        return self.indexes.get(table.lower(), [])
+
+    def to_json(self):
+        return {'version': self.version, 'tables': self.tables,
+                'constraints': self.constraints, 'indexes': self.indexes}
+
+
+def cache_path(dbname):
+    return os.path.join(CACHE_FOLDER, f'schema_{dbname}.json')
+
+
+def read_cached(path, version):
+    try:
+        with open(path, encoding='utf-8') as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if data.get('version') != version:
+        return None
+    return SchemaCatalog(data['version'], data['tables'], data['constraints'], data['indexes'])
+
+
+def write_cached(path, catalog):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(catalog.to_json(), file, ensure_ascii=False)
+        os.replace(temp_path, path)  # Второй запущенный терминал не прочитает недописанный файл
+    except OSError as e:
+        print(f"Не удалось сохранить каталог схемы: {e}")
+
+
+def introspect(cursor, version):
+    tables = {}
+    cursor.execute("""
+        SELECT table_name, column_name, data_type, is_nullable = 'YES', column_default, character_maximum_length
+        FROM information_schema.columns
+        WHERE table_schema = current_schema()
+        ORDER BY table_name, ordinal_position
+    """)
+    for table, column, data_type, nullable, default, length in cursor.fetchall():
+        tables.setdefault(table, []).append({'column': column, 'type': data_type, 'nullable': nullable,
+                                             'default': default, 'length': length})
+    constraints = {}
+    cursor.execute("""
+        SELECT c.conrelid::regclass::text, c.conname, c.contype,
+               ARRAY(SELECT a.attname::text FROM unnest(c.conkey) WITH ORDINALITY k(attnum, position)
+                     JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = k.attnum ORDER BY k.position),
+               pg_get_constraintdef(c.oid)
+        FROM pg_constraint c
+        WHERE c.connamespace = current_schema()::regnamespace AND c.conrelid <> 0
+        ORDER BY 1, 2
+    """)
+    for table, name, kind, columns, definition in cursor.fetchall():
+        constraints.setdefault(table.lower(), []).append({'name': name, 'type': kind, 'columns': columns,
+                                                          'definition': definition})
+    indexes = {}
+    cursor.execute("""
+        SELECT tablename, indexname, indexdef LIKE 'CREATE UNIQUE %', indexdef
+        FROM pg_indexes WHERE schemaname = current_schema()
+        ORDER BY tablename, indexname
+    """)
+    for table, name, unique, definition in cursor.fetchall():
+        indexes.setdefault(table, []).append({'name': name, 'unique': unique, 'definition': definition})
+    return SchemaCatalog(version, tables, constraints, indexes)
+
+
+def load_schema_catalog(db):
+    # Вызывается при входе, после того как ensure_* досоздали таблицы и индексы
+    global _schema_catalog
+    with db:
+        db.cursor.execute(VERSION_QUERY)
+        version = db.cursor.fetchone()[0]
+        path = cache_path(db.dbname)
+        catalog = read_cached(path, version)
+        if catalog is None:
+            catalog = introspect(db.cursor, version)
+            write_cached(path, catalog)
+            logging.debug(f"Schema catalog introspected: {len(catalog.tables)} tables, version {version}")
+        db.conn.rollback()  # Только чтение - соединение возвращается в пул без открытой транзакции
+    with _lock:
+        _schema_catalog = catalog
+    return catalog
+
+
+_schema_catalog = None
+_lock = threading.Lock()
+
+
+def get_schema_catalog(user=None, password=None):
+    # Каталог сеанса. Если вход прошёл без load_schema_catalog (например, в Менеджере), он читается
+    # при первом обращении - с переданным логином или логином окна входа
+    with _lock:
+        catalog = _schema_catalog
+    if catalog is not None:
+        return catalog
+    from LoginWindowmain import GlobalData
+    from Database import Database  # Database импортирует LoginWindowmain
+    try:
+        return load_schema_catalog(Database(user or GlobalData.username, password or GlobalData.password))
+    except Exception as e:
+        print(f"Ошибка при чтении каталога схемы: {e}")
+        return SchemaCatalog(None, {}, {}, {})
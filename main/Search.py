@@ -0,0 +1,61 @@
+import logging
+
+# Поиск по товарам и клиентам. LIKE '%текст%' по LOWER(столбец) обслуживается GIN-индексами pg_trgm,
+# а не полным просмотром таблицы; результаты сортируются по похожести (word_similarity).
+# Запросы поиска используют именованные параметры из search_params: %(pattern)s и %(text)s
+
+SEARCH_INDEXES = [
+    ('products_name_trgm_idx', 'Products', 'LOWER(name)'),
+    ('products_article_trgm_idx', 'Products', 'LOWER(article)'),
+    ('clients_full_name_trgm_idx', 'Clients', 'LOWER(full_name)'),
+]
+
+PRODUCT_MATCH = "(LOWER({0}name) LIKE %(pattern)s OR LOWER({0}article) LIKE %(pattern)s)"
+PRODUCT_RANK = "GREATEST(word_similarity(%(text)s, LOWER({0}name)), word_similarity(%(text)s, LOWER({0}article))) DESC"
+CLIENT_RANK = "word_similarity(%(text)s, LOWER(full_name)) DESC"
+
+trigram_enabled = False  # Есть ли в базе pg_trgm; без него сортируем по имени
+
+
+def product_match(alias=''):
+    # alias - имя или псевдоним таблицы Products в запросе: 'p', 'Products'
+    return PRODUCT_MATCH.format(f'{alias}.' if alias else '')
+
+
+def product_rank(alias=''):
+    prefix = f'{alias}.' if alias else ''
+    return PRODUCT_RANK.format(prefix) if trigram_enabled else f'{prefix}name'
+
+
+def client_rank():
+    return CLIENT_RANK if trigram_enabled else 'full_name'
+
+
+def search_params(search_text, **params):
+    text = search_text.strip().lower()
+    # Символы % и _ из поля поиска ищутся буквально
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    params.update({'pattern': f'%{escaped}%', 'text': text})
+    return params
+
+
+def ensure_search_indexes(db):
+    # Вызывается при входе. Индексы создаются один раз, дальше PostgreSQL поддерживает их сам
+    global trigram_enabled
+    try:
+        with db:
+            db.cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            for index_name, table_name, expression in SEARCH_INDEXES:
+                db.cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} USING gin ({expression} gin_trgm_ops)")
+            db.conn.commit()
+            logging.debug("Search indexes are in place")
+    except Exception as e:
+        # Например, у пользователя нет прав на CREATE EXTENSION - поиск работает, но без индексов
+        print(f"Ошибка при создании индексов поиска: {e}")
+    try:
+        with db:
+            db.cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            trigram_enabled = db.cursor.fetchone() is not None
+    except Exception as e:
+        print(f"Ошибка при проверке pg_trgm: {e}")
@@ -0,0 +1,356 @@
+import logging
+from PreparedStatements import register_statement
+
+# Журнал движений товара. Любое изменение остатка (приёмка, перемещение, списание, продажа,
+# возврат из заказа, инвентаризация) записывается строкой в StockMovements - журнал только дополняется,
+# строки остатков при записи не обновляются, поэтому операции с одним товаром не ждут друг друга на одной строке.
+# Текущий остаток - представление StockBalances: свёрнутый остаток ProductInWarehouse плюс движения,
+# ещё не перенесённые в него. Перенос (fold_movements) забирает движения закрытых транзакций по moved_xid
+# (номер транзакции, записавшей движение) и сдвигает границу StockFold.horizon тем же запросом.
+# Проверка "не уходим в минус" идёт под рекомендательной блокировкой пары (склад, товар), которую берут
+# только уменьшающие остаток операции - приход ничего не ждёт.
+# Раз в сутки остатки на полночь сохраняются в StockSnapshots (только по товарам, которые двигались),
+# так что остаток на любую дату - это последний снимок плюс движения после него, без просмотра всего журнала
+
+SNAPSHOT_LAG = '1 hour'  # Снимок на полночь строится не раньше, чем через час: транзакции того дня уже закрыты
+
+BALANCES_VIEW = """
+    CREATE OR REPLACE VIEW StockBalances AS
+    SELECT warehouse_id, product_id, SUM(amount)::integer AS amount
+    FROM (SELECT warehouse_id, product_id, amount FROM ProductInWarehouse
+          UNION ALL
+          SELECT m.warehouse_id, m.product_id, m.delta FROM StockMovements m
+          WHERE m.moved_xid >= (SELECT horizon FROM StockFold)) balances
+    GROUP BY warehouse_id, product_id
+"""
+
+# Перенос в ProductInWarehouse движений транзакций младше xmin текущего снимка: все они уже закрыты,
+# и новых движений с такими номерами не появится
+FOLD_QUERY = """
+    WITH bounds AS (
+        SELECT horizon AS folded, GREATEST(horizon, txid_snapshot_xmin(txid_current_snapshot())) AS horizon
+        FROM StockFold
+    ), moved AS (
+        SELECT m.warehouse_id, m.product_id, SUM(m.delta) AS delta
+        FROM StockMovements m, bounds
+        WHERE m.moved_xid >= bounds.folded AND m.moved_xid < bounds.horizon
+        GROUP BY m.warehouse_id, m.product_id
+        HAVING SUM(m.delta) <> 0
+    ), applied AS (
+        INSERT INTO ProductInWarehouse AS piw (warehouse_id, product_id, amount)
+        SELECT warehouse_id, product_id, delta FROM moved
+        ORDER BY warehouse_id, product_id
+        ON CONFLICT (warehouse_id, product_id) DO UPDATE SET amount = piw.amount + EXCLUDED.amount
+        RETURNING 1
+    ), advanced AS (
+        UPDATE StockFold SET horizon = bounds.horizon FROM bounds
+    )
+    SELECT count(*) FROM applied
+"""
+
+# Запись движений, их блокировки и строки заказа идут на каждое сохранение - выполняются подготовленными операторами
+LOCK_QUERY = register_statement('lock_stock', """
+    SELECT pg_advisory_xact_lock(warehouse_id, product_id)
+    FROM (SELECT * FROM unnest(%(warehouses)s::integer[], %(products)s::integer[]) AS r(warehouse_id, product_id)
+          ORDER BY warehouse_id, product_id) pairs
+""")
+
+MOVEMENTS_QUERY = register_statement('apply_movements', """
+    WITH req AS (
+        SELECT * FROM unnest(%(warehouses)s::integer[], %(products)s::integer[], %(deltas)s::integer[])
+            WITH ORDINALITY AS r(warehouse_id, product_id, delta, line)
+    ), logged AS (
+        INSERT INTO StockMovements (warehouse_id, product_id, delta, operation, reference)
+        SELECT warehouse_id, product_id, delta, %(operation)s, %(reference)s FROM req
+        WHERE delta <> 0
+        ORDER BY line
+    ), net AS (
+        SELECT warehouse_id, product_id, SUM(delta) AS delta
+        FROM req
+        GROUP BY warehouse_id, product_id
+    ), balances AS (
+        SELECT net.warehouse_id, net.product_id, COALESCE(b.amount, 0) + net.delta AS amount
+        FROM net
+        LEFT JOIN LATERAL (
+            SELECT amount FROM StockBalances b
+            WHERE b.warehouse_id = net.warehouse_id AND b.product_id = net.product_id
+        ) b ON true
+    )
+    SELECT req.line, req.warehouse_id, req.product_id, req.delta, balances.amount,
+           req.delta >= 0 OR balances.amount >= 0
+    FROM req
+    JOIN balances ON balances.warehouse_id = req.warehouse_id AND balances.product_id = req.product_id
+    ORDER BY req.line
+""", {'operation': 'text', 'reference': 'text'})
+
+ORDER_ITEMS_QUERY = register_statement('add_order_items', """
+    WITH req AS (
+        SELECT * FROM unnest(%(products)s::integer[], %(quantities)s::integer[], %(prices)s::numeric[])
+            WITH ORDINALITY AS r(product_id, quantity, price, line)
+    ), net AS (
+        SELECT product_id, SUM(quantity) AS quantity, (array_agg(price ORDER BY line DESC))[1] AS price
+        FROM req
+        GROUP BY product_id
+    )
+    INSERT INTO Order_Items (order_id, product_id, amount, price, warehouse_id)
+    SELECT %(order_id)s, net.product_id, net.quantity, net.price, %(warehouse_id)s
+    FROM net
+    ORDER BY net.product_id
+    ON CONFLICT (order_id, warehouse_id, product_id) DO UPDATE SET amount = Order_Items.amount + EXCLUDED.amount
+""", {'warehouse_id': 'integer', 'order_id': 'integer'})
+
+
+class StockShortage(Exception):
+    def __init__(self, failed):
+        self.failed = failed  # Строки apply_movements, где остаток ушёл бы в минус
+        super().__init__('Недостаточно товара на складе: ' + ', '.join(
+            f'товар {product_id} на складе {warehouse_id} (не хватает {-balance} шт.)'
+            for line, warehouse_id, product_id, delta, balance, ok in failed))
+
+
+def ensure_stock_ledger(db):
+    # Вызывается при входе: создаёт журнал и снимки, при первом запуске переносит текущие остатки
+    # в журнал движением 'opening', затем досчитывает недостающие суточные снимки и сворачивает журнал в остатки.
+    # Журнал прежнего вида (без moved_xid) дополняется: его движения уже учтены в ProductInWarehouse
+    try:
+        with db:
+            db.cursor.execute("SELECT to_regclass('stockmovements') IS NOT NULL, to_regclass('stockfold') IS NOT NULL")
+            exists, folded = db.cursor.fetchone()
+            if not exists:
+                db.cursor.execute("""
+                    CREATE TABLE StockMovements (
+                        id bigserial PRIMARY KEY,
+                        moved_at timestamptz NOT NULL DEFAULT now(),
+                        warehouse_id integer NOT NULL,
+                        product_id integer NOT NULL,
+                        delta integer NOT NULL,
+                        operation text NOT NULL,
+                        reference text,
+                        moved_by text NOT NULL DEFAULT current_user
+                    )
+                """)
+                db.cursor.execute("""
+                    CREATE INDEX stockmovements_stock_idx ON StockMovements (warehouse_id, product_id, moved_at)
+                """)
+                db.cursor.execute("CREATE INDEX stockmovements_moved_at_idx ON StockMovements (moved_at)")
+                db.cursor.execute("""
+                    CREATE TABLE StockSnapshots (
+                        taken_at timestamptz NOT NULL,
+                        warehouse_id integer NOT NULL,
+                        product_id integer NOT NULL,
+                        amount integer NOT NULL,
+                        PRIMARY KEY (warehouse_id, product_id, taken_at)
+                    )
+                """)
+                db.cursor.execute("CREATE INDEX stocksnapshots_taken_at_idx ON StockSnapshots (taken_at)")
+                db.cursor.execute("""
+                    INSERT INTO StockMovements (warehouse_id, product_id, delta, operation)
+                    SELECT warehouse_id, product_id, amount, 'opening' FROM ProductInWarehouse WHERE amount <> 0
+                """)
+                logging.debug(f"Stock ledger created, {db.cursor.rowcount} opening balances")
+            if not folded:
+                # Уже записанные движения считаются свёрнутыми (moved_xid = 0 < horizon), новые получают номер транзакции
+                db.cursor.execute("ALTER TABLE StockMovements ADD COLUMN moved_xid bigint NOT NULL DEFAULT 0")
+                db.cursor.execute("ALTER TABLE StockMovements ALTER COLUMN moved_xid SET DEFAULT txid_current()")
+                db.cursor.execute("CREATE INDEX stockmovements_moved_xid_idx ON StockMovements (moved_xid)")
+                db.cursor.execute("""
+                    CREATE INDEX stockmovements_stock_xid_idx ON StockMovements (warehouse_id, product_id, moved_xid)
+                """)
+                db.cursor.execute("CREATE TABLE StockFold (horizon bigint NOT NULL)")
+                db.cursor.execute("INSERT INTO StockFold (horizon) VALUES (1)")
+                db.cursor.execute(BALANCES_VIEW)
+                logging.debug("Stock ledger: balances view created")
+            db.conn.commit()
+        materialize_snapshots(db)
+        fold_movements(db)
+    except Exception as e:
+        # Например, у пользователя нет прав на CREATE TABLE - журнал готовит администратор
+        print(f"Ошибка при создании журнала движений товара: {e}")
+
+
+def lock_stock(cursor, pairs):
+    # Блокировка пар (склад, товар) до конца транзакции, всегда в порядке пар - параллельные операции
+    # не ловят взаимоблокировку. Блокировку можно брать повторно: план заказа берёт все пары заранее
+    pairs = sorted({(int(warehouse_id), int(product_id)) for warehouse_id, product_id in pairs})
+    if pairs:
+        cursor.execute(LOCK_QUERY, {'warehouses': [warehouse_id for warehouse_id, product_id in pairs],
+                                    'products': [product_id for warehouse_id, product_id in pairs]})
+        cursor.fetchall()
+
+
+def apply_movements(cursor, movements, operation, reference=None):
+    # Единственный способ изменить остаток. movements: [(склад, товар, изменение)], изменение со знаком.
+    # Пары, где остаток уменьшается, блокируются (lock_stock), затем одним запросом пишется журнал
+    # и считается остаток после по StockBalances - уже с движениями тех, кто держал блокировку до нас.
+    # Возвращает (строка, склад, товар, изменение, остаток после, хватило ли товара) в порядке movements.
+    # Коммит и откат - на вызывающем
+    if not movements:
+        return []
+    warehouse_ids, product_ids, deltas = ([int(value) for value in column] for column in zip(*movements))
+    net = {}
+    for warehouse_id, product_id, delta in zip(warehouse_ids, product_ids, deltas):
+        net[(warehouse_id, product_id)] = net.get((warehouse_id, product_id), 0) + delta
+    lock_stock(cursor, [pair for pair, delta in net.items() if delta < 0])
+    cursor.execute(MOVEMENTS_QUERY, {'warehouses': warehouse_ids, 'products': product_ids, 'deltas': deltas,
+                                     'operation': operation, 'reference': reference})
+    return cursor.fetchall()
+
+
+def move_stock(cursor, movements, operation, reference=None):
+    # То же, что apply_movements, но при нехватке товара бросает StockShortage - вызывающий не коммитит
+    results = apply_movements(cursor, movements, operation, reference)
+    failed = [result for result in results if not result[5]]
+    if failed:
+        raise StockShortage(failed)
+    return results
+
+
+def reserve_basket(cursor, order_id, warehouse_id, lines, reference=None):
+    # Резерв всей корзины: списание через apply_movements (операция 'order'), проверка по свежему остатку,
+    # а не по числу из таблицы окна. Строки заказа пишутся, только если хватило всего;
+    # иначе в журнале остаются списания, и вызывающий откатывает транзакцию.
+    # lines: [(товар, количество, цена)]. Возвращает (строка, товар, количество, доступно, хватило ли товара)
+    # в порядке lines; коммит и откат - на вызывающем
+    if not lines:
+        return []
+    product_ids, quantities, prices = (list(column) for column in zip(*lines))
+    product_ids = [int(product_id) for product_id in product_ids]
+    quantities = [int(quantity) for quantity in quantities]
+    results = apply_movements(cursor, [(warehouse_id, product_id, -quantity)
+                                       for product_id, quantity in zip(product_ids, quantities)],
+                              'order', reference or f'order {order_id}')
+    taken = {}
+    for product_id, quantity in zip(product_ids, quantities):
+        taken[product_id] = taken.get(product_id, 0) + quantity
+    results = [(line, product_id, -delta, balance + taken[product_id], ok)
+               for line, warehouse, product_id, delta, balance, ok in results]
+    if all(result[4] for result in results):
+        cursor.execute(ORDER_ITEMS_QUERY, {'products': product_ids, 'quantities': quantities, 'prices': prices,
+                                           'order_id': int(order_id), 'warehouse_id': int(warehouse_id)})
+    return results
+
+
+def apply_inventory(cursor, source_query, params=None, operation='inventory', reference=None):
+    # Инвентаризация: source_query выдаёт (склад, товар, фактическое количество) без повторов пар.
+    # Все пары блокируются (как в lock_stock), в журнал пишется разница с текущим остатком -
+    # остаток становится фактическим. Возвращает (новых пар склад-товар, уже бывших)
+    cursor.execute(f"""
+        SELECT pg_advisory_xact_lock(warehouse_id, product_id)
+        FROM (SELECT warehouse_id, product_id FROM ({source_query}) src ORDER BY warehouse_id, product_id) pairs
+    """, params)
+    cursor.fetchall()
+    cursor.execute(f"""
+        WITH src AS (
+            {source_query}
+        ), counted AS (
+            SELECT src.warehouse_id, src.product_id, b.amount IS NULL AS inserted,
+                   src.amount - COALESCE(b.amount, 0) AS delta
+            FROM src
+            LEFT JOIN StockBalances b ON b.warehouse_id = src.warehouse_id AND b.product_id = src.product_id
+        ), logged AS (
+            INSERT INTO StockMovements (warehouse_id, product_id, delta, operation, reference)
+            SELECT warehouse_id, product_id, delta, %(operation)s, %(reference)s FROM counted
+            WHERE delta <> 0
+            ORDER BY warehouse_id, product_id
+        )
+        SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM counted
+    """, dict(params or {}, operation=operation, reference=reference))
+    return cursor.fetchone()
+
+
+def fold_movements(db):
+    # Переносит движения закрытых транзакций в ProductInWarehouse, чтобы StockBalances складывал
+    # только недавний хвост журнала. Остатки при этом не меняются; параллельный перенос не ждёт, а пропускается
+    try:
+        with db:
+            db.cursor.execute("SELECT pg_try_advisory_xact_lock(hashtext('stock_movements_fold'))")
+            if db.cursor.fetchone()[0]:
+                db.cursor.execute(FOLD_QUERY)
+                folded = db.cursor.fetchone()[0]
+                if folded:
+                    logging.debug(f"Stock movements: {folded} balances folded")
+            db.conn.commit()
+    except Exception as e:
+        print(f"Ошибка при переносе движений в остатки: {e}")
+
+
+def materialize_snapshots(db):
+    # Снимок на последнюю прошедшую полночь: предыдущий снимок пары плюс её движения за прошедший интервал.
+    # Снимок пишется только для пар, которые двигались, - таблица растёт с журналом, а не со временем
+    try:
+        with db:
+            db.cursor.execute("SELECT pg_advisory_xact_lock(hashtext('stock_snapshots'))")  # Один вход считает снимок
+            db.cursor.execute(f"""
+                WITH bounds AS (
+                    SELECT COALESCE(max(taken_at), '-infinity') AS last_taken,
+                           date_trunc('day', now() - interval '{SNAPSHOT_LAG}') AS boundary
+                    FROM StockSnapshots
+                ), moved AS (
+                    SELECT m.warehouse_id, m.product_id, SUM(m.delta) AS delta
+                    FROM StockMovements m, bounds
+                    WHERE m.moved_at >= bounds.last_taken AND m.moved_at < bounds.boundary
+                    GROUP BY m.warehouse_id, m.product_id
+                )
+                INSERT INTO StockSnapshots (taken_at, warehouse_id, product_id, amount)
+                SELECT bounds.boundary, moved.warehouse_id, moved.product_id, COALESCE(prev.amount, 0) + moved.delta
+                FROM moved
+                CROSS JOIN bounds
+                LEFT JOIN LATERAL (
+                    SELECT amount FROM StockSnapshots s
+                    WHERE s.warehouse_id = moved.warehouse_id AND s.product_id = moved.product_id
+                    ORDER BY s.taken_at DESC LIMIT 1
+                ) prev ON true
+                WHERE bounds.boundary > bounds.last_taken
+            """)
+            if db.cursor.rowcount:
+                logging.debug(f"Stock snapshot: {db.cursor.rowcount} balances materialized")
+            db.conn.commit()
+    except Exception as e:
+        print(f"Ошибка при построении снимка остатков: {e}")
+
+
+def stock_at(cursor, moment, warehouse_id=None):
+    # Остатки на момент moment: (склад, товар, количество). Последний снимок пары не позже moment
+    # плюс движения после последней границы снимков
+    cursor.execute("""
+        WITH boundary AS (
+            SELECT COALESCE(max(taken_at), '-infinity') AS taken_at FROM StockSnapshots WHERE taken_at <= %(moment)s
+        ), snap AS (
+            SELECT DISTINCT ON (warehouse_id, product_id) warehouse_id, product_id, amount
+            FROM StockSnapshots
+            WHERE taken_at <= %(moment)s AND (%(warehouse_id)s::integer IS NULL OR warehouse_id = %(warehouse_id)s)
+            ORDER BY warehouse_id, product_id, taken_at DESC
+        ), tail AS (
+            SELECT m.warehouse_id, m.product_id, SUM(m.delta) AS delta
+            FROM StockMovements m, boundary
+            WHERE m.moved_at >= boundary.taken_at AND m.moved_at < %(moment)s
+            AND (%(warehouse_id)s::integer IS NULL OR m.warehouse_id = %(warehouse_id)s)
+            GROUP BY m.warehouse_id, m.product_id
+        )
+        SELECT warehouse_id, product_id, COALESCE(snap.amount, 0) + COALESCE(tail.delta, 0) AS amount
+        FROM snap FULL JOIN tail USING (warehouse_id, product_id)
+        ORDER BY warehouse_id, product_id
+    """, {'moment': moment, 'warehouse_id': warehouse_id})
+    return cursor.fetchall()
+
+
+def audit_balances(cursor, warehouse_id=None):
+    # Сверка StockBalances с журналом: (склад, товар, остаток, остаток по журналу)
+    # для пар, где они расходятся, - например, после правки ProductInWarehouse в обход apply_movements
+    cursor.execute("""
+        WITH ledger AS (
+            SELECT warehouse_id, product_id, SUM(delta) AS amount
+            FROM StockMovements
+            WHERE %(warehouse_id)s::integer IS NULL OR warehouse_id = %(warehouse_id)s
+            GROUP BY warehouse_id, product_id
+        ), balances AS (
+            SELECT warehouse_id, product_id, amount
+            FROM StockBalances
+            WHERE %(warehouse_id)s::integer IS NULL OR warehouse_id = %(warehouse_id)s
+        )
+        SELECT warehouse_id, product_id, COALESCE(balances.amount, 0), COALESCE(ledger.amount, 0)
+        FROM balances FULL JOIN ledger USING (warehouse_id, product_id)
+        WHERE COALESCE(balances.amount, 0) <> COALESCE(ledger.amount, 0)
+        ORDER BY warehouse_id, product_id
+    """, {'warehouse_id': warehouse_id})
+    return cursor.fetchall()
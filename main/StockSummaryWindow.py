@@ -0,0 +1,97 @@
+import logging
+from PyQt5.QtWidgets import (
+    QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QPushButton, QMessageBox, QLabel, QLineEdit
+)
+from Database import Database, RowStream
+from Search import product_match, product_rank, search_params
+from TableModel import DataTableView
+from QueryExecutor import QueryExecutor
+from InventorySummary import PENDING_DELTAS, product_breakdown, fold_stock_totals
+from StockLedger import fold_movements
+
+
+class StockSummaryWindow(QMainWindow):
+    # Сколько товара во всей компании: общий остаток из сводки StockTotals, по выбранному товару - склады
+    headers = ['ID', 'Артикул', 'Название', 'Всего', 'Складов']
+
+    def __init__(self, user, password):
+        super().__init__()
+        self.user = user
+        self.password = password
+        self.setWindowTitle('Остатки по складам')
+        self.setGeometry(500, 150, 900, 700)
+        self.executor = QueryExecutor(self)
+
+        layout = QVBoxLayout()
+        search_layout = QHBoxLayout()
+        search_layout.addWidget(QLabel('Поиск товара:'))
+        self.search_box = QLineEdit()
+        self.search_box.returnPressed.connect(self.update_table)
+        search_layout.addWidget(self.search_box)
+        self.search_button = QPushButton('Поиск')
+        self.search_button.clicked.connect(self.update_table)
+        search_layout.addWidget(self.search_button)
+        layout.addLayout(search_layout)
+
+        self.totals_table = DataTableView(self.headers)
+        self.totals_table.clicked.connect(self.show_breakdown)
+        layout.addWidget(self.totals_table)
+
+        self.breakdown_label = QLabel('Выберите товар, чтобы увидеть склады')
+        layout.addWidget(self.breakdown_label)
+        self.breakdown_table = DataTableView(['ID склада', 'Склад', 'Количество'])
+        layout.addWidget(self.breakdown_table)
+
+        container = QWidget()
+        container.setLayout(layout)
+        self.setCentralWidget(container)
+
+        self.update_table()
+
+    def update_table(self):
+        search_text = self.search_box.text()
+        totals = f"""
+            SELECT p.id, p.article, p.name, COALESCE(t.amount, 0) + COALESCE(d.amount, 0),
+                   COALESCE(t.warehouses, 0) + COALESCE(d.warehouses, 0)
+            FROM Products p
+            LEFT JOIN StockTotals t ON t.product_id = p.id
+            LEFT JOIN ({PENDING_DELTAS}) d ON d.product_id = p.id
+        """
+        if search_text.strip():
+            query = f"{totals} WHERE {product_match('p')} ORDER BY {product_rank('p')}, p.id"
+            params = search_params(search_text)
+        else:
+            query = f"{totals} ORDER BY p.id"
+            params = None
+        try:
+            fold_movements(Database(self.user, self.password))  # Свёрнутые движения попадают в сводку
+            fold_stock_totals(Database(self.user, self.password))  # Чтобы несвёрнутых изменений было немного
+            # Товаров может быть очень много - грузим страницами по мере прокрутки
+            stream = RowStream(Database(self.user, self.password), query, params)
+            self.totals_table.set_stream(stream, self.headers)
+            self.breakdown_table.set_rows([])
+            self.breakdown_label.setText('Выберите товар, чтобы увидеть склады')
+        except Exception as e:
+            logging.error(f"Error loading stock totals: {e}")
+            QMessageBox.critical(self, 'Ошибка', f'Ошибка при загрузке остатков: {e}')
+
+    def show_breakdown(self, index):
+        row = self.totals_table.source_row(index)
+        product_id, article, name = self.totals_table.row_values(row)[:3]
+        self.breakdown_label.setText(f'Склады с товаром {name} ({article})')
+        # Запрос в фоне; выбор другого товара отменяет ещё не завершённый
+        self.executor.submit('breakdown', self.load_breakdown, product_id,
+                             on_result=self.breakdown_table.set_rows, on_error=self.on_breakdown_error)
+
+    def load_breakdown(self, product_id):
+        with Database(self.user, self.password) as db:
+            return product_breakdown(db.cursor, product_id)
+
+    def on_breakdown_error(self, error):
+        logging.error(f"Error loading stock breakdown: {error}")
+        QMessageBox.critical(self, 'Ошибка', f'Ошибка при загрузке складов товара: {error}')
+
+    def closeEvent(self, event):
+        self.executor.cancel_all()
+        self.totals_table.close_stream()  # Недочитанная выборка больше не догружается
+        super().closeEvent(event)
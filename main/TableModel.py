@@ -0,0 +1,341 @@
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel, QObject, QTimer, pyqtSignal
+from PyQt5.QtWidgets import QTableView, QStyledItemDelegate, QComboBox
+
+
+class TableModel(QAbstractTableModel):
+    # Строки хранятся кортежами как пришли из курсора, без QTableWidgetItem на каждую ячейку.
+    # По умолчанию таблица только для чтения, редактируемые столбцы задаются явно
+    def __init__(self, headers=None, rows=None, editable_columns=(), parent=None):
+        super().__init__(parent)
+        self.headers = list(headers or [])
+        self.rows = [tuple(row) for row in rows or []]
+        self.editable_columns = set(editable_columns)
+        self.stream = None  # RowStream, из которого строки догружаются при прокрутке
+        self.row_filter = None  # RowFilter, ключи которого обновляются вместе со строками
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        value = row[index.column()] if index.column() < len(row) else None
+        if role == Qt.DisplayRole:
+            return str(value)
+        if role == Qt.EditRole:
+            return value
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.headers[section] if section < len(self.headers) else None
+        return section + 1  # Номер строки считается на клиенте, id в базе не трогаем
+
+    def flags(self, index):
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if index.column() in self.editable_columns:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid():
+            return False
+        self.set_value(index.row(), index.column(), value)
+        return True
+
+    def set_rows(self, rows, headers=None):
+        self.close_stream()
+        self.beginResetModel()
+        if headers is not None:
+            self.headers = list(headers)
+        self.rows = [tuple(row) for row in rows]
+        if self.row_filter is not None:
+            self.row_filter.set_rows(self.rows)
+        self.endResetModel()
+
+    def set_stream(self, stream, headers=None):
+        # Показываем первую страницу сразу, остальное - по мере прокрутки (canFetchMore/fetchMore)
+        try:
+            rows = stream.fetch_page()
+        except Exception:
+            stream.close()
+            raise
+        self.set_rows(rows, headers)
+        if not stream.exhausted:
+            self.stream = stream
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.stream is not None
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.stream is None:
+            return
+        rows = self.stream.fetch_page()
+        if self.stream.exhausted:
+            self.stream = None
+        if rows:
+            self.add_rows(rows)
+
+    def close_stream(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    def set_headers(self, headers):
+        self.beginResetModel()
+        self.headers = list(headers)
+        self.endResetModel()
+
+    def value(self, row, column):
+        values = self.rows[row]
+        return values[column] if column < len(values) else None
+
+    def set_value(self, row, column, value):
+        values = self.rows[row]
+        if column >= len(values):
+            values = values + (None,) * (column + 1 - len(values))
+        self.rows[row] = values[:column] + (value,) + values[column + 1:]
+        if self.row_filter is not None:
+            self.row_filter.update_row(row, self.rows[row])
+        index = self.index(row, column)
+        self.dataChanged.emit(index, index)
+
+    def set_values(self, row, values, first_column=0):
+        for offset, value in enumerate(values):
+            self.set_value(row, first_column + offset, value)
+
+    def add_row(self, values):
+        position = len(self.rows)
+        self.add_rows([values])
+        return position
+
+    def add_rows(self, rows):
+        rows = [tuple(row) for row in rows]
+        if not rows:
+            return
+        position = len(self.rows)
+        self.beginInsertRows(QModelIndex(), position, position + len(rows) - 1)
+        self.rows.extend(rows)
+        if self.row_filter is not None:
+            self.row_filter.add_rows(rows)
+        self.endInsertRows()
+
+    def remove_row(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.rows[row]
+        if self.row_filter is not None:
+            self.row_filter.remove_row(row)
+        self.endRemoveRows()
+
+
+class TableItem():
+    # Замена QTableWidgetItem для чтения ячеек: item(row, col).text() работает как раньше
+    def __init__(self, value, row=-1, column=-1):
+        self.value = value
+        self._row = row
+        self._column = column
+
+    def text(self):
+        return str(self.value)
+
+    def row(self):
+        return self._row
+
+    def column(self):
+        return self._column
+
+
+class DataTableView(QTableView):
+    cellDoubleClicked = pyqtSignal(int, int)
+
+    def __init__(self, headers=None, editable_columns=(), parent=None):
+        super().__init__(parent)
+        self.table_model = TableModel(headers, editable_columns=editable_columns, parent=self)
+        self.proxy_model = None
+        self.setModel(self.table_model)
+        self.doubleClicked.connect(lambda index: self.cellDoubleClicked.emit(self.source_row(index), index.column()))
+
+    def set_row_filter(self, row_filter, owner=True):
+        # Строки скрываются через прокси-модель, номера строк в остальных методах остаются номерами в table_model.
+        # owner=False - таблица фильтруется по ключам другой таблицы с теми же строками (например, move_table)
+        if owner:
+            self.table_model.row_filter = row_filter
+            row_filter.set_rows(self.table_model.rows)
+        self.proxy_model = FilterProxyModel(row_filter, self)
+        self.proxy_model.setSourceModel(self.table_model)
+        self.setModel(self.proxy_model)
+
+    def source_row(self, index):
+        if self.proxy_model is not None and index.isValid():
+            index = self.proxy_model.mapToSource(index)
+        return index.row()
+
+    def set_rows(self, rows, headers=None):
+        self.table_model.set_rows(rows, headers)
+
+    def set_stream(self, stream, headers=None):
+        self.table_model.set_stream(stream, headers)
+
+    def close_stream(self):
+        self.table_model.close_stream()
+
+    def setHorizontalHeaderLabels(self, headers):
+        self.table_model.set_headers(headers)
+
+    def horizontalHeaderItem(self, column):
+        return TableItem(self.table_model.headers[column], -1, column)
+
+    def rowCount(self):
+        return self.table_model.rowCount()
+
+    def columnCount(self):
+        return self.table_model.columnCount()
+
+    def item(self, row, column):
+        if 0 <= row < self.rowCount() and 0 <= column < self.columnCount():
+            return TableItem(self.table_model.value(row, column), row, column)
+        return None
+
+    def row_values(self, row):
+        return self.table_model.rows[row]
+
+    def set_values(self, row, values, first_column=0):
+        self.table_model.set_values(row, values, first_column)
+
+    def add_row(self, values):
+        return self.table_model.add_row(values)
+
+    def add_rows(self, rows):
+        self.table_model.add_rows(rows)
+
+    def removeRow(self, row):
+        self.table_model.remove_row(row)
+
+    def currentRow(self):
+        return self.source_row(self.currentIndex())
+
+    def is_complete(self):
+        # Все строки выборки уже загружены - поиск можно делать без запроса к базе
+        return not self.table_model.canFetchMore()
+
+
+class ComboBoxDelegate(QStyledItemDelegate):
+    # Выпадающий список в ячейке вместо отдельного QComboBox на каждую строку
+    def __init__(self, options, placeholder='', parent=None):
+        super().__init__(parent)
+        self.options = list(options)  # [(текст, значение)]
+        self.placeholder = placeholder
+        self.names = {str(value): text for text, value in self.options}
+
+    def displayText(self, value, locale):
+        return self.names.get(str(value), self.placeholder)
+
+    def createEditor(self, parent, option, index):
+        editor = QComboBox(parent)
+        editor.addItem(self.placeholder, None)
+        for text, value in self.options:
+            editor.addItem(text, value)
+        return editor
+
+    def setEditorData(self, editor, index):
+        position = editor.findData(index.data(Qt.EditRole))
+        editor.setCurrentIndex(max(position, 0))
+
+    def setModelData(self, editor, model, index):
+        model.setData(index, editor.currentData(), Qt.EditRole)
+
+
+class RowFilter(QObject):
+    # Индекс для поиска по загруженным строкам: текст нужных столбцов в нижнем регистре
+    # считается один раз при загрузке строки, а не на каждое нажатие клавиши
+    changed = pyqtSignal()
+
+    def __init__(self, columns=None, parent=None):
+        super().__init__(parent)
+        self.columns = columns  # None - все столбцы
+        self.text = ''
+        self.keys = []
+
+    def key(self, values):
+        columns = range(len(values)) if self.columns is None else self.columns
+        return '\n'.join(str(values[column]).lower() for column in columns if column < len(values))
+
+    def set_rows(self, rows):
+        self.keys = [self.key(values) for values in rows]
+
+    def add_rows(self, rows):
+        self.keys.extend(self.key(values) for values in rows)
+
+    def update_row(self, row, values):
+        if row < len(self.keys):
+            self.keys[row] = self.key(values)
+
+    def remove_row(self, row):
+        if row < len(self.keys):
+            del self.keys[row]
+
+    def set_text(self, text):
+        text = text.strip().lower()
+        if text != self.text:
+            self.text = text
+            self.changed.emit()
+
+    def accepts(self, row):
+        if not self.text:
+            return True
+        return row < len(self.keys) and self.text in self.keys[row]
+
+
+class FilterProxyModel(QSortFilterProxyModel):
+    def __init__(self, row_filter, parent=None):
+        super().__init__(parent)
+        self.row_filter = row_filter
+        row_filter.changed.connect(self.invalidateFilter)
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        return self.row_filter.accepts(source_row)
+
+
+class LiveSearch(QObject):
+    # Поиск по мере ввода: строки сразу фильтруются на клиенте, а запрос к базе уходит
+    # (с задержкой, чтобы не на каждую букву) только если загруженных строк может не хватить:
+    # выборка догружается страницами или была получена поиском по другому тексту
+    def __init__(self, search_box, row_filter, is_complete, server_search, delay=300, parent=None):
+        super().__init__(parent)
+        self.row_filter = row_filter
+        self.is_complete = is_complete
+        self.server_search = server_search
+        self.loaded_text = ''  # Текст, которым отобраны загруженные строки; '' - загружено всё
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self.run_server_search)
+        self.search_box = None
+        self.set_search_box(search_box)
+
+    def set_search_box(self, search_box):
+        if self.search_box is not None:
+            self.search_box.textChanged.disconnect(self.on_text_changed)
+        self.search_box = search_box
+        search_box.textChanged.connect(self.on_text_changed)
+
+    def on_text_changed(self, text):
+        self.row_filter.set_text(text)
+        if self.covers(text):
+            self.timer.stop()
+        else:
+            self.timer.start()  # Каждая новая буква откладывает запрос
+
+    def covers(self, text):
+        return self.is_complete() and self.loaded_text in text.strip().lower()
+
+    def run_server_search(self):
+        self.timer.stop()
+        self.loaded_text = self.search_box.text().strip().lower()
+        self.server_search()
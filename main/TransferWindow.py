@@ -4,27 +4,18 @@ import psycopg2
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QWidget,
     QPushButton, QMessageBox, QTableWidget, QComboBox, QTableWidgetItem,
-    QLabel, QLineEdit, QDialog
-)
-from psycopg2 import OperationalError, sql
-from Database import Database
-from PyQt5 import QtCore
-from EditDialog import EditDialog
-
-
-import sys
-import logging
-import psycopg2
-from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QWidget,
-    QPushButton, QMessageBox, QTableWidget, QComboBox, QTableWidgetItem,
-    QLabel, QSpinBox, QDialog
+    QLabel, QLineEdit, QSpinBox, QDialog
 )
 from psycopg2 import OperationalError, sql
 from Database import Database
+from ReferenceCache import get_reference_cache
+from Search import product_match, product_rank, search_params
 from PyQt5 import QtCore
 from EditDialog import EditDialog
 from documentcreator import DocumentCreator
+from TableModel import DataTableView, ComboBoxDelegate, RowFilter, LiveSearch
+from QueryExecutor import QueryExecutor
+from Operations import Inventory
 
 
 class TransferWindow(QMainWindow):
@@ -36,15 +27,18 @@ class TransferWindow(QMainWindow):
         self.setGeometry(600, 200, 800, 600)
 
         self.changes = []  # Для отслеживания изменений
+        self.executor = QueryExecutor(self)
 
         layout = QVBoxLayout()
 
         # Layout для комбо боксов
         combo_layout = QHBoxLayout()
 
+        self.warehouses = self.load_warehouses()  # Список складов грузится один раз на окно
         self.from_warehouse_combo_box = QComboBox()
         self.from_warehouse_combo_box.addItem("Выберите склад", None)
-        self.load_warehouses(self.from_warehouse_combo_box)
+        for name, warehouse_id in self.warehouses:
+            self.from_warehouse_combo_box.addItem(name, warehouse_id)
         self.from_warehouse_combo_box.currentIndexChanged.connect(self.update_table)
         combo_layout.addWidget(self.from_warehouse_combo_box)
 
@@ -57,17 +51,13 @@ class TransferWindow(QMainWindow):
         main_layout = QHBoxLayout()
 
         # Таблица для товаров на выбранном складе
-        self.warehouse_table = QTableWidget()
-        self.warehouse_table.setColumnCount(3)
-        self.warehouse_table.setHorizontalHeaderLabels(['ID товара', 'Название товара', 'Количество'])
+        self.warehouse_table = DataTableView(['ID товара', 'Название товара', 'Количество'])
         main_layout.addWidget(self.warehouse_table)
 
-        # Таблица для перемещения товаров
-        self.move_table = QTableWidget()
-        self.move_table.setColumnCount(2)
-        self.move_table.setHorizontalHeaderLabels(['Количество', 'Склад назначения'])
+        # Таблица для перемещения товаров: количество и склад редактируются прямо в ячейках
+        self.move_table = DataTableView(['Количество', 'Склад назначения'], editable_columns=(0, 1))
+        self.move_table.setItemDelegateForColumn(1, ComboBoxDelegate(self.warehouses, "Выберите склад", self.move_table))
         main_layout.addWidget(self.move_table)
-        self.move_table.cellDoubleClicked.connect(self.edit_item)
 
         layout.addLayout(main_layout)
 
@@ -95,10 +85,17 @@ class TransferWindow(QMainWindow):
         self.search_box = QLineEdit()
         search_layout.addWidget(self.search_box)
         self.search_button = QPushButton('Поиск')
-        self.search_button.clicked.connect(self.search_items)
         search_layout.addWidget(self.search_button)
         layout.addLayout(search_layout)
 
+        # Поиск по мере ввода: обе таблицы скрывают одни и те же строки.
+        # Ищем по названию и артикулу (артикул приходит в строке четвёртым значением, но не показывается)
+        self.row_filter = RowFilter((1, 3), self)
+        self.warehouse_table.set_row_filter(self.row_filter)
+        self.move_table.set_row_filter(self.row_filter, owner=False)
+        self.live_search = LiveSearch(self.search_box, self.row_filter, lambda: True, self.search_items, parent=self)
+        self.search_button.clicked.connect(self.live_search.run_server_search)
+
         container = QWidget()
         container.setLayout(layout)
         self.setCentralWidget(container)
@@ -106,49 +103,35 @@ class TransferWindow(QMainWindow):
         # Изначальная загрузка
         self.update_table()
 
-    def load_warehouses(self, combo_box):
-        with Database(self.user, self.password) as db:
-            warehouses = db.get_warehouses()
-            for warehouse in warehouses:
-                combo_box.addItem(warehouse[1], warehouse[0])
+    def load_warehouses(self):
+        return [(warehouse[1], warehouse[0]) for warehouse in get_reference_cache().get('warehouses')]
+
+    def fill_tables(self, products):
+        self.warehouse_table.set_rows(products)
+        # Для каждой строки: количество к перемещению и склад назначения
+        self.move_table.set_rows([(0, None)] * len(products))
 
     def update_table(self):
         from_warehouse_id = self.from_warehouse_combo_box.currentData()
         if from_warehouse_id is not None:
-            with Database(self.user, self.password) as db:
-                db.cursor.execute("""
-                    SELECT Products.id, Products.name, ProductInWarehouse.amount
-                    FROM ProductInWarehouse
-                    JOIN Products ON Products.id = ProductInWarehouse.product_id
-                    WHERE ProductInWarehouse.warehouse_id = %s
-                """, (from_warehouse_id,))
-                products = db.cursor.fetchall()
-                self.warehouse_table.setRowCount(len(products))
-                self.move_table.setRowCount(len(products))
-                for i, product in enumerate(products):
-                    self.warehouse_table.setItem(i, 0, QTableWidgetItem(str(product[0])))
-                    self.warehouse_table.setItem(i, 1, QTableWidgetItem(product[1]))
-                    self.warehouse_table.setItem(i, 2, QTableWidgetItem(str(product[2])))
-
-                    # Инициализация move_table
-                    quantity_spinbox = QSpinBox()
-                    quantity_spinbox.setMaximum(999999999)
-                    self.move_table.setCellWidget(i, 0, quantity_spinbox)
-                    to_warehouse_combo = QComboBox()
-                    to_warehouse_combo.addItem("Выберите склад", None)
-                    self.load_warehouses(to_warehouse_combo)
-                    self.move_table.setCellWidget(i, 1, to_warehouse_combo)
-                self.make_table_read_only()
+            # Загрузка в фоне, повторный выбор склада отменяет предыдущий запрос
+            self.executor.submit_query('warehouse', self.user, self.password, """
+                    SELECT Products.id, Products.name, StockBalances.amount, Products.article
+                    FROM StockBalances
+                    JOIN Products ON Products.id = StockBalances.product_id
+                    WHERE StockBalances.warehouse_id = %s
+                """, (from_warehouse_id,), on_result=self.fill_tables, on_error=self.on_load_error)
+
+    def on_load_error(self, error):
+        logging.error(f"Ошибка при загрузке товаров: {error}")
+        QMessageBox.critical(self, "Ошибка", f"Ошибка при загрузке товаров: {error}")
 
     def move_products(self):
         from_warehouse_id = self.from_warehouse_combo_box.currentData()
         if from_warehouse_id:
             for i in range(self.move_table.rowCount()):
-                quantity_spinbox = self.move_table.cellWidget(i, 0)
-                quantity = quantity_spinbox.value()
-                to_warehouse_combo = self.move_table.cellWidget(i, 1)
-                to_warehouse_id = to_warehouse_combo.currentData()
-                product_id = self.warehouse_table.item(i, 0).text()
+                quantity, to_warehouse_id = self.move_table.row_values(i)
+                product_id = self.warehouse_table.row_values(i)[0]
 
                 if quantity > 0 and to_warehouse_id:
                     self.changes.append(('move', from_warehouse_id, to_warehouse_id, product_id, quantity))
@@ -163,103 +146,60 @@ class TransferWindow(QMainWindow):
         QMessageBox.information(self, 'Отменено', 'Изменения отменены!')
 
     def save_changes(self):
-        try:
-            with Database(self.user, self.password) as db:
-                for change in self.changes:
-                    change_type, from_warehouse, to_warehouse, product_id, quantity = change
-                    if change_type == 'move':
-                        # Перемещение товара с одного склада на другой
-                        db.cursor.execute("""
-                            UPDATE ProductInWarehouse
-                            SET amount = amount - %s
-                            WHERE warehouse_id = %s AND product_id = %s
-                        """, (quantity, from_warehouse, product_id))
-
-                        db.cursor.execute("""
-                            SELECT amount FROM ProductInWarehouse
-                            WHERE warehouse_id = %s AND product_id = %s
-                        """, (to_warehouse, product_id))
-                        result = db.cursor.fetchone()
-                        if result:
-                            db.cursor.execute("""
-                                UPDATE ProductInWarehouse
-                                SET amount = amount + %s
-                                WHERE warehouse_id = %s AND product_id = %s
-                            """, (quantity, to_warehouse, product_id))
-                        else:
-                            db.cursor.execute("""
-                                INSERT INTO ProductInWarehouse (warehouse_id, product_id, amount)
-                                VALUES (%s, %s, %s)
-                            """, (to_warehouse, product_id, quantity))
-                        db.cursor.execute('SELECT name FROM PRODUCTS WHERE id = %s', (product_id,))
-                        product_name = db.cursor.fetchone()
-                        data = {'{from_warehouse}': str(from_warehouse),
-                                '{to_warehouse}': str(to_warehouse),
-                                '{product_name}': str(product_name[0]),
-                                '{product_id}': str(product_id),
-                                '{amount}': str(quantity)}
-                        doc = DocumentCreator('transferpreset.docx', data)
-                        doc.exec_()
-
-                db.conn.commit()
-                self.changes.clear()
-                QMessageBox.information(self, "Успех", "Изменения успешно сохранены!")
-        except Exception as e:
-            if db.conn:
-                db.conn.rollback()
-            logging.error(f"Ошибка при сохранении изменений: {e}")
-            QMessageBox.critical(self, "Ошибка", f"Произошла ошибка при сохранении: {e}")
-
-    def make_table_read_only(self):
-        for row in range(self.warehouse_table.rowCount()):
-            for col in range(self.warehouse_table.columnCount()):
-                item = self.warehouse_table.item(row, col)
-                if item:
-                    item.setFlags(item.flags() & ~QtCore.Qt.ItemIsEditable)
-        for row in range(self.move_table.rowCount()):
-            for col in range(self.move_table.columnCount()):
-                item = self.move_table.item(row, 0)
-                if item:
-                    item.setFlags(item.flags() & ~QtCore.Qt.ItemIsEditable)
-
-    def edit_item(self, row, column):
-        logging.debug(f"Открытие EditDialog для строки {row}, столбца {column}")
-        dialog = EditDialog(self.move_table, row, column)
-        if dialog.exec_() == QDialog.Accepted:
-            data = dialog.get_data()
-            for col, value in enumerate(data):
-                item = QTableWidgetItem(value)
-                item.setFlags(item.flags() & ~QtCore.Qt.ItemIsEditable)
-                self.move_table.setItem(row, 0, item)  # Обновляем данные в таблице
-            QMessageBox.information(self, 'Успех', 'Данные успешно обновлены!')
+        self.save_button.setEnabled(False)
+        self.executor.submit(None, self.write_changes, list(self.changes),
+                             on_result=self.on_changes_saved, on_error=self.on_save_error)
+
+    def write_changes(self, changes):
+        # Выполняется в фоновом потоке: только база, без виджетов
+        lines = [(int(from_warehouse), int(to_warehouse), int(product_id), int(quantity))
+                 for change_type, from_warehouse, to_warehouse, product_id, quantity in changes
+                 if change_type == 'move']
+        return Inventory(Database(self.user, self.password)).transfer(lines)
+
+    def on_changes_saved(self, results):
+        self.save_button.setEnabled(True)
+        failed = [result for result in results if not result[7]]
+        if failed:
+            # Ничего не сохранено: показываем строки, где товара на складе не хватило
+            message = '\n'.join(f"{result[2]} (ID {result[1]}): не хватает {-result[6]} шт. на складе {result[3]}"
+                                 for result in failed)
+            QMessageBox.warning(self, "Ошибка", f"Перемещение не выполнено, недостаточно товара:\n{message}")
+            return
+        self.changes.clear()
+        documents = [{'{from_warehouse}': str(from_warehouse),
+                      '{to_warehouse}': str(to_warehouse),
+                      '{product_name}': str(product_name),
+                      '{product_id}': str(product_id),
+                      '{amount}': str(quantity)}
+                     for line, product_id, product_name, from_warehouse, to_warehouse, quantity, balance, ok in results]
+        if documents:
+            # Один документ на всё перемещение, по строке таблицы на каждый товар
+            doc = DocumentCreator('transferpreset.docx', documents)
+            doc.exec_()
+        QMessageBox.information(self, "Успех", "Изменения успешно сохранены!")
+        self.update_table()
+
+    def on_save_error(self, error):
+        self.save_button.setEnabled(True)
+        logging.error(f"Ошибка при сохранении изменений: {error}")
+        QMessageBox.critical(self, "Ошибка", f"Произошла ошибка при сохранении: {error}")
 
     def search_items(self):
         search_text = self.search_box.text().lower()  # Получаем текст из поля поиска
         from_warehouse_id = self.from_warehouse_combo_box.currentData()
 
         if from_warehouse_id:
-            with Database(self.user, self.password) as db:
-                db.cursor.execute("""
-                    SELECT Products.id, Products.name, ProductInWarehouse.amount
-                    FROM ProductInWarehouse
-                    JOIN Products ON Products.id = ProductInWarehouse.product_id
-                    WHERE ProductInWarehouse.warehouse_id = %s
-                    AND LOWER(Products.name) LIKE %s
-                """, (from_warehouse_id, f'%{search_text}%'))
-                products = db.cursor.fetchall()
-                self.warehouse_table.setRowCount(len(products))
-                self.move_table.setRowCount(len(products))
-                for i, product in enumerate(products):
-                    self.warehouse_table.setItem(i, 0, QTableWidgetItem(str(product[0])))
-                    self.warehouse_table.setItem(i, 1, QTableWidgetItem(product[1]))
-                    self.warehouse_table.setItem(i, 2, QTableWidgetItem(str(product[2])))
-
-                    # Инициализация move_table
-                    quantity_spinbox = QSpinBox()
-                    quantity_spinbox.setMaximum(999999999)
-                    self.move_table.setCellWidget(i, 0, quantity_spinbox)
-                    to_warehouse_combo = QComboBox()
-                    to_warehouse_combo.addItem("Выберите склад", None)
-                    self.load_warehouses(to_warehouse_combo)
-                    self.move_table.setCellWidget(i, 1, to_warehouse_combo)
-                self.make_table_read_only()
\ No newline at end of file
+            self.executor.submit_query('warehouse', self.user, self.password, f"""
+                    SELECT Products.id, Products.name, StockBalances.amount, Products.article
+                    FROM StockBalances
+                    JOIN Products ON Products.id = StockBalances.product_id
+                    WHERE StockBalances.warehouse_id = %(warehouse_id)s
+                    AND {product_match('Products')}
+                    ORDER BY {product_rank('Products')}
+                """, search_params(search_text, warehouse_id=from_warehouse_id),
+                on_result=self.fill_tables, on_error=self.on_load_error)
+
+    def closeEvent(self, event):
+        self.executor.cancel_all()
+        super().closeEvent(event)
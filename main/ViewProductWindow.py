@@ -8,6 +8,8 @@ from PyQt5.QtWidgets import (
 from PyQt5 import QtCore, QtWidgets
 from psycopg2 import OperationalError, sql
 from Database import Database
+from SchemaCatalog import get_schema_catalog
+from Search import product_match, product_rank, search_params
 
 
 class ViewProductWindow(QDialog):
@@ -43,8 +45,7 @@ class ViewProductWindow(QDialog):
 
         # Получаем имена колонок из базы данных и устанавливаем их в QTableWidget
         try:
-            with Database(self.user, self.password) as db:
-                column_names = db.get_column_names('productinwarehouse')
+            column_names = get_schema_catalog(self.user, self.password).column_names('productinwarehouse')
             self.table_widget.setColumnCount(len(column_names))
             self.table_widget.setHorizontalHeaderLabels(column_names)
         except Exception as e:
@@ -72,7 +73,7 @@ class ViewProductWindow(QDialog):
         search_text = self.search_box.text().lower()  # Получаем текст из поля поиска
         try:
             with Database(self.user, self.password) as db:
-                db.cursor.execute(self.get_search_query(), (f'%{search_text}%', self.warehouseid))
+                db.cursor.execute(self.get_search_query(), search_params(search_text, warehouse_id=self.warehouseid))
                 results = db.cursor.fetchall()
                 self.table_widget.setRowCount(len(results))
 
@@ -86,7 +87,8 @@ class ViewProductWindow(QDialog):
             QMessageBox.critical(self, 'Ошибка', f'Ошибка поиска товаров: {e}')
 
     def get_search_query(self):
-        return """SELECT warehouse_id, product_id, amount, Products.name FROM ProductInWarehouse
-            JOIN Products ON Products.id = ProductInWarehouse.product_id
-            WHERE LOWER(Products.name) LIKE %s AND warehouse_id = %s
+        return f"""SELECT warehouse_id, product_id, amount, Products.name FROM StockBalances
+            JOIN Products ON Products.id = StockBalances.product_id
+            WHERE {product_match('Products')} AND warehouse_id = %(warehouse_id)s
+            ORDER BY {product_rank('Products')}
             """
\ No newline at end of file
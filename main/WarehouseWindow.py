@@ -8,6 +8,7 @@ from PyQt5.QtWidgets import (
 )
 from psycopg2 import OperationalError, sql
 from Database import Database
+from SchemaCatalog import get_schema_catalog
 from BaseWindow import BaseWindow
 from ViewProductWindow import ViewProductWindow
 from EditDialog import EditDialog
@@ -15,11 +16,14 @@ from PyQt5 import QtCore
 
 
 class WarehouseWindow(BaseWindow):
+    search_fields = ('name',)
+    edit_columns = ('name', 'address', 'geo_text', 'geo_coordinates')
+
     def __init__(self, user, password):
         self.user = user
         self.password = password
         self.db = Database(user, password)
-        column_names = self.db.get_column_names('warehouses')
+        column_names = get_schema_catalog(user, password).column_names('warehouses')
         super().__init__('Склады', column_names, user, password, 'warehouses')
 
         self.view_products_button = QPushButton('Посмотреть товары на выбранном складе')
@@ -28,16 +32,11 @@ class WarehouseWindow(BaseWindow):
         layout.addWidget(self.view_products_button)
 
     def view_products(self):
-        # Получаем текущие выбранные элементы
-        selected_items = self.table_widget.selectedItems()
-        if selected_items:
-            # Берем первую выбранную ячейку
-            first_item = selected_items[0]
-            # Получаем индекс строки этой ячейки
-            row = first_item.row()
+        # Получаем индекс выбранной строки
+        row = self.table_widget.currentRow()
+        if row >= 0:
             # Получаем warehouseid из первой ячейки
-            row_data = [self.table_widget.item(row, col).text() for col in range(self.table_widget.columnCount())]
-            warehouseid = row_data[0]
+            warehouseid = self.table_widget.row_values(row)[0]
             viewproduct = ViewProductWindow(self.user, self.password, warehouseid)
             viewproduct.exec_()
         else:
@@ -51,8 +50,8 @@ class WarehouseWindow(BaseWindow):
 
     def get_insert_query(self):
         return """
-            INSERT INTO Warehouses (id, name, address, geo_text, geo_coordinates)
-            VALUES (%s, %s, %s, %s, %s)
+            INSERT INTO Warehouses (name, address, geo_text, geo_coordinates)
+            VALUES (%s, %s, %s, %s)
         """
 
     def get_delete_query(self):
@@ -68,76 +67,38 @@ class WarehouseWindow(BaseWindow):
         return """
         SELECT id, name, address, geo_text, geo_coordinates
         FROM Warehouses
-        WHERE LOWER(name) LIKE %s
+        WHERE LOWER(name) LIKE %(pattern)s
         """
 
     def add_item(self):
-        dialog = EditDialog(self.table_widget)
+        dialog = EditDialog(self.table_widget, table='warehouses')
         if dialog.exec_() == QDialog.Accepted:
             data = dialog.get_data()
-            row_position = self.table_widget.rowCount()
-            self.table_widget.insertRow(row_position)
-            for col, value in enumerate(data):
-                self.table_widget.setItem(row_position, col + 1, QTableWidgetItem(value))  # Обновляем данные в таблице
-            self.update_ids()
-            self.changes.append(('insert', None, data))
+            row_id = self.pending_id()  # Настоящий id появится после сохранения
+            self.table_widget.add_row([row_id, *data])
+            self.changes.append(('insert', row_id, data))
             QMessageBox.information(self, 'Успех', 'Элемент успешно добавлен!')
 
     def delete_item(self):
         selected_row = self.table_widget.currentRow()
         if selected_row >= 0:
             id_item = self.table_widget.item(selected_row, 0)
-            if id_item:
-                self.changes.append(('delete', id_item.text(), None))
+            if id_item and id_item.text():
+                self.record_delete(id_item.text())
             self.table_widget.removeRow(selected_row)
-            self.update_ids()
             QMessageBox.information(self, 'Успех', 'Элемент успешно удалён!')
 
-    def update_ids(self):
-        for row in range(self.table_widget.rowCount()):
-            self.table_widget.setItem(row, 0, QTableWidgetItem(str(row + 1)))
-
     def cancel_changes(self):
         self.update_table()
         self.changes.clear()
         QMessageBox.information(self, 'Успех', 'Изменения успешно откатаны')
 
-    def save_changes(self):
-        try:
-            with Database(self.user, self.password) as db:
-                for change in self.changes:
-                    change_type, row_id, row_data = change
-                    if change_type == 'insert':
-                        new_id = db.get_next_id('warehouses')
-                        db.cursor.execute(self.get_insert_query(), (new_id, *row_data))
-                    elif change_type == 'delete':
-                        db.cursor.execute(self.get_delete_query(), (row_id,))
-                    elif change_type == 'update':
-                        db.cursor.execute(self.get_update_query(), row_data + [row_id])
-                
-                # Обновляем ID в базе данных
-                for row in range(self.table_widget.rowCount()):
-                    row_id = self.table_widget.item(row, 0).text()
-                    db.cursor.execute("UPDATE Warehouses SET id = %s WHERE id = %s", (row + 1, row_id))
-
-                db.conn.commit()
-                self.changes.clear()
-                QMessageBox.information(self, 'Успех', 'Изменения успешно сохранены!')
-        except Exception as e:
-            logging.error(f"Error saving changes: {e}")
-            QMessageBox.critical(self, 'Ошибка', f'Произошла ошибка при сохранении: {e}')
-        finally:
-            if db.conn:
-                db.conn.close()
-                logging.debug("Database connection closed.")
-
     def edit_item(self, row, column):
         logging.debug(f"Opening EditDialog for row {row}, column {column}")
-        dialog = EditDialog(self.table_widget, row)
+        dialog = EditDialog(self.table_widget, row, table='warehouses')
         if dialog.exec_() == QDialog.Accepted:
             data = dialog.get_data()
             logging.debug(f"Collected data for update: {data}")
-            for col, value in enumerate(data):
-                self.table_widget.setItem(row, col + 1, QTableWidgetItem(value))  # Обновляем данные в таблице
+            self.table_widget.set_values(row, data, 1)  # Обновляем данные в таблице
             self.changes.append(('update', self.table_widget.item(row, 0).text(), data))
             QMessageBox.information(self, 'Успех', 'Данные успешно обновлены!')
@@ -0,0 +1,138 @@
+import os
+import time
+import logging
+import importlib
+from logging.handlers import RotatingFileHandler
+
+# Окна MainWindow загружаются по требованию: модуль окна импортируется при первом нажатии кнопки,
+# окно создаётся один раз и дальше только показывается. При повторном открытии окно обновляется,
+# только если с прошлого показа изменились данные, от которых оно зависит: версии справочников
+# из ReferenceCache и "отметка" остатков и заказов (последний id журнала движений и заказов - один запрос).
+# Закрытое окно при открытии обновляется всегда: закрытие обрывает его загрузки.
+# Время импорта и создания каждого окна пишется в logs/startup.log - по нему следим за холодным стартом
+
+STARTUP_LOG_PATH = os.path.join('logs', 'startup.log')
+STARTUP_LOG_SIZE = 1024 * 1024
+STARTUP_LOG_BACKUPS = 3
+
+# Ключ -> (модуль, класс, метод обновления, от чего зависят данные окна).
+# None вместо зависимостей - окно обновляется при каждом открытии (данные не в базе)
+WINDOWS = {
+    'sales': ('SalesWindow', 'SalesWindow', 'refresh', ('clients', 'products', 'stock', 'orders')),
+    'products': ('ProductWindow', 'ProductWindow', 'update_table', ('products',)),
+    'receiving': ('ReceivingWindow', 'ReceivingWindow', 'update_table', ('warehouses', 'products', 'stock')),
+    'transfer': ('TransferWindow', 'TransferWindow', 'update_table', ('warehouses', 'products', 'stock')),
+    'write_off': ('WriteOffProductWindow', 'WriteOffProductWindow', 'update_warehouse_table',
+                  ('warehouses', 'products', 'stock')),
+    'clients': ('ClientWindow', 'ClientWindow', 'update_table', ('clients',)),
+    'warehouses': ('WarehouseWindow', 'WarehouseWindow', 'update_table', ('warehouses',)),
+    'stock_summary': ('StockSummaryWindow', 'StockSummaryWindow', 'update_table', ('products', 'stock')),
+    'diagnostics': ('DiagnosticsWindow', 'DiagnosticsWindow', 'update_tables', None),
+}
+
+_startup_log = None
+
+
+def get_startup_log():
+    global _startup_log
+    if _startup_log is None:
+        startup_log = logging.getLogger('startup')
+        startup_log.propagate = False
+        try:
+            os.makedirs(os.path.dirname(STARTUP_LOG_PATH), exist_ok=True)
+            handler = RotatingFileHandler(STARTUP_LOG_PATH, maxBytes=STARTUP_LOG_SIZE,
+                                          backupCount=STARTUP_LOG_BACKUPS, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            startup_log.addHandler(handler)
+        except OSError as e:
+            print(f"Не удалось открыть журнал запуска: {e}")
+        startup_log.setLevel(logging.INFO)
+        _startup_log = startup_log
+    return _startup_log
+
+
+def report_startup(stage, seconds):
+    get_startup_log().info(f"{stage}: {seconds * 1000:.1f} ms")
+    logging.debug(f"Startup {stage}: {seconds * 1000:.1f} ms")
+
+
+class WindowRegistry():
+    def __init__(self, user, password):
+        self.user = user
+        self.password = password
+        self.windows = {}  # Ключ -> созданное окно
+        self.stamps = {}  # Ключ -> отметка данных на момент последнего обновления окна
+        self.timings = []  # (этап, секунды) за сеанс
+
+    def open(self, key):
+        window = self.windows.get(key)
+        if window is None:
+            window = self.build(key)
+            self.stamps[key] = self.stamp(WINDOWS[key][3])
+        else:
+            if not window.isVisible():
+                # Окно закрывали: closeEvent отменил фоновые загрузки и закрыл недочитанную выборку,
+                # так что таблица могла остаться обрезанной или пустой - обновляем независимо от отметки
+                self.stamps.pop(key, None)
+            self.refresh(key, window)
+        window.show()
+        window.raise_()
+        window.activateWindow()
+        return window
+
+    def build(self, key):
+        module_name, class_name, refresh, sources = WINDOWS[key]
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        imported = time.perf_counter()
+        window_class = getattr(module, class_name)
+        if key == 'diagnostics':  # Окно без входа в базу
+            window = window_class()
+        else:
+            window = window_class(self.user, self.password)
+        built = time.perf_counter()
+        self.record(f'import {module_name}', imported - start)
+        self.record(f'build {class_name}', built - imported)
+        self.windows[key] = window
+        return window
+
+    def refresh(self, key, window):
+        module_name, class_name, refresh, sources = WINDOWS[key]
+        if getattr(window, 'changes', None) or getattr(window, 'write_off_data', None):
+            return  # Несохранённые правки пользователя важнее свежих данных
+        stamp = self.stamp(sources)
+        if stamp is not None and key in self.stamps and stamp == self.stamps[key]:
+            return
+        getattr(window, refresh)()
+        self.stamps[key] = stamp
+
+    def stamp(self, sources):
+        # Отметка данных окна; None - сравнить не с чем, окно обновляется всегда
+        if sources is None:
+            return None
+        from ReferenceCache import get_reference_cache
+        cache = get_reference_cache()
+        if cache is None or not cache.listening:
+            return None  # Без слушателя версии справочников не меняются - им нельзя верить
+        stamp = [(table, cache.version(table)) for table in sources if table not in ('stock', 'orders')]
+        if 'stock' in sources or 'orders' in sources:
+            from Database import Database
+            with Database(self.user, self.password) as db:
+                db.cursor.execute("""
+                    SELECT (SELECT max(id) FROM StockMovements),
+                           (SELECT count(*) || ':' || COALESCE(max(id), 0) FROM Orders)
+                """)
+                last_movement, orders = db.cursor.fetchone()
+            if 'stock' in sources:
+                stamp.append(('stock', last_movement))
+            if 'orders' in sources:
+                stamp.append(('orders', orders))
+        return tuple(stamp)
+
+    def record(self, stage, seconds):
+        self.timings.append((stage, seconds))
+        report_startup(stage, seconds)
+
+    def close_all(self):
+        for window in self.windows.values():
+            window.close()
@@ -8,6 +8,8 @@ from PyQt5.QtWidgets import (
 )
 from psycopg2 import OperationalError, sql
 from Database import Database
+from Operations import Inventory
+from Search import product_match, product_rank
 from BaseProductWindow import BaseProductWindow
 from EditDialog import EditDialog
 from documentcreator import DocumentCreator
@@ -16,16 +18,16 @@ logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %
 
 
 class WriteOffProductWindow(BaseProductWindow):
+    search_columns = (0, 3)  # Название и артикул (артикул в таблице не показывается)
+
     def __init__(self, user, password):
         self.user = user
         self.password = password
         self.query = {
-            'select': """SELECT Products.name, ProductInWarehouse.product_id, ProductInWarehouse.amount
-        FROM ProductInWarehouse
-        JOIN Products ON Products.id = ProductInWarehouse.product_id
-        WHERE ProductInWarehouse.warehouse_id = %s;""",
-            'insert': """UPDATE ProductInWarehouse SET amount = amount - %s 
-            WHERE warehouse_id = %s AND product_id = %s AND amount >= %s"""
+            'select': """SELECT Products.name, StockBalances.product_id, StockBalances.amount, Products.article
+        FROM StockBalances
+        JOIN Products ON Products.id = StockBalances.product_id
+        WHERE StockBalances.warehouse_id = %s;"""
         }
         headers = ['name', 'product_id', 'amount', 'Количество списания']
         super().__init__('Списание товаров', (600, 200, 1000, 600), headers, self.query, user, password)
@@ -52,27 +54,19 @@ class WriteOffProductWindow(BaseProductWindow):
 
         self.update_warehouse_table()
 
-    def update_warehouse_table(self):
-        warehouse_id = self.combo_box.currentData()
-        if warehouse_id is not None:
-            try:
-                with Database(self.user, self.password) as db:
-                    db.cursor.execute(self.query['select'], (warehouse_id,))
-                    products = db.cursor.fetchall()
-
-                self.warehouse_table.setRowCount(len(products))
-                self.order_table.setRowCount(len(products))
-
-                for i, product in enumerate(products):
-                    for j, value in enumerate(product):
-                        self.warehouse_table.setItem(i, j, QTableWidgetItem(str(value)))
-                    spin_box = QSpinBox()
-                    spin_box.setMaximum(999999999)  # Устанавливаем большое максимальное значение
-                    self.order_table.setCellWidget(i, 0, spin_box)
-                self.make_table_read_only()
-            except Exception as e:
-                logging.error(f"Error updating warehouse table: {e}")
-                QMessageBox.critical(self, "Ошибка", f"Ошибка обновления таблицы склада: {e}")
+    def fill_warehouse_table(self, products):
+        self.warehouse_table.setRowCount(len(products))
+        self.order_table.setRowCount(len(products))
+
+        for i, product in enumerate(products):
+            for j, value in enumerate(product[:self.warehouse_table.columnCount()]):
+                self.warehouse_table.setItem(i, j, QTableWidgetItem(str(value)))
+            spin_box = QSpinBox()
+            spin_box.setMaximum(999999999)  # Устанавливаем большое максимальное значение
+            self.order_table.setCellWidget(i, 0, spin_box)
+        self.make_table_read_only()
+        self.row_filter.set_rows(products)
+        self.apply_row_filter()
 
     def write_off_products(self):
         self.warehouse_id = self.combo_box.currentData()
@@ -104,33 +98,35 @@ class WriteOffProductWindow(BaseProductWindow):
         QMessageBox.information(self, 'Успех', 'Изменения успешно откатаны')
 
     def save_changes(self):
-        try:
-            with Database(self.user, self.password) as db:
-                for write_off_amount, warehouse_id, product_id, _ in self.write_off_data:
-                    db.cursor.execute(self.query['insert'], (write_off_amount, warehouse_id, product_id, write_off_amount))
-                    db.cursor.execute('SELECT name FROM Products WHERE id = %s', (product_id,))
-                    product_name = db.cursor.fetchone()
-                    data = {'{warehouse_id}': str(warehouse_id),
-                            '{product_id}': str(product_id),
-                            '{product_name}': str(product_name[0]),
-                            '{amount}': str(write_off_amount)}
-                    doc = DocumentCreator('writeoffpreset.docx', data)
-                    doc.exec_()
-                db.conn.commit()
-                self.write_off_data.clear()
-                QMessageBox.information(self, 'Успех', 'Изменения успешно сохранены!')
-        except OperationalError as oe:
-            logging.error(f"OperationalError: {oe}")
-            QMessageBox.critical(self, 'Ошибка', f'Ошибка сохранения изменений: {oe}')
-        except Exception as e:
-            if db.conn:
-                db.conn.rollback()
-            logging.error(f"Error saving changes: {e}")
-            QMessageBox.critical(self, 'Ошибка', f'Ошибка сохранения изменений: {e}')
-        finally:
-            if db.conn:
-                db.conn.close()
-                logging.debug("Database connection closed.")
+        self.save_button.setEnabled(False)
+        self.executor.submit(None, self.write_changes, list(self.write_off_data),
+                             on_result=self.on_changes_saved, on_error=self.on_save_error)
+
+    def write_changes(self, write_off_data):
+        # Выполняется в фоновом потоке: только база, без виджетов
+        documents = []
+        # Если остаток успели уменьшить в другом окне, StockShortage отменяет всё списание
+        results = Inventory(Database(self.user, self.password)).write_off(
+            [(warehouse_id, product_id, write_off_amount) for write_off_amount, warehouse_id, product_id, _ in write_off_data])
+        del self.write_off_data[:len(write_off_data)]  # Списание закоммичено - повторное сохранение не спишет его второй раз
+        for line, warehouse_id, product_id, delta, balance, ok, product in results:
+            documents.append({'{warehouse_id}': str(warehouse_id),
+                              '{product_id}': str(product_id),
+                              '{product_name}': str(product[1]),
+                              '{amount}': str(-delta)})
+        return documents
+
+    def on_changes_saved(self, documents):
+        self.save_button.setEnabled(True)
+        if documents:
+            # Один документ на всю операцию, по строке таблицы на каждый товар
+            doc = DocumentCreator('writeoffpreset.docx', documents)
+            doc.exec_()
+        QMessageBox.information(self, 'Успех', 'Изменения успешно сохранены!')
+
+    def on_save_error(self, error):
+        self.save_button.setEnabled(True)
+        QMessageBox.critical(self, 'Ошибка', f'Ошибка сохранения изменений: {error}')
 
     def edit_item(self, row, column):
         logging.debug(f"Opening EditDialog for row {row}, column {column}")
@@ -141,7 +137,8 @@ class WriteOffProductWindow(BaseProductWindow):
             self.order_table.setItem(row, 0, QTableWidgetItem(data[0]))  # Обновляем данные в таблице
 
     def get_search_query(self):
-        return """SELECT Products.name, ProductInWarehouse.product_id, ProductInWarehouse.amount
-                FROM ProductInWarehouse
-                JOIN Products ON Products.id = ProductInWarehouse.product_id
-                WHERE LOWER(Products.name) LIKE %s AND ProductInWarehouse.warehouse_id = %s;"""
+        return f"""SELECT Products.name, StockBalances.product_id, StockBalances.amount, Products.article
+                FROM StockBalances
+                JOIN Products ON Products.id = StockBalances.product_id
+                WHERE {product_match('Products')} AND StockBalances.warehouse_id = %(warehouse_id)s
+                ORDER BY {product_rank('Products')};"""
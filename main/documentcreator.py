@@ -1,8 +1,8 @@
 import subprocess
 import os
-import datetime
-from docx import Document
 from PyQt5.QtWidgets import QApplication, QDialog, QVBoxLayout, QPushButton, QLabel, QMessageBox
+from DocumentRenderer import generate_unique_filename
+from RenderQueue import get_render_queue
 
 class DocumentCreator(QDialog):
     def __init__(self, template_name, data, parent=None):
@@ -32,47 +32,36 @@ class DocumentCreator(QDialog):
         self.no_button.clicked.connect(self.onNo)
 
     def fill_template(self):
-        # Открываем шаблон документа
-        template_folder = 'presets'
-
-        # Формируем полный путь к шаблону
-        template_path = os.path.join(template_folder, self.template_name)
-        doc = Document(template_path)
-
-        # Проходим по всем параграфам в документе
-        for paragraph in doc.paragraphs:
-            # Проверяем наличие плейсхолдеров и заменяем их на данные
-            for key, value in self.data.items():
-                if key in paragraph.text:
-                    paragraph.text = paragraph.text.replace(key, value)
-
-        # Путь к папке для сохранения
-        docs_folder = 'docs'
-        if not os.path.exists(docs_folder):
-            os.makedirs(docs_folder)
-
-        output_path = os.path.join(docs_folder, self.generate_unique_filename(self.template_name))
-        # Сохраняем заполненный документ
-        doc.save(output_path)
-
-        # Открываем документ с помощью системного приложения
-        self.open_file(output_path)
+        # Документ ставится в очередь и рендерится в отдельном процессе, окно сразу закрывается.
+        # Список словарей - один документ с таблицей на всю операцию
+        rows = self.data if isinstance(self.data, list) else [self.data]
+        job = get_render_queue().submit(self.template_name, rows)
+        job.finished.connect(open_file)
+        job.failed.connect(show_render_error)
+        return job
 
     def generate_unique_filename(self, base_name):
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        base_name_without_extension = os.path.splitext(base_name)[0]
-        return f"{base_name_without_extension}_{timestamp}.docx"
+        return generate_unique_filename(base_name)
 
     def open_file(self, path):
-        try:
-            if os.name == 'nt':
-                os.startfile(path)
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Не удалось открыть файл: {e}")
+        open_file(path)
 
     def onYes(self):
         self.fill_template()
         self.close()
 
     def onNo(self):
-        self.close()
\ No newline at end of file
+        self.close()
+
+
+def open_file(path):
+    # Открываем документ с помощью системного приложения
+    try:
+        if os.name == 'nt':
+            os.startfile(path)
+    except Exception as e:
+        QMessageBox.critical(None, "Ошибка", f"Не удалось открыть файл: {e}")
+
+
+def show_render_error(error):
+    QMessageBox.critical(None, "Ошибка", f"Не удалось создать документ: {error}")
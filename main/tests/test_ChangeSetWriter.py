@@ -0,0 +1,57 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Модули main/ импортируются по имени
+
+from ChangeSetWriter import ChangeSetWriter
+
+
+class GroupTest(unittest.TestCase):
+    def setUp(self):
+        self.writer = ChangeSetWriter('clients', ('full_name', 'info'))
+
+    def test_saved_rows(self):
+        inserts, updates, deletes = self.writer.group([
+            ('update', '5', ('Иванов', 'a')),
+            ('update', '5', ('Петров', 'b')),
+            ('update', '6', ('Сидоров', 'c')),
+            ('delete', '6', None),
+            ('delete', '7', None),
+        ])
+        self.assertEqual(inserts, [])
+        self.assertEqual(updates, {5: ('Петров', 'b')})
+        self.assertEqual(deletes, {6, 7})
+
+    def test_update_of_pending_row_changes_its_insert(self):
+        inserts, updates, deletes = self.writer.group([
+            ('insert', -1, ('Иванов', 'a')),
+            ('insert', -2, ('Петров', 'b')),
+            ('update', '-1', ('Иванов И.', 'a2')),
+        ])
+        self.assertEqual(inserts, [('Иванов И.', 'a2'), ('Петров', 'b')])
+        self.assertEqual(updates, {})
+        self.assertEqual(deletes, set())
+
+    def test_deleted_pending_row_is_not_inserted(self):
+        inserts, updates, deletes = self.writer.group([
+            ('insert', -1, ('Иванов', 'a')),
+            ('update', '-1', ('Иванов И.', 'a2')),
+            ('delete', '-1', None),
+            ('insert', -2, ('Петров', 'b')),
+        ])
+        self.assertEqual(inserts, [('Петров', 'b')])
+        self.assertEqual(deletes, set())
+
+    def test_inserts_without_id(self):
+        inserts, updates, deletes = self.writer.group([
+            ('insert', None, ('Иванов', 'a')),
+            ('insert', None, ('Петров', 'b')),
+            ('update', '', ('Сидоров', 'c')),
+        ])
+        self.assertEqual(inserts, [('Иванов', 'a'), ('Петров', 'b')])
+        self.assertEqual(updates, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
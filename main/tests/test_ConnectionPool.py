@@ -0,0 +1,60 @@
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Модули main/ импортируются по имени
+
+import ConnectionPool
+from psycopg2 import extensions, pool
+
+
+class FakeConnection():
+    closed = False
+
+    def __init__(self):
+        self.info = mock.Mock(transaction_status=extensions.TRANSACTION_STATUS_IDLE)
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectTest(unittest.TestCase):
+    def test_slow_connect_does_not_block_release(self):
+        connection_pool = ConnectionPool.ConnectionPool(max_size=2)
+        started, finish = threading.Event(), threading.Event()
+
+        def slow_connect(**params):
+            started.set()
+            finish.wait(5)
+            return FakeConnection()
+
+        with mock.patch.object(ConnectionPool.psycopg2, 'connect', FakeConnection):
+            first = connection_pool.acquire()
+        with mock.patch.object(ConnectionPool.psycopg2, 'connect', slow_connect):
+            worker = threading.Thread(target=connection_pool.acquire)
+            worker.start()
+            self.assertTrue(started.wait(5))
+            released = threading.Thread(target=connection_pool.release, args=(first,))
+            released.start()
+            released.join(1)
+            self.assertFalse(released.is_alive())  # release не ждёт подключения в другом потоке
+            finish.set()
+            worker.join(5)
+        self.assertEqual(connection_pool.stats()['in_use'], 1)
+        self.assertEqual(connection_pool.stats()['idle'], 1)
+
+    def test_failed_connect_frees_its_slot(self):
+        connection_pool = ConnectionPool.ConnectionPool(max_size=1, timeout=0)
+        with mock.patch.object(ConnectionPool.psycopg2, 'connect', side_effect=OSError('нет сети')):
+            self.assertRaises(OSError, connection_pool.acquire)
+        self.assertEqual(connection_pool.stats()['connecting'], 0)
+        with mock.patch.object(ConnectionPool.psycopg2, 'connect', FakeConnection):
+            conn = connection_pool.acquire()
+            self.assertRaises(pool.PoolError, connection_pool.acquire)  # Максимум - одно соединение
+        connection_pool.release(conn)
+
+
+if __name__ == '__main__':
+    unittest.main()
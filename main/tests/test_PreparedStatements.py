@@ -0,0 +1,39 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Модули main/ импортируются по имени
+
+from PreparedStatements import PreparedStatement
+
+
+class NamedParamsTest(unittest.TestCase):
+    def test_numbers_in_order_of_first_use(self):
+        statement = PreparedStatement('stock', 'SELECT * FROM t WHERE a = %(product)s AND b = %(warehouse)s OR c = %(product)s',
+                                      {'product': 'integer'})
+        self.assertEqual(statement.prepare_sql,
+                         'PREPARE stock (integer, unknown) AS SELECT * FROM t WHERE a = $1 AND b = $2 OR c = $1')
+        self.assertEqual(statement.execute_sql, 'EXECUTE stock (%s, %s)')
+        self.assertEqual(statement.values({'warehouse': 3, 'product': 7, 'unused': 0}), (7, 3))
+
+
+class PositionalParamsTest(unittest.TestCase):
+    def test_numbers_and_missing_types(self):
+        statement = PreparedStatement('lines', 'SELECT * FROM t WHERE a = %s AND b = %s', ['integer'])
+        self.assertEqual(statement.prepare_sql, 'PREPARE lines (integer, unknown) AS SELECT * FROM t WHERE a = $1 AND b = $2')
+        self.assertEqual(statement.execute_sql, 'EXECUTE lines (%s, %s)')
+        self.assertEqual(statement.values([1, 2]), (1, 2))
+
+    def test_escaped_percent(self):
+        statement = PreparedStatement('search', "SELECT * FROM t WHERE name LIKE 'a%%' AND id = %s")
+        self.assertEqual(statement.prepare_sql, "PREPARE search (unknown) AS SELECT * FROM t WHERE name LIKE 'a%' AND id = $1")
+
+    def test_without_params(self):
+        statement = PreparedStatement('all', 'SELECT * FROM t')
+        self.assertEqual(statement.prepare_sql, 'PREPARE all AS SELECT * FROM t')
+        self.assertEqual(statement.execute_sql, 'EXECUTE all')
+        self.assertEqual(statement.values(None), ())
+
+
+if __name__ == '__main__':
+    unittest.main()
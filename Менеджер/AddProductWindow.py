@@ -8,6 +8,8 @@ from PyQt5.QtWidgets import (
 )
 from psycopg2 import OperationalError, sql
 from Database import Database
+from Operations import NamedStock
+from StockLedger import StockShortage
 from BaseProductWindow import BaseProductWindow
 
 
@@ -16,8 +18,7 @@ class AddProductWindow(BaseProductWindow):
         self.user = user
         self.password = password
         query = {
-            'select': """SELECT product_name, amount, price FROM ProductInWarehouse WHERE warehouse_id = %s""",
-            'insert': """INSERT INTO Order_items (order_id, product_name, quantity, price) VALUES (%s, %s, %s, %s)"""
+            'select': """SELECT product_name, amount, price FROM ProductInWarehouse WHERE warehouse_id = %s"""
         }
         headers = ['Товар', 'Количество', 'Цена', 'Количество в заказ']
         super().__init__('Добавить товары в заказ', (600, 200, 1000, 600), headers, query, self.user, self.password, parent)
@@ -33,25 +34,19 @@ class AddProductWindow(BaseProductWindow):
         warehouse_id = self.combo_box.currentData()
         if warehouse_id:
             try:
-                with Database(self.user, self.password) as db:
-                #connection = self.connect_db()
-                #cursor = connection.cursor()
-                #connection.autocommit = False
-
-                    for i in range(self.warehouse_table.rowCount()):
-                        product_name = self.warehouse_table.item(i, 0).text()
-                        quantity = int(self.order_table.item(i, 0).text())
-                        price = float(self.warehouse_table.item(i, 2).text())
-                        if quantity > 0:
-                            db.cursor.execute(self.query['insert'], (self.order_id, product_name, quantity, price))
-
-                #connection.commit()
-                #connection.close()
+                basket = []
+                for i in range(self.warehouse_table.rowCount()):
+                    quantity = int(self.order_table.item(i, 0).text())
+                    if quantity > 0:
+                        basket.append((self.warehouse_table.item(i, 0).text(), quantity,
+                                       float(self.warehouse_table.item(i, 2).text())))
+                # Вся корзина - одна транзакция: если чего-то не хватает, в заказ не попадает ничего
+                NamedStock(Database(self.user, self.password)).add_items(self.order_id, warehouse_id, basket)
                 QMessageBox.information(self, 'Успех', 'Товары добавлены в заказ.')
+            except StockShortage as e:
+                QMessageBox.warning(self, 'Ошибка', f'Товары не добавлены в заказ. {e}')
             except Exception as e:
-                if connection:
-                    connection.rollback()
-                print(f"Error adding products to order: {e}")
+                logging.error(f"Error adding products to order: {e}")
                 QMessageBox.critical(self, 'Ошибка', f'Ошибка добавления товаров в заказ: {e}')
         else:
             QMessageBox.warning(self, 'Ошибка', 'Пожалуйста, выберите склад.')
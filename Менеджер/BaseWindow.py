@@ -59,7 +59,6 @@ class BaseWindow(QMainWindow):
     def update_table(self):
         try:
             with Database(self.user, self.password) as db:
-                db.update_id(self.table_name)
                 db.cursor.execute(self.get_select_query())
                 items = db.cursor.fetchall()
                 self.table_widget.setRowCount(len(items))
@@ -77,9 +76,9 @@ class BaseWindow(QMainWindow):
             data = dialog.get_data()
             try:
                 with Database(self.user, self.password) as db:
-                    new_id = db.get_next_id(self.table_name)
-                    logging.debug(f"Inserting new row with ID {new_id} and data: {data}")
-                    db.cursor.execute(self.get_insert_query(), (new_id, *data))
+                    # id выдаёт последовательность (её ставит ensure_id_sequences при входе)
+                    logging.debug(f"Inserting new row with data: {data}")
+                    db.cursor.execute(self.get_insert_query(), data)
                     db.conn.commit()
                     self.update_table()
                     QMessageBox.information(self, 'Успех', 'Элемент успешно добавлен!')
@@ -37,8 +37,8 @@ class ClientWindow(BaseWindow):
 
     def get_insert_query(self):
         return """
-            INSERT INTO Clients (id, name, orders, info, phonenumber, address)
-            VALUES (%s, %s, %s, %s, %s, %s)
+            INSERT INTO Clients (name, orders, info, phonenumber, address)
+            VALUES (%s, %s, %s, %s, %s)
         """
 
 
@@ -84,13 +84,8 @@ class CurrentOrderWindow(QMainWindow):
             if id_item:
                 self.changes.append(('delete', id_item.text(), None))
             self.table_widget.removeRow(selected_row)
-            self.update_ids()
             QMessageBox.information(self, "Успех", "Заказ успешно удален!")
 
-    def update_ids(self):
-        for row in range(self.table_widget.rowCount()):
-            self.table_widget.setItem(row, 0, QTableWidgetItem(str(row + 1)))
-
     def rollback_changes(self):
         self.update_table()
         self.changes.clear()
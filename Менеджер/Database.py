@@ -8,6 +8,7 @@ from PyQt5.QtWidgets import (
 )
 from psycopg2 import OperationalError, sql
 from LoginWindowmain import GlobalData
+from QueryStats import InstrumentedCursor
 
 
 class Database():
@@ -28,7 +29,8 @@ class Database():
                 password=self.password,
                 host=self.host,
                 port=self.port,
-                options='-c client_encoding=UTF8'
+                options='-c client_encoding=UTF8',
+                cursor_factory=InstrumentedCursor  # Каждый запрос попадает в статистику и журнал медленных запросов
             )
             self.cursor = self.conn.cursor()
             print("Database connection successful.")
@@ -95,14 +97,9 @@ class Database():
             return None
 
     def get_column_names(self, tablename):
-        try:
-            with self as db:
-                self.cursor.execute(f"SELECT * FROM {tablename} LIMIT 0;")
-                column_names = [desc[0] for desc in self.cursor.description]
-                return column_names
-        except Exception as e:
-            print(f"Ошибка при получении имён столбцов: {e}")
-            return None
+        # Из общего с main/ каталога схемы: без запроса и без второго соединения внутри открытого with
+        from SchemaCatalog import get_schema_catalog
+        return get_schema_catalog(self.user, self.password).column_names(tablename)
 
     def get_product_in_warehouse(self, warehouseid):
         try:
@@ -115,21 +112,3 @@ class Database():
             print(f"Ошибка при товаров на складе: {e}")
             return None
 
-    def get_next_id(self, table_name):
-        try:
-            self.cursor.execute(f"SELECT MAX(id) FROM {table_name}")
-            max_id = self.cursor.fetchone()[0]
-            return (max_id or 0) + 1
-        except Exception as e:
-            print(f"Ошибка при нумерации: {e}")
-            return None
-    def update_id(self, table_name):
-        try:
-            self.cursor.execute(f"SELECT * FROM {table_name} ORDER BY id")
-            rows = self.cursor.fetchall()
-            for new_id, row in enumerate(rows, start=1):
-                old_id = row[0]
-                self.cursor.execute(f"UPDATE {table_name} SET id = %s WHERE id = %s", (new_id, old_id))
-        except Exception as e:
-            print(f"Ошибка при нумерации: {e}")
-            return None
\ No newline at end of file
@@ -2,6 +2,7 @@ from PyQt5.QtWidgets import QDialog, QFormLayout, QDateEdit, QSpinBox, QLineEdit
 from PyQt5.QtCore import QDate, QRegExp
 from PyQt5.QtGui import QRegExpValidator
 import logging
+from SchemaCatalog import get_schema_catalog
 
 class EditDialog(QDialog):
     def __init__(self, table_widget, row=None):
@@ -42,30 +43,7 @@ class EditDialog(QDialog):
         layout.addWidget(self.reject_button)
     
     def get_data_type(self, column_name):
-        data_types = {
-            'id': 'INTEGER',
-            'name': 'VARCHAR',
-            'article': 'VARCHAR',
-            'lifetime': 'INT',
-            'description': 'TEXT',
-            'category': 'VARCHAR',
-            'png_url': 'BYTEA',
-            'address': 'VARCHAR',
-            'geo_text': 'TEXT',
-            'geo_coordinates': 'VARCHAR',
-            'warehouse_id': 'INT',
-            'product_id': 'INT',
-            'amount': 'INT',
-            'orders': 'TEXT',
-            'info': 'TEXT',
-            'phonenumber': 'VARCHAR',
-            'client_id': 'INT',
-            'price': 'INT',
-            'date': 'TIMESTAMP',
-            'status': 'VARCHAR',
-            'order_id': 'INT'
-        }
-        return data_types.get(column_name, 'VARCHAR')
+        return get_schema_catalog().column_type(column_name)
     
     def create_widget(self, data_type):
         logging.debug(f"Creating widget for data type: {data_type}")
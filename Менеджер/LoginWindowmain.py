@@ -1,3 +1,4 @@
+import os
 import sys
 import logging
 import psycopg2
@@ -11,6 +12,12 @@ from psycopg2 import OperationalError, sql
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Складские операции (Operations, StockLedger), статистика запросов (QueryStats) и окно диагностики
+# общие с main/: модули оттуда ищутся после своих
+MAIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'main')
+if MAIN_DIR not in sys.path:
+    sys.path.append(MAIN_DIR)
+
 class GlobalData:
     username = None
     password = None
@@ -50,6 +57,9 @@ class LoginWindow(QMainWindow):
         GlobalData.username = user
         GlobalData.password = password
         try:
+            from Database import Database
+            from IdSequences import ensure_id_sequences
+            ensure_id_sequences(Database(user, password))  # Новые строки клиентов и складов получают id из последовательности
             from MainWindow import MainWindow
             self.main_window = MainWindow(user, password)
             self.main_window.show()
@@ -13,6 +13,7 @@ from TransferWindow import TransferWindow
 from WriteOffProduct import WriteOffProductWindow
 from ClientWindow import ClientWindow
 from WarehouseWindow import WarehouseWindow
+from DiagnosticsWindow import DiagnosticsWindow
 
 
 class MainWindow(QMainWindow):
@@ -33,7 +34,8 @@ class MainWindow(QMainWindow):
             ('Клиенты', self.open_clients_window),
             ('Склады', self.open_warehouses_window),
             ('Документы', self.open_documents_window),
-            ('Шаблоны', self.open_templates_window)
+            ('Шаблоны', self.open_templates_window),
+            ('Диагностика', self.open_diagnostics_window)
         ]
 
         for btn_text, handler in buttons:
@@ -79,5 +81,9 @@ class MainWindow(QMainWindow):
     def open_documents_window(self):
         pass
 
+    def open_diagnostics_window(self):
+        self.diagnostics_window = DiagnosticsWindow()
+        self.diagnostics_window.show()
+
     def open_templates_window(self):
         pass
\ No newline at end of file
@@ -9,6 +9,7 @@ from PyQt5.QtWidgets import (
 from psycopg2 import OperationalError, sql
 from Database import Database
 from BaseWindow import BaseWindow
+from Operations import NamedStock
 
 
 class ReceivingWindow(BaseWindow):
@@ -79,7 +80,9 @@ class ReceivingWindow(BaseWindow):
         try:
             selected_row = self.table_widget.currentRow()
             if selected_row >= 0:
-                self.changes.append(('delete', selected_row, None))
+                # Запоминаем товар и количество до удаления строки - номера строк после неё сдвинутся
+                self.changes.append(('delete', selected_row, [self.table_widget.item(selected_row, 0).text(),
+                                                              self.table_widget.item(selected_row, 1).text()]))
                 self.table_widget.removeRow(selected_row)
                 QMessageBox.information(self, "Успех", "Товар успешно удален!")
         except Exception as e:
@@ -94,38 +97,28 @@ class ReceivingWindow(BaseWindow):
             QMessageBox.critical(self, "Ошибка", f"Ошибка при отмене изменений: {e}")
 
     def save_changes(self):
+        # Новые строки - приход введённого количества по введённой цене, удалённые строки убираются со склада.
+        # Всё сохранение - одна транзакция
         try:
-            with Database(self.user, self.password) as db:
-                warehouse_id = self.combo_box.currentData()
-                if warehouse_id is not None:
-                    connection = self.connect_db()
-                    cursor = connection.cursor()
-                    connection.autocommit = False
-
-                    for change in self.changes:
-                        change_type, row_index, row_data = change
-                        if change_type == 'insert':
-                            product_name = row_data[0]
-                            quantity = int(row_data[1])
-                            price = float(row_data[2])
-                            cursor.execute("""
-                                INSERT INTO ProductInWarehouse (warehouse_id, product_name, amount, price)
-                                VALUES (%s, %s, %s, %s)
-                            """, (warehouse_id, product_name, quantity, price))
-                        elif change_type == 'delete':
-                            product_name = self.table_widget.item(row_index, 0).text()
-                            cursor.execute("""
-                                DELETE FROM ProductInWarehouse
-                                WHERE warehouse_id = %s AND product_name = %s
-                            """, (warehouse_id, product_name))
-
-                    connection.commit()
-                    connection.close()
-                    self.changes.clear()
-                QMessageBox.information(self, "Успех", "Изменения успешно сохранены!")
+            warehouse_id = self.combo_box.currentData()
+            if warehouse_id is None:
+                return
+            receipts = []
+            removed = []
+            for change_type, row_index, row_data in self.changes:
+                if change_type == 'insert' and row_index < self.table_widget.rowCount():
+                    product_name = self.table_widget.item(row_index, 0).text()
+                    quantity = int(self.table_widget.item(row_index, 1).text())
+                    if quantity > 0:
+                        receipts.append((product_name, quantity, float(self.table_widget.item(row_index, 2).text())))
+                elif change_type == 'delete' and row_data is not None:
+                    removed.append(row_data[0])
+            NamedStock(Database(self.user, self.password)).receive(warehouse_id, receipts, removed)
+            self.changes.clear()
+            self.update_table()
+            QMessageBox.information(self, "Успех", "Изменения успешно сохранены!")
         except Exception as e:
-            if connection:
-                connection.rollback()
+            logging.error(f"Error saving receiving: {e}")
             QMessageBox.critical(self, "Ошибка", f"Произошла ошибка при сохранении: {e}")
 
     def get_select_query(self):
@@ -8,6 +8,8 @@ from PyQt5.QtWidgets import (
 )
 from psycopg2 import OperationalError, sql
 from Database import Database
+from Operations import NamedStock
+from StockLedger import StockShortage
 
 
 
@@ -127,28 +129,15 @@ class TransferWindow(QMainWindow):
 
     def save_changes(self):
         try:
-            with Database(self.user, self.password) as db:
-                for change in self.changes:
-                    change_type, from_warehouse, to_warehouse, product_name, quantity = change
-                    if change_type == 'move':
-                        # Move product from one warehouse to another
-                        db.cursor.execute("""
-                            UPDATE ProductInWarehouse
-                            SET amount = amount - %s
-                            WHERE warehouse_id = %s AND product_name = %s
-                        """, (quantity, from_warehouse, product_name))
-
-                        db.cursor.execute("""
-                            INSERT INTO ProductInWarehouse (warehouse_id, product_name, amount, price)
-                            VALUES (%s, %s, %s, (SELECT price FROM ProductInWarehouse WHERE warehouse_id = %s AND product_name = %s))
-                            ON CONFLICT (warehouse_id, product_name)
-                            DO UPDATE SET amount = ProductInWarehouse.amount + EXCLUDED.amount
-                        """, (to_warehouse, product_name, quantity, from_warehouse, product_name))
-
-                db.conn.commit()
-                self.changes.clear()
-                QMessageBox.information(self, "Успех", "Изменения успешно сохранены!")
+            moves = [(int(from_warehouse), int(to_warehouse), product_name, int(quantity))
+                     for change_type, from_warehouse, to_warehouse, product_name, quantity in self.changes
+                     if change_type == 'move' and int(quantity) > 0]
+            # Всё перемещение - одна транзакция: при нехватке товара хоть по одной строке не меняется ничего
+            NamedStock(Database(self.user, self.password)).transfer(moves)
+            self.changes.clear()
+            QMessageBox.information(self, "Успех", "Изменения успешно сохранены!")
+        except StockShortage as e:
+            QMessageBox.warning(self, "Ошибка", f"Перемещение не выполнено. {e}")
         except Exception as e:
-            if db.conn:
-                db.conn.rollback()
+            logging.error(f"Error saving transfer: {e}")
             QMessageBox.critical(self, "Ошибка", f"Произошла ошибка при сохранении: {e}")
\ No newline at end of file
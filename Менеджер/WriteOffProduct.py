@@ -8,6 +8,8 @@ from PyQt5.QtWidgets import (
 )
 from psycopg2 import OperationalError, sql
 from Database import Database
+from Operations import NamedStock
+from StockLedger import StockShortage
 from BaseProductWindow import BaseProductWindow
 
 
@@ -40,23 +42,18 @@ class WriteOffProductWindow(BaseProductWindow):
         warehouse_id = self.combo_box.currentData()
         if warehouse_id:
             try:
-                connection = self.connect_db()
-                cursor = connection.cursor()
-                connection.autocommit = False
-
+                lines = []
                 for i in range(self.warehouse_table.rowCount()):
-                    product_name = self.warehouse_table.item(i, 0).text()
                     write_off_amount = int(self.order_table.item(i, 0).text())
                     if write_off_amount > 0:
-                        cursor.execute(self.query['insert'], (write_off_amount, warehouse_id, product_name, write_off_amount))
-
-                connection.commit()
-                connection.close()
+                        lines.append((self.warehouse_table.item(i, 0).text(), write_off_amount))
+                # Если товара не хватает хотя бы по одной строке, StockShortage отменяет всё списание
+                NamedStock(Database(self.user, self.password)).write_off(warehouse_id, lines)
                 QMessageBox.information(self, 'Успех', 'Товары списаны со склада.')
+            except StockShortage as e:
+                QMessageBox.warning(self, 'Ошибка', f'Товары не списаны. {e}')
             except Exception as e:
-                if connection:
-                    connection.rollback()
-                print(f"Error writing off products: {e}")
+                logging.error(f"Error writing off products: {e}")
                 QMessageBox.critical(self, 'Ошибка', f'Ошибка списания товаров: {e}')
         else:
             QMessageBox.warning(self, 'Ошибка', 'Пожалуйста, выберите склад.')